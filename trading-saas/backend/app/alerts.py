@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from sqlalchemy import bindparam, select, update
+from . import database, indicators, metrics, models
+
+log = logging.getLogger(__name__)
+
+# alert thresholds live in sorted numpy arrays per (symbol, metric, direction).
+# a move from old to new only touches alerts whose threshold lies between the two,
+# found with two binary searches: O(log n + k) no matter how many alerts exist.
+# triggered alerts go onto a queue that a background task writes out in batches
+
+METRICS = ("price", "rsi")
+CONDITIONS = ("crosses_above", "crosses_below", "above", "below")
+# level conditions also fire right away if they already hold when created
+LEVEL_CONDITIONS = ("above", "below")
+
+RSI_BARS = 60
+DELIVERY_INTERVAL_SECONDS = 0.5
+DELIVERY_BATCH = 500
+# each sync re-reads alerts created this long before the newest one it has seen.
+# created_at is stamped before the insert commits, so ids and timestamps can become
+# visible out of order; the window has to outlast the slowest insert plus clock skew
+SYNC_OVERLAP_SECONDS = 60
+
+
+def direction(condition: str) -> str:
+    return "above" if condition in ("crosses_above", "above") else "below"
+
+
+_RULE = re.compile(
+    r"^\s*(?:(?P<metric>rsi)\s*\(\s*(?P<msym>[^)]+?)\s*\)|(?P<sym>.+?))\s+"
+    r"(?P<op>crosses\s+above|crosses\s+below|>=|<=|>|<|above|below)\s+(?P<value>-?\d+(?:\.\d+)?)\s*$",
+    re.IGNORECASE,
+)
+_OPS = {">": "above", ">=": "above", "above": "above", "<": "below", "<=": "below", "below": "below",
+        "crosses above": "crosses_above", "crosses below": "crosses_below"}
+
+
+def parse_rule(rule: str):
+    # "RELIANCE crosses above 2900" / "RSI(TCS) < 30" -> (symbol, metric, condition, threshold)
+    m = _RULE.match(rule)
+    if m is None:
+        raise ValueError(f"can't parse alert rule: {rule!r}")
+    op = " ".join(m["op"].lower().split())
+    if m["metric"]:
+        return m["msym"].upper(), "rsi", _OPS[op], float(m["value"])
+    return m["sym"].strip().upper(), "price", _OPS[op], float(m["value"])
+
+
+class ThresholdIndex:
+    # one (symbol, metric, direction): thresholds sorted ascending with their alert ids.
+    # new alerts wait in a small unsorted buffer until they get merged in with one
+    # O(n) insert, removed ones are tombstoned until they are a quarter of the index
+
+    BUFFER = 1024
+
+    def __init__(self):
+        self.thresholds = np.empty(0, dtype=np.float64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self._new_thresholds = []
+        self._new_ids = []
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.ids) + len(self._new_ids) - len(self.removed)
+
+    def add(self, ids, thresholds):
+        self._new_ids.extend(ids)
+        self._new_thresholds.extend(thresholds)
+        if len(self._new_ids) >= self.BUFFER:
+            self.merge()
+
+    def discard(self, alert_id: int):
+        self.removed.add(alert_id)
+        if len(self.removed) > max(self.BUFFER, len(self.ids) // 4):
+            self.compact()
+
+    def merge(self):
+        if not self._new_ids:
+            return
+        new_thresholds = np.asarray(self._new_thresholds, dtype=np.float64)
+        order = np.argsort(new_thresholds, kind="stable")
+        new_thresholds = new_thresholds[order]
+        pos = np.searchsorted(self.thresholds, new_thresholds, side="right")
+        self.thresholds = np.insert(self.thresholds, pos, new_thresholds)
+        self.ids = np.insert(self.ids, pos, np.asarray(self._new_ids, dtype=np.int64)[order])
+        self._new_ids, self._new_thresholds = [], []
+
+    def compact(self):
+        self.merge()
+        if self.removed:
+            keep = ~np.isin(self.ids, np.fromiter(self.removed, dtype=np.int64, count=len(self.removed)))
+            self.ids, self.thresholds = self.ids[keep], self.thresholds[keep]
+            self.removed = set()
+
+    def crossed(self, old: float, new: float, up: bool) -> list:
+        # up: old < t <= new, down: new <= t < old. fired alerts are removed
+        if up:
+            lo = np.searchsorted(self.thresholds, old, side="right")
+            hi = np.searchsorted(self.thresholds, new, side="right")
+        else:
+            lo = np.searchsorted(self.thresholds, new, side="left")
+            hi = np.searchsorted(self.thresholds, old, side="left")
+        hits = [i for i in self.ids[lo:hi].tolist() if i not in self.removed]
+
+        if self._new_ids:
+            pending = np.asarray(self._new_thresholds)
+            mask = (pending > old) & (pending <= new) if up else (pending >= new) & (pending < old)
+            if mask.any():
+                hits.extend(i for i in np.asarray(self._new_ids)[mask].tolist() if i not in self.removed)
+
+        for i in hits:
+            self.discard(i)
+        return hits
+
+
+class AlertEngine:
+
+    def __init__(self):
+        self._index = {}
+        self._last = {}  # (symbol, metric) -> latest value
+        self._lock = threading.Lock()
+        # (alert_id, value, unix ts) waiting for delivery
+        self.queue = deque()
+        self.stats = {"updates": 0, "triggered": 0}
+        # newest created_at loaded from the db, plus every id loaded or indexed by this
+        # worker inside the overlap window, so re-reading the window doesn't add them twice
+        self.synced_at: Optional[datetime] = None
+        self._recent = {}  # alert id -> created_at
+
+    def _get_index(self, symbol, metric, side) -> ThresholdIndex:
+        key = (symbol, metric, side)
+        index = self._index.get(key)
+        if index is None:
+            index = self._index[key] = ThresholdIndex()
+        return index
+
+    def add(self, alert_id: int, symbol: str, metric: str, condition: str, threshold: float,
+            created_at: Optional[datetime] = None) -> bool:
+        # returns True when a level alert already holds and fired on the spot
+        with self._lock:
+            self._recent[alert_id] = created_at or datetime.utcnow()
+            side = direction(condition)
+            current = self._last.get((symbol, metric))
+            if condition in LEVEL_CONDITIONS and current is not None:
+                if (current >= threshold) if side == "above" else (current <= threshold):
+                    self._fire([alert_id], current)
+                    return True
+            self._get_index(symbol, metric, side).add([alert_id], [threshold])
+            return False
+
+    def add_many(self, alerts):
+        # bulk load: (id, symbol, metric, condition, threshold) rows
+        grouped = {}
+        for alert_id, symbol, metric, condition, threshold in alerts:
+            if alert_id in self._recent:
+                continue
+            ids, thresholds = grouped.setdefault((symbol, metric, direction(condition)), ([], []))
+            ids.append(alert_id)
+            thresholds.append(threshold)
+        with self._lock:
+            for key, (ids, thresholds) in grouped.items():
+                index = self._get_index(*key)
+                index.add(ids, thresholds)
+                # bulk loads go straight into the sorted arrays
+                index.merge()
+
+    def sync_from(self) -> Optional[datetime]:
+        # None = never synced, load everything
+        if self.synced_at is None:
+            return None
+        return self.synced_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+    def mark_synced(self, rows):
+        # (id, created_at) pairs just loaded
+        with self._lock:
+            for alert_id, created_at in rows:
+                if created_at is None:
+                    continue
+                self._recent[alert_id] = created_at
+                if self.synced_at is None or created_at > self.synced_at:
+                    self.synced_at = created_at
+            since = self.sync_from()
+            if since is not None:
+                self._recent = {i: t for i, t in self._recent.items() if t >= since}
+
+    def cancel(self, alert_id: int, symbol: str, metric: str, condition: str):
+        with self._lock:
+            index = self._index.get((symbol, metric, direction(condition)))
+            if index is not None:
+                index.discard(alert_id)
+
+    def update(self, symbol: str, metric: str, value: float) -> list:
+        value = float(value)
+        with self._lock:
+            self.stats["updates"] += 1
+            old = self._last.get((symbol, metric))
+            self._last[(symbol, metric)] = value
+            if old is None or old == value:
+                return []
+            up = value > old
+            index = self._index.get((symbol, metric, "above" if up else "below"))
+            if index is None:
+                return []
+            hits = index.crossed(old, value, up)
+            if hits:
+                self._fire(hits, value)
+            return hits
+
+    def update_many(self, symbols, metric: str, values) -> list:
+        hits = []
+        for symbol, value in zip(symbols, values):
+            if not np.isnan(value):
+                hits.extend(self.update(symbol, metric, value))
+        return hits
+
+    def has_alerts(self, metric: str) -> bool:
+        return any(key[1] == metric and len(index) for key, index in self._index.items())
+
+    def _fire(self, ids, value):
+        now = time.time()
+        self.stats["triggered"] += len(ids)
+        self.queue.extend((i, value, now) for i in ids)
+
+    def on_bars(self, agg):
+        # tick feed listener: last prices every cycle, daily rsi only when someone asked for it
+        series = agg.series["1d"]
+        with agg.lock:
+            last = series.window(1)[:, -1]
+            close = series.window(RSI_BARS) if self.has_alerts("rsi") else None
+        self.update_many(agg.symbols, "price", last)
+        if close is not None:
+            self.update_many(agg.symbols, "rsi", indicators.rsi(close)[:, -1])
+
+
+async def load_active(engine: AlertEngine) -> int:
+    # every active alert the engine hasn't seen yet: all of them at startup, then
+    # whatever other workers created since the last sync, minus the overlap window.
+    # the watermark is created_at, not the id: ids can commit out of order on postgres
+    loaded = 0
+    query = (
+        select(models.Alert.id, models.Alert.symbol, models.Alert.metric,
+               models.Alert.condition, models.Alert.threshold, models.Alert.created_at)
+        .where(models.Alert.status == "active")
+        .order_by(models.Alert.created_at)
+        .execution_options(yield_per=10000)
+    )
+    since = engine.sync_from()
+    if since is not None:
+        query = query.where(models.Alert.created_at >= since)
+    async with database.SessionLocal() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            fresh = [tuple(r[:5]) for r in rows if r[0] not in engine._recent]
+            engine.add_many(fresh)
+            engine.mark_synced([(r[0], r[5]) for r in rows])
+            loaded += len(fresh)
+    return loaded
+
+
+async def deliver(engine: AlertEngine, limit: int = DELIVERY_BATCH) -> int:
+    # one executemany per batch; the status guard means a trigger already written
+    # by another worker (or a cancel that raced the trigger) updates nothing
+    taken = []
+    while engine.queue and len(taken) < limit:
+        taken.append(engine.queue.popleft())
+    if not taken:
+        return 0
+    batch = [{"b_id": alert_id, "b_value": value, "b_ts": datetime.fromtimestamp(ts, tz=timezone.utc).replace(tzinfo=None)}
+             for alert_id, value, ts in taken]
+    table = models.Alert.__table__
+    try:
+        async with database.SessionLocal() as db:
+            # core table, not the orm entity: the orm would treat this as a by-primary-key bulk update
+            await db.execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"), table.c.status == "active")
+                .values(status="triggered", triggered_at=bindparam("b_ts"), triggered_value=bindparam("b_value")),
+                batch,
+            )
+            await db.commit()
+    except BaseException:
+        # these already left the index when they fired, the queue is the only copy:
+        # put them back in front so the next tick writes them
+        engine.queue.extendleft(reversed(taken))
+        raise
+    return len(taken)
+
+
+class AlertDelivery:
+
+    def __init__(self, engine: AlertEngine, interval: float = DELIVERY_INTERVAL_SECONDS):
+        self.engine = engine
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # whatever fired before shutdown still gets written
+        while await deliver(self.engine):
+            pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await load_active(self.engine)
+                while await deliver(self.engine) == DELIVERY_BATCH:
+                    pass
+            except Exception:
+                log.exception("alert delivery failed")
+                metrics.BACKGROUND_ERRORS.inc(task="alert_delivery")
+
+
+alert_engine = AlertEngine()
+delivery = AlertDelivery(alert_engine)
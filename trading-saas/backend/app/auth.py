@@ -1,36 +1,33 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt 
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from . import models, database, schemas
-import os 
-import hashlib
-from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, database, schemas, passwords, metrics
+from .cache import TTLCache
+from .config import get_settings
+import time
 
-load_dotenv() 
+settings = get_settings()
 
 # jwt stuff
-SECRET_KEY = os.getenv("SECRET_KEY")
-ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto") 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-def get_password_hash(password):
-    if len(password.encode('utf-8')) > 72:
-        password = hashlib.sha256(password.encode('utf-8')).hexdigest()
-    return pwd_context.hash(password)
+passwords.configure(settings.password_hash_workers, settings.password_hash_max_pending,
+                    settings.password_hash_timeout_seconds)
 
-
-def verify_password(plain_password, hashed_password):
-    # check pwd match
-    if len(plain_password.encode('utf-8')) > 72:
-        plain_password = hashlib.sha256(plain_password.encode('utf-8')).hexdigest()
-    return pwd_context.verify(plain_password, hashed_password)
+# sync versions for scripts, handlers await the pooled ones
+get_password_hash = passwords.hash_password
+verify_password = passwords.check_password
+# timed here, passwords.py stays free of app imports for the spawned workers
+hash_password_async = metrics.timed_async(metrics.AUTH_LATENCY, operation="bcrypt_hash")(passwords.hash_password_async)
+verify_password_async = metrics.timed_async(metrics.AUTH_LATENCY, operation="bcrypt_verify")(passwords.verify_password_async)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -46,24 +43,78 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    # get user from jwt token
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+class Principal:
+    # detached snapshot of the user + entitlements, what routes read off current_user
+
+    __slots__ = ("id", "email", "is_pro", "subscription_end_date", "stripe_customer_id", "stripe_subscription_id")
+
+    def __init__(self, id, email, is_pro, subscription_end_date=None, stripe_customer_id=None, stripe_subscription_id=None):
+        self.id = id
+        self.email = email
+        self.is_pro = bool(is_pro)
+        self.subscription_end_date = subscription_end_date
+        self.stripe_customer_id = stripe_customer_id
+        self.stripe_subscription_id = stripe_subscription_id
+
+    @classmethod
+    def from_user(cls, user: models.User):
+        return cls(user.id, user.email, user.is_pro, user.subscription_end_date,
+                   user.stripe_customer_id, user.stripe_subscription_id)
+
+
+# verified principals, keyed by email (the jwt subject)
+# short ttl bounds staleness on other workers, billing invalidates explicitly
+PRINCIPAL_CACHE_TTL = settings.principal_cache_ttl_seconds
+principal_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_CACHE_TTL)
+
+# token -> subject, so repeat requests skip the jwt decode too
+token_cache = TTLCache(maxsize=10000, ttl=PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(email: str):
+    principal_cache.pop(email)
+
+
+def _token_subject(token: str, credentials_exception) -> str:
+    email = token_cache.get(token)
+    if email is not None:
+        return email
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        with metrics.AUTH_LATENCY.time(operation="jwt_decode"):
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: Optional[str] = payload.get("sub")
         if email is None:
             raise credentials_exception
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    
+
+    # never keep a token cached past its own expiry
+    exp = payload.get("exp")
+    ttl = PRINCIPAL_CACHE_TTL if exp is None else min(PRINCIPAL_CACHE_TTL, exp - time.time())
+    if ttl > 0:
+        token_cache.set(token, token_data.email, ttl=ttl)
+    return token_data.email
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_db)):
+    # get user from jwt token
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    email = _token_subject(token, credentials_exception)
+
+    principal = principal_cache.get(email)
+    if principal is not None:
+        return principal
+
     # get user from db
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    principal = Principal.from_user(user)
+    principal_cache.set(email, principal)
+    return principal
\ No newline at end of file
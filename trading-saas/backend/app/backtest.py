@@ -0,0 +1,253 @@
+import asyncio
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np
+from fastapi import HTTPException
+from . import engine, indicators, store
+from .config import get_settings
+
+# replays compute_signals over historical closes, every metric is array math over
+# (n_symbols, n_bars). big grids fan out over a spawn pool: each task gets a slice of
+# symbols and a handful of parameter combos. workers only import numpy and this module
+
+PARAMS = ("fast", "slow", "rsi_period", "rsi_low", "rsi_high", "bb_window", "bb_k", "threshold")
+
+settings = get_settings()
+
+BACKTEST_WORKERS = settings.backtest_workers
+BACKTEST_MAX_PENDING = settings.backtest_max_pending  # runs, not tasks
+MAX_COMBOS = settings.backtest_max_combos
+# below this many symbol-bars x combos pickling to a worker costs more than it saves
+INLINE_CELLS = 2_000_000
+SYMBOL_CHUNK = 500
+COMBO_CHUNK = 8
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+def fill_leading(close: np.ndarray) -> np.ndarray:
+    # nan-padded short histories start flat at their first price (zero return)
+    close = np.array(close, dtype=np.float64)
+    missing = np.isnan(close)
+    if missing.any():
+        first = np.argmax(~missing, axis=1)
+        seed = close[np.arange(len(close)), first]
+        close = np.where(missing, seed[:, None], close)
+    return close
+
+
+def _align(cols: dict):
+    # stored symbols can have different calendars: union of timestamps, gaps carry the last close
+    ts = np.unique(np.concatenate([c["ts"] for c in cols.values()]))
+    close = np.full((len(cols), len(ts)), np.nan)
+    for i, c in enumerate(cols.values()):
+        close[i, np.searchsorted(ts, c["ts"])] = c["close"]
+    seen = np.where(np.isnan(close), 0, np.arange(len(ts)))
+    np.maximum.accumulate(seen, axis=1, out=seen)
+    close = np.take_along_axis(close, seen, axis=1)
+    return close, ts
+
+
+def load_history(symbols, start: Optional[int] = None, end: Optional[int] = None):
+    # daily closes (n_symbols, n_bars) and bar timestamps for start <= ts < end.
+    # the market data store when one is configured, otherwise the engine's window
+    daily = store.get_store("1d")
+    if daily is not None:
+        cols = daily.read_many(symbols, start, end, columns=["close"])
+        missing = [s for s, c in cols.items() if len(c["ts"]) == 0]
+        if missing:
+            raise KeyError(missing[0])
+        return _align(cols)
+
+    eng = engine.get_engine()
+    missing = [s for s in symbols if s not in eng.index]
+    if missing:
+        raise KeyError(missing[0])
+    idx = [eng.index[s] for s in symbols]
+    with eng._lock:
+        close = eng.close[idx].copy()
+        ts = eng.timestamps.copy()
+    keep = np.ones(len(ts), dtype=bool)
+    if start is not None:
+        keep &= ts >= start
+    if end is not None:
+        keep &= ts < end
+    return close[:, keep], ts[keep]
+
+
+def positions(actions: np.ndarray, allow_short: bool = False) -> np.ndarray:
+    # BUY goes long, SELL goes flat (or short), HOLD keeps whatever was held
+    n = actions.shape[1]
+    target = np.where(actions == indicators.BUY, 1.0, -1.0 if allow_short else 0.0)
+    last = np.where(actions != indicators.HOLD, np.arange(n), -1)
+    np.maximum.accumulate(last, axis=1, out=last)
+    pos = np.take_along_axis(target, np.maximum(last, 0), axis=1)
+    pos[last < 0] = 0.0
+    return pos
+
+
+def _summary(ret: np.ndarray, periods_per_year: int):
+    # total return, sharpe and max drawdown along the last axis
+    equity = np.cumprod(1.0 + ret, axis=-1)
+    drawdown = equity / np.maximum.accumulate(equity, axis=-1) - 1.0
+    std = ret.std(axis=-1, ddof=1) if ret.shape[-1] > 1 else np.zeros(ret.shape[:-1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(std > 0, ret.mean(axis=-1) / std * np.sqrt(periods_per_year), 0.0)
+    return equity[..., -1] - 1.0, sharpe, drawdown.min(axis=-1)
+
+
+def evaluate(close: np.ndarray, actions: np.ndarray, allow_short: bool = False, cost_bps: float = 0.0,
+             periods_per_year: int = 252) -> dict:
+    # signal on bar t's close is filled at that close and earns bar t+1's return
+    n_sym, n = close.shape
+    pos = positions(actions, allow_short)
+    held = np.zeros_like(pos)
+    held[:, 1:] = pos[:, :-1]
+    bar_ret = np.zeros_like(close)
+    bar_ret[:, 1:] = close[:, 1:] / close[:, :-1] - 1.0
+    change = np.diff(held, axis=1, prepend=0.0)
+    ret = held * bar_ret - np.abs(change) * cost_bps / 1e4
+
+    total, sharpe, max_dd = _summary(ret, periods_per_year)
+
+    # a trade runs from an entry (or flip) to the next one; the flat bars after it only
+    # carry the exit cost, so summing log returns up to the next boundary prices it
+    entries = (held != 0) & (change != 0)
+    flat_entries = np.flatnonzero(entries.ravel())
+    bounds = np.union1d(flat_entries, np.arange(n_sym) * n)
+    seg = np.add.reduceat(np.log1p(ret).ravel(), bounds)
+    is_trade = np.isin(bounds, flat_entries)
+    trade_rows = bounds[is_trade] // n
+    trades = np.bincount(trade_rows, minlength=n_sym)
+    wins = np.bincount(trade_rows[seg[is_trade] > 0], minlength=n_sym)
+
+    return {
+        "total_return": total,
+        "sharpe": sharpe,
+        "max_drawdown": max_dd,
+        "hit_rate": np.divide(wins, trades, out=np.zeros(n_sym), where=trades > 0),
+        "trades": trades,
+        "wins": wins,
+        "exposure": (held != 0).mean(axis=1),
+        "returns": ret,
+    }
+
+
+def _evaluate_chunk(close, combos, allow_short, cost_bps, periods_per_year):
+    # one pool task: a slice of symbols under a few parameter combos
+    out = []
+    for params in combos:
+        actions = indicators.compute_signals(close, **params)
+        metrics = evaluate(close, actions, allow_short, cost_bps, periods_per_year)
+        # the portfolio needs every symbol, ship back the per-bar sum instead of the matrix
+        metrics["returns"] = metrics["returns"].sum(axis=0)
+        out.append(metrics)
+    return out
+
+
+def grid(**axes) -> list:
+    # {"fast": [5, 10], "slow": [30]} -> every combination, as compute_signals kwargs
+    names = [p for p in PARAMS if axes.get(p)]
+    combos = [dict(zip(names, values)) for values in itertools.product(*(axes[p] for p in names))]
+    # fast/slow crossovers need fast < slow, the rsi band needs low < high
+    return [c for c in combos if c.get("fast", 10) < c.get("slow", 30) and c.get("rsi_low", 30) < c.get("rsi_high", 70)]
+
+
+def _round(x):
+    return round(float(x), 4)
+
+
+def _assemble(symbols, combos, chunks, periods_per_year):
+    # chunks[i][j] = metrics of symbol slice i under combo j
+    results = []
+    n_sym = len(symbols)
+    for j, params in enumerate(combos):
+        parts = [chunk[j] for chunk in chunks]
+        per_symbol = {k: np.concatenate([p[k] for p in parts])
+                      for k in ("total_return", "sharpe", "max_drawdown", "hit_rate", "trades", "exposure")}
+        # equal weight across symbols, rebalanced every bar
+        port_ret = sum(p["returns"] for p in parts) / n_sym
+        total, sharpe, max_dd = _summary(port_ret, periods_per_year)
+        trades = int(sum(p["trades"].sum() for p in parts))
+        wins = int(sum(p["wins"].sum() for p in parts))
+        results.append({
+            "params": params,
+            "portfolio": {
+                "total_return": _round(total),
+                "sharpe": _round(sharpe),
+                "max_drawdown": _round(max_dd),
+                "hit_rate": _round(wins / trades) if trades else 0.0,
+                "trades": trades,
+                "exposure": _round(per_symbol["exposure"].mean()),
+            },
+            "symbols": {
+                sym: {
+                    "total_return": _round(per_symbol["total_return"][i]),
+                    "sharpe": _round(per_symbol["sharpe"][i]),
+                    "max_drawdown": _round(per_symbol["max_drawdown"][i]),
+                    "hit_rate": _round(per_symbol["hit_rate"][i]),
+                    "trades": int(per_symbol["trades"][i]),
+                }
+                for i, sym in enumerate(symbols)
+            },
+        })
+    return results
+
+
+def run_grid(symbols, close, combos, allow_short: bool = False, cost_bps: float = 0.0,
+             periods_per_year: int = 252) -> list:
+    # in-process, used for small runs and by tests
+    close = fill_leading(close)
+    chunks = [_evaluate_chunk(close, combos, allow_short, cost_bps, periods_per_year)]
+    return _assemble(symbols, combos, chunks, periods_per_year)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BACKTEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_grid_async(symbols, close, combos, allow_short: bool = False, cost_bps: float = 0.0,
+                         periods_per_year: int = 252) -> list:
+    global _pending
+    close = fill_leading(close)
+    n_sym, n_bars = close.shape
+    if n_sym * n_bars * len(combos) <= INLINE_CELLS:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, run_grid, symbols, close, combos, allow_short, cost_bps,
+                                          periods_per_year)
+
+    if _pending >= BACKTEST_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Backtest queue full, try again shortly",
+                            headers={"Retry-After": "5"})
+    _pending += 1
+    try:
+        pool = get_pool()
+        sym_slices = [slice(i, i + SYMBOL_CHUNK) for i in range(0, n_sym, SYMBOL_CHUNK)]
+        combo_groups = [combos[i:i + COMBO_CHUNK] for i in range(0, len(combos), COMBO_CHUNK)]
+        futures = [
+            [asyncio.wrap_future(pool.submit(_evaluate_chunk, close[s], group, allow_short, cost_bps,
+                                             periods_per_year))
+             for group in combo_groups]
+            for s in sym_slices
+        ]
+        done = [await asyncio.gather(*row) for row in futures]
+        # stitch combo groups back together per symbol slice
+        chunks = [list(itertools.chain.from_iterable(row)) for row in done]
+        # a dict per symbol per combo, thousands of them: build them off the event loop too
+        return await asyncio.get_running_loop().run_in_executor(None, _assemble, symbols, combos, chunks,
+                                                                periods_per_year)
+    finally:
+        _pending -= 1
@@ -0,0 +1,319 @@
+import asyncio
+import csv
+import logging
+import threading
+import time
+from typing import Optional
+import numpy as np
+from . import engine, indicators, metrics
+from .config import get_settings
+
+log = logging.getLogger(__name__)
+
+# tick stream -> ohlcv bars for every timeframe at once
+# ticks arrive as parallel arrays (symbol index, ts seconds, price, size), never as python objects.
+# each timeframe keeps (n_symbols, capacity) ring buffers, one row per symbol
+
+TIMEFRAMES = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+
+DEFAULT_CAPACITY = 512
+# bars fed to the indicators per signal request, enough for the slow sma and macd
+SIGNAL_BARS = 120
+
+
+def _rollup(sym, bucket, o, h, l, c, v):
+    # one group per (symbol, bucket) run; input is sorted by symbol, then time
+    brk = np.empty(len(sym), dtype=bool)
+    brk[0] = True
+    np.not_equal(sym[1:], sym[:-1], out=brk[1:])
+    brk[1:] |= bucket[1:] != bucket[:-1]
+    starts = np.flatnonzero(brk)
+    ends = np.empty_like(starts)
+    ends[:-1] = starts[1:] - 1
+    ends[-1] = len(sym) - 1
+    return (
+        sym[starts], bucket[starts], o[starts],
+        np.maximum.reduceat(h, starts), np.minimum.reduceat(l, starts),
+        c[ends], np.add.reduceat(v, starts),
+    )
+
+
+class BarSeries:
+
+    def __init__(self, n_symbols: int, seconds: int, capacity: int = DEFAULT_CAPACITY):
+        self.seconds = seconds
+        self.capacity = capacity
+        shape = (n_symbols, capacity)
+        self.open = np.full(shape, np.nan)
+        self.high = np.full(shape, np.nan)
+        self.low = np.full(shape, np.nan)
+        self.close = np.full(shape, np.nan)
+        self.volume = np.zeros(shape)
+        self.start = np.full(shape, -1, dtype=np.int64)
+        self.head = np.full(n_symbols, -1, dtype=np.int64)  # ring slot of the newest bar
+        self.count = np.zeros(n_symbols, dtype=np.int64)
+        self.last_start = np.full(n_symbols, -1, dtype=np.int64)
+        self.late = 0  # groups older than the current bar, dropped
+
+    def update(self, g_sym, g_start, g_open, g_high, g_low, g_close, g_vol):
+        # merge bar groups (sorted by symbol, then start) into the ring buffers
+        late = g_start < self.last_start[g_sym]
+        if late.any():
+            self.late += int(late.sum())
+            keep = ~late
+            g_sym, g_start, g_open, g_high, g_low, g_close, g_vol = (
+                a[keep] for a in (g_sym, g_start, g_open, g_high, g_low, g_close, g_vol))
+        n = len(g_sym)
+        if n == 0:
+            return
+
+        first = np.empty(n, dtype=bool)
+        first[0] = True
+        np.not_equal(g_sym[1:], g_sym[:-1], out=first[1:])
+        last = np.empty(n, dtype=bool)
+        last[-1] = True
+        last[:-1] = first[1:]
+
+        # the first group of a symbol may continue its still-open bar
+        merge = first & (g_start == self.last_start[g_sym])
+        if merge.any():
+            s = g_sym[merge]
+            h = self.head[s]
+            self.high[s, h] = np.maximum(self.high[s, h], g_high[merge])
+            self.low[s, h] = np.minimum(self.low[s, h], g_low[merge])
+            self.close[s, h] = g_close[merge]
+            self.volume[s, h] += g_vol[merge]
+
+        new = ~merge
+        if new.any():
+            ns = g_sym[new]
+            run = np.empty(len(ns), dtype=bool)
+            run[0] = True
+            np.not_equal(ns[1:], ns[:-1], out=run[1:])
+            run_starts = np.flatnonzero(run)
+            run_lengths = np.diff(np.append(run_starts, len(ns)))
+            rank = np.arange(len(ns)) - np.repeat(run_starts, run_lengths)
+            pos = (self.head[ns] + 1 + rank) % self.capacity
+            self.open[ns, pos] = g_open[new]
+            self.high[ns, pos] = g_high[new]
+            self.low[ns, pos] = g_low[new]
+            self.close[ns, pos] = g_close[new]
+            self.volume[ns, pos] = g_vol[new]
+            self.start[ns, pos] = g_start[new]
+            syms = ns[run_starts]
+            self.head[syms] = (self.head[syms] + run_lengths) % self.capacity
+            self.count[syms] += run_lengths
+
+        self.last_start[g_sym[last]] = g_start[last]
+
+    def window(self, n: int, field: str = "close") -> np.ndarray:
+        # newest n bars per symbol, oldest first; short histories are backfilled
+        # with their oldest bar so ema-style indicators get a clean seed
+        n = min(n, self.capacity)
+        arr = getattr(self, field)
+        offsets = np.arange(n - 1, -1, -1)
+        idx = (self.head[:, None] - offsets[None, :]) % self.capacity
+        out = np.take_along_axis(arr, idx, axis=1)
+        have = np.minimum(self.count, n)
+        missing = offsets[None, :] >= have[:, None]
+        if missing.any():
+            oldest = out[np.arange(len(out)), np.maximum(n - have, 0) % n]
+            out = np.where(missing, oldest[:, None], out)
+        return out
+
+
+class BarAggregator:
+
+    def __init__(self, symbols, timeframes=None, capacity: int = DEFAULT_CAPACITY):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        tfs = timeframes or TIMEFRAMES
+        # finest first, each coarser timeframe is rolled up from the one before it
+        self.timeframes = sorted(tfs, key=lambda tf: TIMEFRAMES[tf])
+        self.series = {tf: BarSeries(len(self.symbols), TIMEFRAMES[tf], capacity) for tf in self.timeframes}
+        self.ticks = 0
+        self.lock = threading.Lock()
+
+    def ingest(self, sym, ts, price, size, sorted_by_symbol: bool = False):
+        # ticks must be in time order; they get grouped per symbol with a stable sort
+        sym = np.asarray(sym)
+        if len(sym) == 0:
+            return
+        ts = np.asarray(ts, dtype=np.int64)
+        price = np.asarray(price, dtype=np.float64)
+        size = np.asarray(size, dtype=np.float64)
+        if not sorted_by_symbol:
+            order = np.argsort(sym, kind="stable")
+            sym, ts, price, size = sym[order], ts[order], price[order], size[order]
+
+        with self.lock:
+            groups = None
+            for tf in self.timeframes:
+                seconds = TIMEFRAMES[tf]
+                if groups is None:
+                    groups = _rollup(sym, ts - ts % seconds, price, price, price, price, size)
+                else:
+                    g_sym, g_start, o, h, l, c, v = groups
+                    groups = _rollup(g_sym, g_start - g_start % seconds, o, h, l, c, v)
+                self.series[tf].update(*groups)
+            self.ticks += len(sym)
+
+    def load_bars(self, tf: str, open_, high, low, close, volume, starts):
+        # seed a timeframe with existing (n_symbols, n_bars) history, e.g. daily bars
+        seconds = TIMEFRAMES[tf]
+        n_sym, n_bars = np.shape(close)
+        g_sym = np.repeat(np.arange(n_sym), n_bars)
+        g_start = np.tile(np.asarray(starts, dtype=np.int64), n_sym)
+        groups = _rollup(g_sym, g_start - g_start % seconds, *(np.asarray(a, dtype=np.float64).ravel()
+                                                                for a in (open_, high, low, close, volume)))
+        with self.lock:
+            self.series[tf].update(*groups)
+
+    def latest_signals(self, tf: str, symbols=None, n_bars: int = SIGNAL_BARS):
+        # same indicator rules as the daily engine, run on this timeframe's bars
+        if symbols is None:
+            symbols = self.symbols
+        idx = np.fromiter((self.index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+        series = self.series[tf]
+        with self.lock:
+            close = series.window(n_bars)[idx]
+            starts = series.last_start[idx]
+        actions = indicators.compute_signals(close)[:, -1]
+        return [
+            {
+                "id": sym,
+                "action": indicators.ACTIONS[int(a)],
+                "price": float(p),
+                "timestamp": engine.bar_isoformat(ts)
+            }
+            for sym, a, p, ts in zip(symbols, actions, np.round(close[:, -1], 2), starts)
+        ]
+
+
+class ReplaySource:
+    # deterministic synthetic ticks for offline runs, tests and benchmarks
+
+    def __init__(self, symbols, start_ts: int, tick_interval: float = 1.0, seed: int = 0, base_prices=None):
+        self.n = len(symbols)
+        self.cursor = float(start_ts)
+        self.tick_interval = tick_interval
+        self.rng = np.random.default_rng(seed)
+        if base_prices is None:
+            base_prices = self.rng.uniform(1000, 3000, size=self.n)
+        self.prices = np.asarray(base_prices, dtype=np.float64).copy()
+
+    def batch(self, end_ts: float):
+        # every symbol ticks once per interval up to end_ts, ordered by time
+        times = np.arange(self.cursor, end_ts, self.tick_interval)
+        if len(times) == 0:
+            empty = np.empty(0)
+            return empty.astype(np.int32), empty.astype(np.int64), empty, empty
+        self.cursor = times[-1] + self.tick_interval
+        steps = self.rng.normal(0.0, 0.0005, size=(len(times), self.n))
+        path = self.prices * np.exp(np.cumsum(steps, axis=0))
+        self.prices = path[-1].copy()
+        sym = np.tile(np.arange(self.n, dtype=np.int32), len(times))
+        ts = np.repeat(times.astype(np.int64), self.n)
+        size = self.rng.integers(1, 500, size=len(sym)).astype(np.float64)
+        return sym, ts, path.ravel(), size
+
+    def batches(self, end_ts: float, batch_seconds: float = 3600):
+        while self.cursor < end_ts:
+            yield self.batch(min(end_ts, self.cursor + batch_seconds))
+
+
+def load_ticks_csv(path: str, index: dict):
+    # recorded ticks: symbol,ts,price,size per row (ts in epoch seconds), rows in time order
+    sym, ts, price, size = [], [], [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            if row["symbol"] not in index:
+                continue
+            sym.append(index[row["symbol"]])
+            ts.append(int(float(row["ts"])))
+            price.append(float(row["price"]))
+            size.append(float(row.get("size") or 0))
+    return (np.asarray(sym, dtype=np.int32), np.asarray(ts, dtype=np.int64),
+            np.asarray(price, dtype=np.float64), np.asarray(size, dtype=np.float64))
+
+
+# live aggregator for the app: daily history from the engine, intraday backfilled from replay
+
+BACKFILL_HOURS = 48
+BACKFILL_TICK_SECONDS = 30.0
+FEED_TICK_SECONDS = 1.0
+FEED_INTERVAL_SECONDS = get_settings().tick_feed_interval_seconds
+# replay: synthetic ticks in process, off: bars only move when something calls ingest()
+FEED_ENABLED = get_settings().tick_feed != "off"
+
+_aggregator: Optional[BarAggregator] = None
+_source: Optional[ReplaySource] = None
+_init_lock = threading.Lock()
+
+
+def get_aggregator() -> BarAggregator:
+    global _aggregator, _source
+    if _aggregator is None:
+        with _init_lock:
+            if _aggregator is None:
+                eng = engine.get_engine()
+                now = time.time()
+                backfill_start = now - BACKFILL_HOURS * 3600
+                agg = BarAggregator(eng.symbols)
+                # daily bars from before the backfill window come from the engine, the rest from ticks
+                with eng._lock:
+                    keep = eng.timestamps < backfill_start - backfill_start % TIMEFRAMES["1d"]
+                    agg.load_bars("1d", eng.open[:, keep], eng.high[:, keep], eng.low[:, keep],
+                                  eng.close[:, keep], eng.volume[:, keep], eng.timestamps[keep])
+                    base_prices = eng.close[:, keep][:, -1] if keep.any() else eng.close[:, 0]
+                source = ReplaySource(eng.symbols, backfill_start, tick_interval=BACKFILL_TICK_SECONDS,
+                                      base_prices=base_prices)
+                for batch in source.batches(now):
+                    agg.ingest(*batch)
+                source.tick_interval = FEED_TICK_SECONDS
+                _source = source
+                _aggregator = agg
+    return _aggregator
+
+
+class TickFeed:
+    # stands in for a market data feed: replays ticks up to the wall clock every interval
+
+    def __init__(self, interval: float = FEED_INTERVAL_SECONDS):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._listeners = []
+
+    def subscribe(self, callback):
+        # callback(aggregator) after every ingested batch
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        from fastapi.concurrency import run_in_threadpool
+        # backfill is a few hundred ms of numpy, keep it off the loop
+        agg = await run_in_threadpool(get_aggregator)
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                agg.ingest(*_source.batch(time.time()))
+                for callback in self._listeners:
+                    callback(agg)
+            except Exception:
+                log.exception("tick feed failed")
+                metrics.BACKGROUND_ERRORS.inc(task="tick_feed")
+
+
+feed = TickFeed()
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Optional
+
+
+def format_sse(data: str, event: Optional[str] = None) -> bytes:
+    # one server-sent event frame
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    for line in data.splitlines() or [""]:
+        lines.append(f"data: {line}")
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Topic:
+    # latest-value slot shared by every subscriber of one view
+    # publishers swap in a pre-encoded frame and wake waiters, nobody gets a private queue
+    # so a slow consumer just skips to the newest frame instead of buffering old ones
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frame: Optional[bytes] = None
+        self.version = 0
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+
+    def publish(self, frame: bytes):
+        self.frame = frame
+        self.version += 1
+        # wake everyone waiting on the old event, new waiters get a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, seen: int, timeout: Optional[float] = None):
+        # returns (frame, version) once something newer than `seen` exists
+        # or (None, seen) on timeout so callers can send keepalives
+        if self.version > seen:
+            return self.frame, self.version
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None, seen
+        return self.frame, self.version
+
+
+class Broadcaster:
+
+    def __init__(self):
+        self.topics: dict[str, Topic] = {}
+
+    def topic(self, name: str) -> Topic:
+        if name not in self.topics:
+            self.topics[name] = Topic(name)
+        return self.topics[name]
+
+    def subscribe(self, name: str) -> Topic:
+        topic = self.topic(name)
+        topic.subscribers += 1
+        return topic
+
+    def unsubscribe(self, topic: Topic):
+        topic.subscribers = max(0, topic.subscribers - 1)
+
+    def subscriber_count(self) -> int:
+        return sum(t.subscribers for t in self.topics.values())
+
+    def active_topics(self):
+        return [t for t in self.topics.values() if t.subscribers > 0]
+
+    def publish(self, name: str, frame: bytes):
+        self.topic(name).publish(frame)
+
+
+broadcaster = Broadcaster()
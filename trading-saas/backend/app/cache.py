@@ -0,0 +1,137 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+def _consume_error(task):
+    if not task.cancelled():
+        task.exception()
+
+
+class _Entry:
+    __slots__ = ("value", "fresh_until", "stale_until")
+
+    def __init__(self, value, fresh_until, stale_until):
+        self.value = value
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+
+
+class TTLCache:
+    # bounded lru with a per-entry ttl plus an optional stale window
+    # safe to share between the event loop and threadpool handlers
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, stale_ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _entry(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry.stale_until:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def get(self, key, default=None):
+        # fresh values only
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None or time.monotonic() >= entry.fresh_until:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry.value
+
+    def get_entry(self, key):
+        # returns (value, is_fresh) or None, stale values included
+        with self._lock:
+            entry = self._entry(key)
+            if entry is None:
+                return None
+            return entry.value, time.monotonic() < entry.fresh_until
+
+    def set(self, key, value, ttl: float = None, stale_ttl: float = None):
+        now = time.monotonic()
+        fresh_until = now + (self.ttl if ttl is None else ttl)
+        stale_until = fresh_until + (self.stale_ttl if stale_ttl is None else stale_ttl)
+        with self._lock:
+            self._data[key] = _Entry(value, fresh_until, stale_until)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry.value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    # l1 in process, l2 (redis) behind the loader
+    # stale entries are served while exactly one task per key refreshes them
+
+    def __init__(self, l1: TTLCache):
+        self.l1 = l1
+        self._inflight: dict = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "l2_hits": 0, "l2_misses": 0}
+
+    async def get(self, key, loader):
+        found = self.l1.get_entry(key)
+        if found is not None:
+            value, fresh = found
+            if fresh:
+                self.stats["hits"] += 1
+            else:
+                self.stats["stale_hits"] += 1
+                task = self._flight(key, loader)
+                # nobody awaits a background refresh, keep its errors from going unretrieved
+                task.add_done_callback(_consume_error)
+            return value
+
+        self.stats["misses"] += 1
+        # concurrent misses all await the same load
+        return await asyncio.shield(self._flight(key, loader))
+
+    def _flight(self, key, loader):
+        task = self._inflight.get(key)
+        if task is None or task.done() or task.get_loop().is_closed():
+            task = asyncio.create_task(self._refresh(key, loader))
+            self._inflight[key] = task
+        return task
+
+    async def _refresh(self, key, loader):
+        try:
+            self.stats["refreshes"] += 1
+            value = await loader()
+            self.l1.set(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self, key):
+        self.l1.pop(key)
+
+    def snapshot_stats(self):
+        stats = dict(self.stats)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["stale_hits"]) / lookups, 4) if lookups else 0.0
+        l2_lookups = stats["l2_hits"] + stats["l2_misses"]
+        stats["l2_hit_rate"] = round(stats["l2_hits"] / l2_lookups, 4) if l2_lookups else 0.0
+        return stats
@@ -0,0 +1,334 @@
+import time
+from typing import Mapping, Optional
+from .config import get_settings
+
+# one async redis-style backend shared by every router
+# CACHE_BACKEND=upstash|memory, defaults to upstash when credentials are set
+
+
+class Pipeline:
+    # queues commands and sends them in one round trip on exec()
+    # transaction=True runs them as MULTI/EXEC
+
+    def __init__(self, backend: "CacheBackend", transaction: bool = False):
+        self._backend = backend
+        self.transaction = transaction
+        self.commands = []
+
+    def _queue(self, name, *args, **kwargs):
+        self.commands.append((name, args, kwargs))
+        return self
+
+    def get(self, key):
+        return self._queue("get", key)
+
+    def set(self, key, value, ex: Optional[int] = None, nx: bool = False):
+        return self._queue("set", key, value, ex=ex, nx=nx)
+
+    def setex(self, key, seconds: int, value):
+        return self._queue("setex", key, seconds, value)
+
+    def delete(self, *keys):
+        return self._queue("delete", *keys)
+
+    def incr(self, key):
+        return self._queue("incr", key)
+
+    def expire(self, key, seconds: int, nx: bool = False):
+        return self._queue("expire", key, seconds, nx=nx)
+
+    def pexpire(self, key, millis: int, nx: bool = False):
+        return self._queue("pexpire", key, millis, nx=nx)
+
+    def ttl(self, key):
+        return self._queue("ttl", key)
+
+    def pttl(self, key):
+        return self._queue("pttl", key)
+
+    def mget(self, *keys):
+        return self._queue("mget", *keys)
+
+    def mset(self, mapping: Mapping):
+        return self._queue("mset", mapping)
+
+    async def exec(self):
+        commands, self.commands = self.commands, []
+        if not commands:
+            return []
+        return await self._backend._exec(commands, self.transaction)
+
+
+class CacheBackend:
+
+    async def get(self, key) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key, value, ex: Optional[int] = None, nx: bool = False) -> bool:
+        raise NotImplementedError
+
+    async def setex(self, key, seconds: int, value) -> bool:
+        return await self.set(key, value, ex=seconds)
+
+    async def delete(self, *keys) -> int:
+        raise NotImplementedError
+
+    async def incr(self, key) -> int:
+        raise NotImplementedError
+
+    async def expire(self, key, seconds: int, nx: bool = False) -> bool:
+        raise NotImplementedError
+
+    async def pexpire(self, key, millis: int, nx: bool = False) -> bool:
+        raise NotImplementedError
+
+    async def ttl(self, key) -> int:
+        raise NotImplementedError
+
+    async def pttl(self, key) -> int:
+        raise NotImplementedError
+
+    async def mget(self, *keys) -> list:
+        raise NotImplementedError
+
+    async def mset(self, mapping: Mapping) -> bool:
+        raise NotImplementedError
+
+    async def set_many(self, mapping: Mapping, ex: Optional[int] = None):
+        # batched write, one round trip
+        if ex is None:
+            return await self.mset(mapping)
+        pipe = self.pipeline()
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=ex)
+        return await pipe.exec()
+
+    def pipeline(self, transaction: bool = False) -> Pipeline:
+        return Pipeline(self, transaction)
+
+    async def _exec(self, commands, transaction: bool):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class UpstashBackend(CacheBackend):
+    # one async client per worker, its httpx pool keeps the connection to upstash alive
+
+    def __init__(self, url: str, token: str):
+        from upstash_redis.asyncio import Redis
+        self.client = Redis(url=url, token=token)
+
+    async def get(self, key):
+        return await self.client.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        return bool(await self.client.set(key, value, ex=ex, nx=nx or None))
+
+    async def delete(self, *keys):
+        return await self.client.delete(*keys)
+
+    async def incr(self, key):
+        return await self.client.incr(key)
+
+    async def expire(self, key, seconds, nx=False):
+        return bool(await self.client.expire(key, seconds, nx=nx))
+
+    async def pexpire(self, key, millis, nx=False):
+        return bool(await self.client.pexpire(key, millis, nx=nx))
+
+    async def ttl(self, key):
+        return await self.client.ttl(key)
+
+    async def pttl(self, key):
+        return await self.client.pttl(key)
+
+    async def mget(self, *keys):
+        return await self.client.mget(*keys)
+
+    async def mset(self, mapping):
+        return bool(await self.client.mset(dict(mapping)))
+
+    async def _exec(self, commands, transaction):
+        pipe = self.client.multi() if transaction else self.client.pipeline()
+        for name, args, kwargs in commands:
+            if name == "set":
+                kwargs = dict(kwargs, nx=kwargs.get("nx") or None)
+            elif name == "mset":
+                args = (dict(args[0]),)
+            getattr(pipe, name)(*args, **kwargs)
+        results = await pipe.exec()
+        # match the single-command return types
+        return [
+            bool(res) if name in ("set", "setex", "expire", "pexpire", "mset") else res
+            for (name, _, _), res in zip(commands, results)
+        ]
+
+    async def close(self):
+        await self.client.close()
+
+
+class MemoryBackend(CacheBackend):
+    # in-process stand-in with the same return values as the upstash client
+    # used by tests and offline benchmarks, every command is atomic on the event loop
+
+    def __init__(self):
+        self._data: dict = {}
+        self._expires: dict = {}
+        self._writes = 0
+
+    def _alive(self, key) -> bool:
+        exp = self._expires.get(key)
+        if exp is not None and time.monotonic() >= exp:
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    def _sweep(self):
+        # drop expired keys now and then so the dict doesn't grow forever
+        self._writes += 1
+        if self._writes % 1024 == 0:
+            now = time.monotonic()
+            for key in [k for k, exp in self._expires.items() if now >= exp]:
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+
+    def _get(self, key):
+        return self._data[key] if self._alive(key) else None
+
+    def _set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key):
+            return False
+        self._data[key] = str(value)
+        if ex is not None:
+            self._expires[key] = time.monotonic() + ex
+        else:
+            self._expires.pop(key, None)
+        self._sweep()
+        return True
+
+    def _setex(self, key, seconds, value):
+        return self._set(key, value, ex=seconds)
+
+    def _delete(self, *keys):
+        count = 0
+        for key in keys:
+            if self._alive(key):
+                count += 1
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return count
+
+    def _incr(self, key):
+        value = int(self._get(key) or 0) + 1
+        self._data[key] = str(value)
+        self._sweep()
+        return value
+
+    def _pexpire(self, key, millis, nx=False):
+        if not self._alive(key):
+            return False
+        if nx and key in self._expires:
+            return False
+        self._expires[key] = time.monotonic() + millis / 1000
+        return True
+
+    def _expire(self, key, seconds, nx=False):
+        return self._pexpire(key, seconds * 1000, nx=nx)
+
+    def _pttl(self, key):
+        if not self._alive(key):
+            return -2
+        exp = self._expires.get(key)
+        if exp is None:
+            return -1
+        return max(0, int((exp - time.monotonic()) * 1000))
+
+    def _ttl(self, key):
+        pttl = self._pttl(key)
+        return pttl if pttl < 0 else (pttl + 999) // 1000
+
+    def _mget(self, *keys):
+        return [self._get(key) for key in keys]
+
+    def _mset(self, mapping):
+        for key, value in mapping.items():
+            self._set(key, value)
+        return True
+
+    async def get(self, key):
+        return self._get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        return self._set(key, value, ex=ex, nx=nx)
+
+    async def delete(self, *keys):
+        return self._delete(*keys)
+
+    async def incr(self, key):
+        return self._incr(key)
+
+    async def expire(self, key, seconds, nx=False):
+        return self._expire(key, seconds, nx=nx)
+
+    async def pexpire(self, key, millis, nx=False):
+        return self._pexpire(key, millis, nx=nx)
+
+    async def ttl(self, key):
+        return self._ttl(key)
+
+    async def pttl(self, key):
+        return self._pttl(key)
+
+    async def mget(self, *keys):
+        return self._mget(*keys)
+
+    async def mset(self, mapping):
+        return self._mset(mapping)
+
+    async def _exec(self, commands, transaction):
+        # no awaits in here, so the batch is atomic just like MULTI/EXEC
+        return [getattr(self, "_" + name)(*args, **kwargs) for name, args, kwargs in commands]
+
+    def clear(self):
+        self._data.clear()
+        self._expires.clear()
+
+
+_backend: Optional[CacheBackend] = None
+
+
+def create_backend() -> CacheBackend:
+    settings = get_settings()
+    url = settings.upstash_redis_rest_url
+    token = settings.upstash_redis_rest_token
+    kind = settings.cache_backend or ("upstash" if url and token else "memory")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "upstash":
+        return UpstashBackend(url, token)
+    raise ValueError(f"unknown CACHE_BACKEND: {kind}")
+
+
+def get_cache() -> CacheBackend:
+    global _backend
+    if _backend is None:
+        # every command gets timed for /metrics
+        from .metrics import InstrumentedBackend
+        _backend = InstrumentedBackend(create_backend())
+    return _backend
+
+
+def set_cache(backend: Optional[CacheBackend]):
+    # swap the shared backend, mainly for tests and benchmarks
+    global _backend
+    _backend = backend
+
+
+async def close_cache():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
@@ -0,0 +1,74 @@
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+# every setting the backend reads, parsed once. values come from the environment,
+# then the nearest .env above this package (ENV_FILE to point somewhere else).
+# modules copy what they need into their own constants so tests can monkeypatch them
+
+
+def _find_env_file() -> Optional[Path]:
+    # same lookup load_dotenv() did: walk up from the package to the repo root
+    for parent in Path(__file__).resolve().parents:
+        candidate = parent / ".env"
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=os.getenv("ENV_FILE") or _find_env_file(), extra="ignore")
+
+    # auth
+    secret_key: str
+    algorithm: str = "HS256"
+    access_token_expire_minutes: int = 30
+    principal_cache_ttl_seconds: float = 60
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+    password_hash_timeout_seconds: float = 10
+
+    # database
+    database_url: str = "sqlite:///./trading_saas.db"
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    sqlite_busy_timeout_ms: int = 5000
+
+    # cache: upstash|memory, upstash when credentials are set
+    cache_backend: Optional[str] = None
+    upstash_redis_rest_url: Optional[str] = None
+    upstash_redis_rest_token: Optional[str] = None
+
+    # stripe
+    stripe_secret_key: Optional[str] = None
+    stripe_price_id: Optional[str] = None
+    stripe_webhook_secret: Optional[str] = None
+
+    # signals
+    signal_l1_ttl_seconds: float = 5
+    signal_bar_l1_ttl_seconds: float = 1
+    signal_stream_poll_seconds: float = 5
+    backtest_cache_ttl_seconds: int = 3600
+    backtest_workers: int = 2
+    backtest_max_pending: int = 8
+    backtest_max_combos: int = 256
+    market_data_dir: Optional[str] = None
+    tick_feed: str = "replay"  # off to disable
+    tick_feed_interval_seconds: float = 1
+    max_alerts_per_user: int = 100
+
+    # observability
+    metrics_token: Optional[str] = None
+    profile_token: Optional[str] = None
+    profile_interval_seconds: float = 0.002
+    profile_sample_rate: float = 0
+    profile_max_seconds: float = 10
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
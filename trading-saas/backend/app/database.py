@@ -1,25 +1,97 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
-load_dotenv()
+import asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base
+from . import metrics
+from .config import get_settings
 
-# sqlite for now
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+settings = get_settings()
 
-# sqlite threading fix
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# sqlite for now, postgres works through the same url
+SQLALCHEMY_DATABASE_URL = settings.database_url
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+POOL_SIZE = settings.db_pool_size
+MAX_OVERFLOW = settings.db_max_overflow
+POOL_TIMEOUT = settings.db_pool_timeout
+POOL_RECYCLE = settings.db_pool_recycle
+SQLITE_BUSY_TIMEOUT_MS = settings.sqlite_busy_timeout_ms
+
+
+def async_url(url: str) -> str:
+    # plain urls from .env get the async driver
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    if url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def engine_options(url: str) -> dict:
+    options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+    }
+    if is_sqlite(url):
+        # sqlite file: pooled connections are cheap, no need for pre-ping/recycle
+        options["connect_args"] = {"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    else:
+        # network db: drop dead connections and recycle before server-side timeouts
+        options["pool_pre_ping"] = True
+        options["pool_recycle"] = POOL_RECYCLE
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # wal lets readers run while the single writer commits
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")  # ~20mb page cache per connection
+    cursor.close()
+
+
+def create_engine(url: str = SQLALCHEMY_DATABASE_URL):
+    url = async_url(url)
+    new_engine = create_async_engine(url, **engine_options(url))
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", _sqlite_pragmas)
+    return metrics.instrument_engine(new_engine)
+
+
+engine = create_engine()
+
+SessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     # db session for routes
-    db = SessionLocal()
+    metrics.DB_SESSIONS.inc()
     try:
-        yield db
+        async with SessionLocal() as db:
+            yield db
     finally:
-        db.close()
\ No newline at end of file
+        metrics.DB_SESSIONS.dec()
+
+
+async def init_models():
+    # create missing tables, run from the app lifespan (or `python -m app.database`)
+    from . import models  # noqa: F401 - registers the tables on Base
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+if __name__ == "__main__":
+    # go through the package module so models register on the same Base
+    from app.database import init_models as _init_models
+    asyncio.run(_init_models())
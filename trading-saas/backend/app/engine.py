@@ -0,0 +1,145 @@
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from . import indicators, store
+
+DEFAULT_SYMBOLS = ["NIFTY 50", "RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "SBIN", "BHARTIARTL", "ITC", "LT"]
+
+BAR_SECONDS = 86400
+
+
+def bar_isoformat(ts) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).isoformat()
+
+
+class SignalEngine:
+    # ohlcv history for every symbol lives in (n_symbols, n_bars) arrays
+    # so one recompute covers the whole universe
+
+    def __init__(self, symbols, open_, high, low, close, volume, timestamps):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.open = np.asarray(open_, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.close = np.asarray(close, dtype=np.float64)
+        self.volume = np.asarray(volume, dtype=np.float64)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.actions = None
+        self._rng = np.random.default_rng()
+        self._lock = threading.RLock()
+
+    @classmethod
+    def random_walk(cls, symbols, n_bars=252, seed=None, start_ts=None):
+        # synthetic daily history until a real feed is plugged in
+        rng = np.random.default_rng(seed)
+        n = len(symbols)
+        base = rng.uniform(1000, 3000, size=(n, 1))
+        rets = rng.normal(0.0, 0.015, size=(n, n_bars))
+        close = base * np.exp(np.cumsum(rets, axis=1))
+        open_ = np.empty_like(close)
+        open_[:, 0] = base[:, 0]
+        open_[:, 1:] = close[:, :-1]
+        spread = np.abs(rng.normal(0.0, 0.005, size=(n, n_bars)))
+        high = np.maximum(open_, close) * (1 + spread)
+        low = np.minimum(open_, close) * (1 - spread)
+        volume = rng.integers(10_000, 1_000_000, size=(n, n_bars)).astype(np.float64)
+        if start_ts is None:
+            start_ts = (int(time.time()) // BAR_SECONDS - n_bars + 1) * BAR_SECONDS
+        timestamps = start_ts + np.arange(n_bars, dtype=np.int64) * BAR_SECONDS
+        engine = cls(symbols, open_, high, low, close, volume, timestamps)
+        engine._rng = rng
+        return engine
+
+    @classmethod
+    def from_store(cls, market_store, symbols, n_bars=252):
+        # newest n_bars of stored history per symbol, None if any symbol is missing
+        cols = [market_store.read(s) for s in symbols]
+        n = min([n_bars] + [len(c["ts"]) for c in cols])
+        if n < 2:
+            return None
+        # copies: append_bar shifts these in place and the maps are read-only
+        stacked = {f: np.stack([c[f][-n:] for c in cols]) for f in ("open", "high", "low", "close", "volume")}
+        timestamps = max((c["ts"][-n:] for c in cols), key=lambda ts: ts[-1])
+        return cls(symbols, stacked["open"], stacked["high"], stacked["low"], stacked["close"],
+                   stacked["volume"], np.array(timestamps))
+
+    @property
+    def n_bars(self):
+        return self.close.shape[1]
+
+    def append_bar(self, open_, high, low, close, volume, ts):
+        # one new bar per symbol, oldest bar drops off so the window stays fixed
+        with self._lock:
+            for arr, new in ((self.open, open_), (self.high, high), (self.low, low),
+                             (self.close, close), (self.volume, volume)):
+                arr[:, :-1] = arr[:, 1:]
+                arr[:, -1] = new
+            self.timestamps[:-1] = self.timestamps[1:]
+            self.timestamps[-1] = ts
+            self.actions = None
+
+    def simulate_bar(self, now=None):
+        # random walk step for every symbol, stands in for a market feed.
+        # today's bar keeps updating until the day rolls over
+        ts = int(time.time() if now is None else now)
+        ts -= ts % BAR_SECONDS
+        with self._lock:
+            if ts <= self.timestamps[-1]:
+                last = self.close[:, -1].copy()
+                close = last * np.exp(self._rng.normal(0.0, 0.005, size=last.shape))
+                self.high[:, -1] = np.maximum(self.high[:, -1], close)
+                self.low[:, -1] = np.minimum(self.low[:, -1], close)
+                self.close[:, -1] = close
+                self.volume[:, -1] += self._rng.integers(1_000, 100_000, size=last.shape)
+                self.actions = None
+                return
+            last = self.close[:, -1].copy()
+            close = last * np.exp(self._rng.normal(0.0, 0.015, size=last.shape))
+            spread = np.abs(self._rng.normal(0.0, 0.005, size=last.shape))
+            high = np.maximum(last, close) * (1 + spread)
+            low = np.minimum(last, close) * (1 - spread)
+            volume = self._rng.integers(10_000, 1_000_000, size=last.shape)
+            self.append_bar(last, high, low, close, volume, ts)
+
+    def recompute(self, **params):
+        with self._lock:
+            actions = indicators.compute_signals(self.close, **params)
+            self.actions = actions
+        return actions
+
+    def latest_signals(self, symbols=None):
+        if symbols is None:
+            symbols = self.symbols
+        idx = np.fromiter((self.index[s] for s in symbols), dtype=np.intp, count=len(symbols))
+        with self._lock:
+            actions = self.actions if self.actions is not None else self.recompute()
+            last_actions = actions[idx, -1]
+            last_prices = np.round(self.close[idx, -1], 2)
+            bar_time = bar_isoformat(self.timestamps[-1])
+        return [
+            {
+                "id": sym,
+                "action": indicators.ACTIONS[int(a)],
+                "price": float(p),
+                "timestamp": bar_time
+            }
+            for sym, a, p in zip(symbols, last_actions, last_prices)
+        ]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # real history when a market data store is configured, synthetic otherwise
+                daily = store.get_store("1d")
+                eng = SignalEngine.from_store(daily, DEFAULT_SYMBOLS) if daily is not None else None
+                _engine = eng or SignalEngine.random_walk(DEFAULT_SYMBOLS)
+    return _engine
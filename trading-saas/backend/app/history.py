@@ -0,0 +1,122 @@
+import asyncio
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import insert, select, tuple_
+from . import database, metrics, models
+
+log = logging.getLogger(__name__)
+
+# signal snapshots are buffered and written with executemany in chunks,
+# reads page by (ts, id) keyset and stream rows straight off a server-side cursor
+
+FLUSH_INTERVAL_SECONDS = 1.0
+CHUNK_SIZE = 1000
+# rows kept for a retry while the db is failing, the oldest go first past this
+MAX_BUFFERED_ROWS = 100_000
+
+
+class HistoryWriter:
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_SECONDS, chunk_size: int = CHUNK_SIZE):
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self._buffer = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add_snapshot(self, signals, ts: Optional[datetime] = None, timeframe: str = "1d"):
+        ts = naive_utc(ts or datetime.now(timezone.utc))
+        self._buffer.extend(
+            {"symbol": s["id"], "timeframe": timeframe, "action": s["action"], "price": s["price"], "ts": ts}
+            for s in signals
+        )
+        # snapshots arriving close together go out in the same flush
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception:
+            log.exception("history flush failed")
+            metrics.BACKGROUND_ERRORS.inc(task="history_flush")
+
+    async def flush(self):
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            async with database.SessionLocal() as db:
+                for i in range(0, len(rows), self.chunk_size):
+                    await db.execute(insert(models.SignalHistory), rows[i:i + self.chunk_size])
+                await db.commit()
+        except BaseException:
+            # back in front of anything added meanwhile, the next flush retries them
+            self._buffer = (rows + self._buffer)[-MAX_BUFFERED_ROWS:]
+            raise
+        return len(rows)
+
+
+writer = HistoryWriter()
+
+
+def naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    # stored as naive utc, same as the users table
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def encode_cursor(ts: datetime, row_id: int) -> str:
+    raw = f"{ts.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    ts, row_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(ts), int(row_id)
+
+
+def history_query(symbols=None, start=None, end=None, cursor=None, limit: int = 1000, timeframe: str = None):
+    h = models.SignalHistory
+    query = select(h.id, h.symbol, h.timeframe, h.action, h.price, h.ts)
+    if symbols:
+        query = query.where(h.symbol.in_(symbols)) if len(symbols) > 1 else query.where(h.symbol == symbols[0])
+    if timeframe:
+        query = query.where(h.timeframe == timeframe)
+    if start is not None:
+        query = query.where(h.ts >= naive_utc(start))
+    if end is not None:
+        query = query.where(h.ts < naive_utc(end))
+    if cursor is not None:
+        # keyset: continue strictly after the last row of the previous page
+        query = query.where(tuple_(h.ts, h.id) > tuple_(*cursor))
+    # one extra row tells us whether there is a next page
+    return query.order_by(h.ts, h.id).limit(limit + 1)
+
+
+async def stream_history(query, limit: int):
+    # yields the json body in chunks, rows never pile up in memory
+    yield b'{"data": ['
+    last = None
+    count = 0
+    async with database.SessionLocal() as db:
+        result = await db.stream(query.execution_options(yield_per=500))
+        async for row in result:
+            if count == limit:
+                break
+            ts = row.ts if row.ts.tzinfo else row.ts.replace(tzinfo=timezone.utc)
+            item = {"id": row.id, "symbol": row.symbol, "timeframe": row.timeframe,
+                    "action": row.action, "price": row.price, "timestamp": ts.isoformat()}
+            yield (b"," if count else b"") + json.dumps(item).encode()
+            last = (row.ts, row.id)
+            count += 1
+        else:
+            last = None
+        await result.close()
+    next_cursor = encode_cursor(*last) if last is not None and count == limit else None
+    yield b'], "next_cursor": ' + json.dumps(next_cursor).encode() + b"}"
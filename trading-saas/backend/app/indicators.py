@@ -0,0 +1,134 @@
+import numpy as np
+
+# all indicators work on 2d arrays shaped (n_symbols, n_bars)
+# every symbol is computed at once, only ema-style recursions step over time
+
+BUY = 1
+SELL = -1
+HOLD = 0
+
+ACTIONS = {BUY: "BUY", SELL: "SELL", HOLD: "HOLD"}
+
+
+def sma(x: np.ndarray, window: int) -> np.ndarray:
+    # rolling mean via cumsum, first window-1 bars are nan
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < window:
+        return out
+    c = np.cumsum(x, axis=1)
+    out[:, window - 1] = c[:, window - 1]
+    out[:, window:] = c[:, window:] - c[:, :-window]
+    out[:, window - 1:] /= window
+    return out
+
+
+def rolling_std(x: np.ndarray, window: int) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] < window:
+        return out
+    # shift by the first bar so the sum of squares keeps its precision
+    d = x - x[:, :1]
+    c1 = np.cumsum(d, axis=1)
+    c2 = np.cumsum(d * d, axis=1)
+    s1 = c1[:, window - 1:].copy()
+    s2 = c2[:, window - 1:].copy()
+    s1[:, 1:] -= c1[:, :-window]
+    s2[:, 1:] -= c2[:, :-window]
+    var = s2 / window - (s1 / window) ** 2
+    out[:, window - 1:] = np.sqrt(np.maximum(var, 0.0))
+    return out
+
+
+def ema(x: np.ndarray, span: int = None, alpha: float = None) -> np.ndarray:
+    # seeded with the first value, recursion runs over bars for all symbols at once
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    # bar-major copy so each step touches one contiguous row
+    xt = np.array(x.T, dtype=np.float64, order="C")
+    out = np.empty_like(xt)
+    if xt.shape[0] == 0:
+        return out.T
+    out[0] = xt[0]
+    np.multiply(xt, alpha, out=xt)
+    decay = 1.0 - alpha
+    for t in range(1, xt.shape[0]):
+        np.multiply(out[t - 1], decay, out=out[t])
+        out[t] += xt[t]
+    return out.T
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    # wilder smoothing = ema with alpha 1/period
+    delta = np.diff(close, axis=1, prepend=close[:, :1])
+    gain = np.clip(delta, 0.0, None)
+    loss = np.clip(-delta, 0.0, None)
+    avg_gain = ema(gain, alpha=1.0 / period)
+    avg_loss = ema(loss, alpha=1.0 / period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        out = 100.0 - 100.0 / (1.0 + rs)
+    # no losses at all means rsi 100, flat series means 50
+    out = np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), out)
+    out[:, :period] = np.nan
+    return out
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9):
+    line = ema(close, fast) - ema(close, slow)
+    signal_line = ema(line, signal)
+    return line, signal_line, line - signal_line
+
+
+def bollinger(close: np.ndarray, window: int = 20, k: float = 2.0):
+    mid = sma(close, window)
+    std = rolling_std(close, window)
+    return mid - k * std, mid, mid + k * std
+
+
+def crossed_above(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    out = np.zeros(a.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        out[:, 1:] = (a[:, 1:] > b[:, 1:]) & (a[:, :-1] <= b[:, :-1])
+    return out
+
+
+def crossed_below(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return crossed_above(b, a)
+
+
+def compute_signals(close: np.ndarray, fast: int = 10, slow: int = 30,
+                    rsi_period: int = 14, rsi_low: float = 30.0, rsi_high: float = 70.0,
+                    bb_window: int = 20, bb_k: float = 2.0, threshold: int = 2) -> np.ndarray:
+    # returns int8 matrix of BUY/SELL/HOLD for every symbol and bar
+    close = np.asarray(close, dtype=np.float64)
+    score = np.zeros(close.shape, dtype=np.int8)
+
+    with np.errstate(invalid="ignore"):
+        # trend: fast vs slow sma, a fresh crossover counts double
+        fast_ma = sma(close, fast)
+        slow_ma = sma(close, slow)
+        score += np.sign(np.nan_to_num(fast_ma - slow_ma)).astype(np.int8)
+        score += crossed_above(fast_ma, slow_ma).astype(np.int8)
+        score -= crossed_below(fast_ma, slow_ma).astype(np.int8)
+
+        # momentum: macd histogram side plus signal line crossovers
+        line, signal_line, hist = macd(close)
+        score += np.sign(hist).astype(np.int8)
+        score += crossed_above(line, signal_line).astype(np.int8)
+        score -= crossed_below(line, signal_line).astype(np.int8)
+
+        # mean reversion: rsi extremes and bollinger band breaks
+        r = rsi(close, rsi_period)
+        score += (r < rsi_low).astype(np.int8)
+        score -= (r > rsi_high).astype(np.int8)
+
+        lower, _, upper = bollinger(close, bb_window, bb_k)
+        score += (close < lower).astype(np.int8)
+        score -= (close > upper).astype(np.int8)
+
+    actions = np.zeros(close.shape, dtype=np.int8)
+    actions[score >= threshold] = BUY
+    actions[score <= -threshold] = SELL
+    # not enough history for the slow average yet
+    actions[:, :slow - 1] = HOLD
+    return actions
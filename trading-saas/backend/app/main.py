@@ -1,9 +1,37 @@
-from fastapi import FastAPI
-from .routers import auth , signals,billing
-from . import models, database
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from .routers import auth , signals,billing, alerts as alerts_router
+from . import database, passwords, history, webhooks, bars, backtest, alerts, metrics
+from . import auth as auth_core
+from .cache_backend import close_cache
+from .rate_limit import RateLimitMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-models.Base.metadata.create_all(bind=database.engine) 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # schema setup runs at startup, not on import
+    await database.init_models()
+    webhooks.processor.start()
+    await alerts.load_active(alerts.alert_engine)
+    alerts.delivery.start()
+    if bars.FEED_ENABLED:
+        bars.feed.subscribe(alerts.alert_engine.on_bars)
+        bars.feed.start()
+    yield
+    await bars.feed.stop()
+    await alerts.delivery.stop()
+    await webhooks.processor.stop()
+    # write out any buffered signal history before the pool goes away
+    await history.writer.flush()
+    # shared redis client keeps a connection pool open
+    await close_cache()
+    passwords.shutdown_pool()
+    backtest.shutdown_pool()
+    await database.engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:5173", 
@@ -19,13 +47,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset"],
 )
+app.add_middleware(RateLimitMiddleware)
+# added last = outermost, so its timing covers the other middleware too
+app.add_middleware(metrics.MetricsMiddleware)
 
 # routes
 app.include_router(auth.router)
 app.include_router(signals.router)
 app.include_router(billing.router)
+app.include_router(alerts_router.router)
 
 @app.get("/")
 def root():
-    return {"message": "Trading SaaS API is running."}
\ No newline at end of file
+    return {"message": "Trading SaaS API is running."}
+
+# per-worker caches and queues, read when /metrics is scraped
+metrics.watch_cache("signals", signals.signal_cache.snapshot_stats)
+metrics.watch_cache("signals_bars", signals.bar_signal_cache.snapshot_stats)
+metrics.watch_cache("backtest", signals.backtest_cache.snapshot_stats)
+metrics.watch_cache("principal", metrics.ttl_stats(auth_core.principal_cache))
+metrics.watch_cache("token", metrics.ttl_stats(auth_core.token_cache))
+BACKLOG = metrics.registry.register(metrics.Gauge("work_pending", "Queued or running background work", ("queue",)))
+
+@metrics.registry.collector
+def _backlogs():
+    BACKLOG.set(passwords._pending, queue="bcrypt")
+    BACKLOG.set(backtest._pending, queue="backtest")
+    BACKLOG.set(len(alerts.alert_engine.queue), queue="alert_delivery")
+
+def check_metrics_token(authorization: Optional[str] = Header(None)):
+    # open unless METRICS_TOKEN is set, then scrapers send it as a bearer token
+    if metrics.METRICS_TOKEN and authorization != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(check_metrics_token)])
+def get_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/profiles", include_in_schema=False, dependencies=[Depends(check_metrics_token)])
+def list_profiles():
+    # sampled profiles never hand their id to the client, this is where they turn up.
+    # needs METRICS_TOKEN, an open listing would give anyone the ids
+    if not metrics.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return [{k: v for k, v in p.items() if k != "folded"} for p in reversed(metrics.profiles)]
+
+@app.get("/metrics/profiles/{profile_id}", include_in_schema=False, dependencies=[Depends(check_metrics_token)])
+def get_profile(profile_id: str):
+    # folded stacks from a request sent with X-Profile, feed them to speedscope or flamegraph.pl
+    profile = metrics.find_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile["folded"])
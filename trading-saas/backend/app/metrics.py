@@ -0,0 +1,444 @@
+import asyncio
+import bisect
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Optional
+from .config import get_settings
+
+# in-process metrics in prometheus text format, no client library needed.
+# each worker exposes its own numbers on /metrics, prometheus sums them across workers
+
+# seconds, from a fast cache hit up to a slow checkout call
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+settings = get_settings()
+
+METRICS_TOKEN = settings.metrics_token
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"')) for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _num(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(n, "") for n in self.label_names), 0)
+
+    def render(self):
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_labels(self.label_names, key)} {_num(value)}"
+
+
+class Gauge(Counter):
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    # per-bucket counts, made cumulative when rendered
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts per bucket + overflow, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(labels.get(n, "") for n in self.label_names))
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        names = self.label_names + ("le",)
+        for key, (counts, total) in list(self._series.items()):
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                yield f"{self.name}_bucket{_labels(names, key + (_num(bound),))} {running}"
+            yield f"{self.name}_sum{_labels(self.label_names, key)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, key)} {running}"
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+        # called right before rendering, to copy counters kept elsewhere (cache stats, pools)
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], None]):
+        self.collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            fn()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status")))
+IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "Requests currently being handled"))
+CACHE_LATENCY = registry.register(Histogram(
+    "cache_command_duration_seconds", "Redis (or in-memory backend) command latency", ("command",)))
+CACHE_LOOKUPS = registry.register(Counter(
+    "cache_lookups_total", "Redis GET/MGET keys by result", ("result",)))
+DB_LATENCY = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement latency", ("operation",)))
+DB_SESSIONS = registry.register(Gauge("db_sessions_open", "Request-scoped database sessions currently open"))
+AUTH_LATENCY = registry.register(Histogram(
+    "auth_duration_seconds", "jwt decode and bcrypt latency", ("operation",)))
+RATE_LIMITED = registry.register(Counter(
+    "rate_limit_rejections_total", "Requests rejected with a 429", ("scope", "where")))
+L1_CACHE = registry.register(Gauge(
+    "l1_cache_events", "In-process cache hits, misses and refreshes (counters copied at scrape)", ("cache", "event")))
+L1_HIT_RATIO = registry.register(Gauge("l1_cache_hit_ratio", "In-process cache hit ratio", ("cache",)))
+BACKGROUND_ERRORS = registry.register(Counter(
+    "background_task_errors_total", "Exceptions caught by background loops", ("task",)))
+
+
+def timed_async(histogram: Histogram, **labels):
+    # decorator for coroutine functions
+    def decorator(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+
+def watch_cache(name: str, stats: Callable[[], dict]):
+    # export a TTLCache/TwoTierCache's counters, read lazily at scrape time
+    def collect():
+        values = stats()
+        for event in ("hits", "stale_hits", "misses", "refreshes", "l2_hits", "l2_misses"):
+            if event in values:
+                L1_CACHE.set(values[event], cache=name, event=event)
+        lookups = values.get("hits", 0) + values.get("stale_hits", 0) + values.get("misses", 0)
+        if lookups:
+            L1_HIT_RATIO.set(round((values.get("hits", 0) + values.get("stale_hits", 0)) / lookups, 4), cache=name)
+    registry.collector(collect)
+
+
+def ttl_stats(cache):
+    return lambda: {"hits": cache.hits, "misses": cache.misses}
+
+
+class InstrumentedBackend:
+    # wraps a CacheBackend: times every command and pipeline round trip, counts GET hits.
+    # anything else (clear(), client, ...) falls through to the wrapped backend
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    async def _timed(self, command, coro):
+        start = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            CACHE_LATENCY.observe(time.perf_counter() - start, command=command)
+
+    async def get(self, key):
+        value = await self._timed("get", self.backend.get(key))
+        CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+        return value
+
+    async def mget(self, *keys):
+        values = await self._timed("mget", self.backend.mget(*keys))
+        hits = sum(v is not None for v in values)
+        CACHE_LOOKUPS.inc(hits, result="hit")
+        CACHE_LOOKUPS.inc(len(values) - hits, result="miss")
+        return values
+
+    async def set(self, key, value, ex=None, nx=False):
+        return await self._timed("set", self.backend.set(key, value, ex=ex, nx=nx))
+
+    async def setex(self, key, seconds, value):
+        return await self._timed("setex", self.backend.setex(key, seconds, value))
+
+    async def delete(self, *keys):
+        return await self._timed("delete", self.backend.delete(*keys))
+
+    async def incr(self, key):
+        return await self._timed("incr", self.backend.incr(key))
+
+    async def expire(self, key, seconds, nx=False):
+        return await self._timed("expire", self.backend.expire(key, seconds, nx=nx))
+
+    async def pexpire(self, key, millis, nx=False):
+        return await self._timed("pexpire", self.backend.pexpire(key, millis, nx=nx))
+
+    async def ttl(self, key):
+        return await self._timed("ttl", self.backend.ttl(key))
+
+    async def pttl(self, key):
+        return await self._timed("pttl", self.backend.pttl(key))
+
+    async def mset(self, mapping):
+        return await self._timed("mset", self.backend.mset(mapping))
+
+    async def set_many(self, mapping, ex=None):
+        return await self._timed("set_many", self.backend.set_many(mapping, ex=ex))
+
+    def pipeline(self, transaction: bool = False):
+        # the pipeline calls back into _exec, which is timed as one round trip
+        from .cache_backend import Pipeline
+        return Pipeline(self, transaction)
+
+    async def _exec(self, commands, transaction):
+        return await self._timed("multi" if transaction else "pipeline", self.backend._exec(commands, transaction))
+
+    async def close(self):
+        await self.backend.close()
+
+
+def instrument_engine(engine):
+    # statement timing through sqlalchemy's cursor events on the sync engine
+    from sqlalchemy import event
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_LATENCY.observe(time.perf_counter() - context._metrics_start, operation=operation)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before)
+    event.listen(engine.sync_engine, "after_cursor_execute", after)
+    return engine
+
+
+# sampling profiler. a request opts in by sending X-Profile: <PROFILE_TOKEN>; a thread
+# then snapshots every thread's stack each interval until the response is sent.
+# the event loop interleaves requests, so samples from concurrent requests show up too
+PROFILE_TOKEN = settings.profile_token
+PROFILE_INTERVAL_SECONDS = settings.profile_interval_seconds
+# profile a random share of requests without the header, 0 = only on request.
+# ignored unless METRICS_TOKEN is set, sampled ids are only listed behind it
+PROFILE_SAMPLE_RATE = settings.profile_sample_rate
+# a sampler never runs longer than this, whatever the request does
+PROFILE_MAX_SECONDS = settings.profile_max_seconds
+PROFILE_KEEP = 32
+
+
+class Sampler:
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS, max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = {}
+        self.samples = 0
+        self.truncated = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        # just the signal, the thread exits on its next wake-up
+        self._stop.set()
+
+    def stop(self):
+        # joins the thread, call it off the event loop
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() > deadline:
+                self.truncated = True
+                break
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        # flamegraph.pl / speedscope "collapsed" format
+        return "".join(f"{stack} {n}\n" for stack, n in sorted(self.stacks.items(), key=lambda kv: -kv[1]))
+
+
+profiles = deque(maxlen=PROFILE_KEEP)
+
+
+def keep_profile(profile: dict):
+    profiles.append(profile)
+
+
+# swap this to ship profiles elsewhere, gets the dict that keep_profile stores
+profile_hook: Callable[[dict], None] = keep_profile
+
+
+def _wants_profile(scope) -> Optional[str]:
+    # "requested" when the caller sent the token, "sampled" for a random pick, else None
+    if not PROFILE_TOKEN:
+        return None
+    for name, value in scope.get("headers", ()):
+        if name == b"x-profile":
+            return "requested" if value.decode() == PROFILE_TOKEN else None
+    # sampled profiles are only reachable through the token-protected listing
+    if METRICS_TOKEN and PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def _is_stream(headers) -> bool:
+    for name, value in headers:
+        if name.lower() == b"content-type":
+            return value.startswith(b"text/event-stream")
+    return False
+
+
+class MetricsMiddleware:
+    # outermost middleware: in-flight gauge, latency per route template, optional profile
+
+    def __init__(self, app, skip=("/metrics",)):
+        self.app = app
+        self.skip = skip
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.skip):
+            return await self.app(scope, receive, send)
+
+        status = 500
+        reason = _wants_profile(scope)
+        sampler: Optional[Sampler] = Sampler().start() if reason else None
+        profile_id = f"{int(time.time() * 1000):x}{random.getrandbits(16):04x}" if sampler else None
+
+        async def send_wrapper(message):
+            nonlocal status, sampler
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                if sampler is not None and _is_stream(headers):
+                    # a stream runs until the client leaves, nothing useful to sample
+                    sampler.cancel()
+                    sampler = None
+                if sampler is not None and reason == "requested":
+                    message["headers"] = headers + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            IN_FLIGHT.dec()
+            # the router leaves the matched route on the scope; templates keep the label set small
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(elapsed, method=scope["method"], route=route, status=status)
+            if sampler is not None:
+                await asyncio.to_thread(sampler.stop)
+                profile_hook({
+                    "id": profile_id,
+                    "reason": reason,
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "samples": sampler.samples,
+                    "truncated": sampler.truncated,
+                    "folded": sampler.folded(),
+                })
+
+
+def find_profile(profile_id: str) -> Optional[dict]:
+    for profile in profiles:
+        if profile["id"] == profile_id:
+            return profile
+    return None
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Integer, String, DateTime 
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, Float, Index, Text
 from .database import Base
 from datetime import datetime, timezone
 
@@ -16,4 +16,63 @@ class User(Base):
     stripe_customer_id = Column(String, nullable=True)
     stripe_subscription_id = Column(String, nullable=True)
     subscription_end_date = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+class SignalHistory(Base):
+    # one row per symbol per generated snapshot, append only
+    __tablename__ = "signal_history"
+
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String, nullable=False)
+    timeframe = Column(String, nullable=False, default="1d")
+    action = Column(String(4), nullable=False)
+    price = Column(Float, nullable=False)
+    ts = Column(DateTime, nullable=False)
+
+    # (symbol, ts, id) serves per-symbol range scans and keyset paging,
+    # (ts, id) covers queries across all symbols
+    __table_args__ = (
+        Index("ix_signal_history_symbol_ts", "symbol", "ts", "id"),
+        Index("ix_signal_history_ts", "ts", "id"),
+    )
+
+
+class WebhookEvent(Base):
+    # stripe events land here first, the primary key is the idempotency record
+    __tablename__ = "webhook_events"
+
+    id = Column(String, primary_key=True)  # stripe event id
+    type = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending / processed / failed
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    received_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=True)  # set after a failure, null = due now
+
+    __table_args__ = (
+        Index("ix_webhook_events_status_received", "status", "received_at"),
+    )
+
+
+class Alert(Base):
+    # price/indicator threshold set by a pro user, fires once then stays as a record
+    __tablename__ = "alerts"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    symbol = Column(String, nullable=False)
+    metric = Column(String, nullable=False, default="price")  # price / rsi
+    condition = Column(String, nullable=False)  # crosses_above / crosses_below / above / below
+    threshold = Column(Float, nullable=False)
+    status = Column(String, nullable=False, default="active")  # active / triggered / cancelled
+    created_at = Column(DateTime, default=datetime.utcnow)
+    triggered_at = Column(DateTime, nullable=True)
+    triggered_value = Column(Float, nullable=True)
+
+    __table_args__ = (
+        Index("ix_alerts_user_status", "user_id", "status"),
+        # the sync poll: active alerts created since a watermark
+        Index("ix_alerts_status_created", "status", "created_at"),
+    )
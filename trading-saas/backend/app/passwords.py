@@ -0,0 +1,96 @@
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# bcrypt runs in a small process pool so a login burst can't eat the
+# threadpool (or the gil) that every other endpoint needs.
+# kept free of app imports, spawned workers only load passlib.
+# the web process never hashes itself, so passlib is only imported where it's used
+
+HASH_WORKERS = 2
+# hashes running or queued before new ones get a 503
+HASH_MAX_PENDING = 64
+HASH_TIMEOUT_SECONDS = 10.0
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+_context = None
+
+
+def configure(workers: int, max_pending: int, timeout: float):
+    # called by auth with the app settings, workers keep the defaults (they never use them)
+    global HASH_WORKERS, HASH_MAX_PENDING, HASH_TIMEOUT_SECONDS
+    HASH_WORKERS, HASH_MAX_PENDING, HASH_TIMEOUT_SECONDS = workers, max_pending, timeout
+
+
+def pwd_context():
+    global _context
+    if _context is None:
+        from passlib.context import CryptContext
+        _context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _context
+
+
+def _prehash(password: str) -> str:
+    # bcrypt only looks at 72 bytes
+    if len(password.encode('utf-8')) > 72:
+        password = hashlib.sha256(password.encode('utf-8')).hexdigest()
+    return password
+
+
+def hash_password(password: str) -> str:
+    return pwd_context().hash(_prehash(password))
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context().verify(_prehash(plain_password), hashed_password)
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _busy():
+    # only the web process gets here, a top-level import would load fastapi in every worker
+    from fastapi import HTTPException
+    return HTTPException(
+        status_code=503,
+        detail="Server busy, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _run(fn, *args):
+    global _pending
+    if _pending >= HASH_MAX_PENDING:
+        raise _busy()
+    _pending += 1
+    future = get_pool().submit(fn, *args)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), HASH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        # still queued = never runs, already running finishes in the background
+        future.cancel()
+        raise _busy()
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run(check_password, plain_password, hashed_password)
@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+import orjson
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only without it
+    brotli = None
+
+# encode-once response bodies: fast json, precompressed variants, etag/304 helpers
+
+MIN_COMPRESS_BYTES = 256
+
+
+def dumps(value) -> bytes:
+    return orjson.dumps(value)
+
+
+def loads(data):
+    return orjson.loads(data)
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=8).hexdigest()
+    return f'"{digest}"'
+
+
+def http_date(ts: datetime) -> str:
+    return format_datetime(ts, usegmt=True)
+
+
+class EncodedBody:
+    # one response body plus its compressed variants, each built at most once
+
+    __slots__ = ("raw", "etag", "_gzip", "_br")
+
+    def __init__(self, raw: bytes, etag: str, precompress: bool = False):
+        self.raw = raw
+        self.etag = etag
+        self._gzip = None
+        self._br = None
+        if precompress:
+            self.gzip()
+            self.br()
+
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            # mtime=0 keeps the bytes identical across workers
+            self._gzip = gzip.compress(self.raw, compresslevel=6, mtime=0)
+        return self._gzip
+
+    def br(self) -> Optional[bytes]:
+        if brotli is None:
+            return None
+        if self._br is None:
+            self._br = brotli.compress(self.raw, quality=5)
+        return self._br
+
+    def variant(self, accept_encoding: str):
+        # (body, content-encoding) for what the client accepts, smallest wins
+        if len(self.raw) < MIN_COMPRESS_BYTES:
+            return self.raw, None
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if "br" in accepted and brotli is not None:
+            return self.br(), "br"
+        if "gzip" in accepted:
+            return self.gzip(), "gzip"
+        return self.raw, None
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def cached_response(request: Request, body: EncodedBody, last_modified: Optional[datetime] = None,
+                    media_type: str = "application/json") -> Response:
+    headers = {
+        "ETag": body.etag,
+        # clients must revalidate, but a 304 costs almost nothing
+        "Cache-Control": "private, no-cache",
+        "Vary": "Accept-Encoding, Authorization",
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+
+    if not_modified(request, body.etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    content, encoding = body.variant(request.headers.get("accept-encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=content, media_type=media_type, headers=headers)
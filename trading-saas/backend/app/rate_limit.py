@@ -0,0 +1,169 @@
+import hashlib
+import math
+import time
+from fastapi import HTTPException, Request
+from .cache import TTLCache
+from .cache_backend import get_cache
+from . import metrics
+
+# per-route limits as fastapi dependencies
+# redis mode: sliding window counter, one MULTI round trip per check
+# local mode: in-process token bucket, no network at all (per worker)
+
+stats = {"allowed": 0, "rejected": 0, "rejected_locally": 0}
+
+
+def _client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha1(value.encode()).hexdigest()[:16]
+
+
+def key_ip(request: Request) -> str:
+    return "ip:" + _client_ip(request)
+
+
+def key_user(request: Request) -> str:
+    # bearer token identifies the caller without decoding it again.
+    # EventSource can't send headers, so /signals/stream takes it as ?token=
+    header = request.headers.get("authorization", "")
+    if header.lower().startswith("bearer "):
+        return "user:" + _digest(header[7:])
+    token = request.query_params.get("token")
+    if token:
+        return "user:" + _digest(token)
+    return key_ip(request)
+
+
+def key_api_key(request: Request) -> str:
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + _digest(api_key)
+    return key_ip(request)
+
+
+KEY_FUNCS = {"ip": key_ip, "user": key_user, "api_key": key_api_key}
+
+
+class RateLimitMiddleware:
+    # copies the RateLimit-* headers a limiter left on request.state onto the response
+    # works for plain Response objects too, which skip fastapi's header merging
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = scope.get("state", {}).get("rate_limit_headers")
+                if headers:
+                    raw = list(message.get("headers", []))
+                    existing = {k.lower() for k, _ in raw}
+                    for name, value in headers.items():
+                        if name.lower().encode() not in existing:
+                            raw.append((name.lower().encode(), str(value).encode()))
+                    message["headers"] = raw
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RateLimit:
+
+    def __init__(self, limit: int, window: int, key: str = "ip", scope: str = "default", local: bool = False,
+                 max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.key_func = KEY_FUNCS[key] if isinstance(key, str) else key
+        self.scope = scope
+        self.local = local
+        # keys we already know are over the limit, rejected without asking redis
+        self._blocked = TTLCache(maxsize=max_keys, ttl=window)
+        self._buckets = TTLCache(maxsize=max_keys, ttl=window * 2)
+
+    async def __call__(self, request: Request):
+        ident = self.key_func(request)
+
+        blocked_until = self._blocked.get(ident)
+        if blocked_until is not None:
+            retry_after = blocked_until - time.time()
+            if retry_after > 0:
+                stats["rejected_locally"] += 1
+                self._reject(retry_after, where="blocklist")
+
+        if self.local:
+            allowed, remaining, reset = self._take_token(ident)
+        else:
+            allowed, remaining, reset = await self._hit_redis(ident)
+
+        headers = {
+            "RateLimit-Limit": self.limit,
+            "RateLimit-Remaining": max(0, remaining),
+            "RateLimit-Reset": max(1, math.ceil(reset)),
+        }
+        if not allowed:
+            self._blocked.set(ident, time.time() + reset, ttl=reset)
+            self._reject(reset, headers, where="local" if self.local else "redis")
+
+        stats["allowed"] += 1
+        request.state.rate_limit_headers = headers
+
+    def _reject(self, retry_after: float, headers: dict = None, where: str = "redis"):
+        stats["rejected"] += 1
+        metrics.RATE_LIMITED.inc(scope=self.scope, where=where)
+        retry_after = max(1, math.ceil(retry_after))
+        headers = dict(headers or {"RateLimit-Limit": self.limit, "RateLimit-Remaining": 0, "RateLimit-Reset": retry_after})
+        headers["Retry-After"] = retry_after
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Try again later.",
+            headers={k: str(v) for k, v in headers.items()},
+        )
+
+    async def _hit_redis(self, ident: str):
+        # sliding window counter: this window's count plus the previous window weighted
+        # by how much of it still overlaps. incr/expire/get go out as one transaction
+        now = time.time()
+        index = int(now // self.window)
+        elapsed = now - index * self.window
+        base = f"rate_limit:{self.scope}:{ident}"
+
+        pipe = get_cache().pipeline(transaction=True)
+        pipe.incr(f"{base}:{index}")
+        pipe.expire(f"{base}:{index}", self.window * 2, nx=True)
+        pipe.get(f"{base}:{index - 1}")
+        current, _, previous = await pipe.exec()
+
+        previous = int(previous or 0)
+        weight = 1 - elapsed / self.window
+        estimated = previous * weight + current
+        remaining = int(self.limit - estimated)
+
+        if estimated <= self.limit:
+            return True, remaining, self.window - elapsed
+
+        if current > self.limit or previous == 0:
+            # over on this window alone, wait for it to roll over
+            retry_after = self.window - elapsed
+        else:
+            # wait until the previous window's weight decays enough
+            retry_after = self.window * (1 - (self.limit - current) / previous) - elapsed
+        return False, 0, max(retry_after, 1)
+
+    def _take_token(self, ident: str):
+        # token bucket refilled at limit/window per second
+        now = time.monotonic()
+        rate = self.limit / self.window
+        tokens, last = self._buckets.get(ident) or (float(self.limit), now)
+        tokens = min(float(self.limit), tokens + (now - last) * rate)
+        if tokens < 1:
+            self._buckets.set(ident, (tokens, now))
+            return False, 0, (1 - tokens) / rate
+        tokens -= 1
+        self._buckets.set(ident, (tokens, now))
+        return True, int(tokens), (self.limit - tokens) / rate
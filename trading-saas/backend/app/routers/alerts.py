@@ -0,0 +1,76 @@
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import alerts, auth, database, engine, models, schemas
+from ..config import get_settings
+from ..rate_limit import RateLimit
+from .signals import is_active_pro
+
+router = APIRouter(
+    prefix="/alerts",
+    tags=["Alerts"]
+)
+
+alerts_rate_limit = RateLimit(limit=30, window=60, key="user", scope="alerts")
+
+MAX_ALERTS_PER_USER = get_settings().max_alerts_per_user
+
+def require_pro(current_user: auth.Principal = Depends(auth.get_current_user)):
+    if not is_active_pro(current_user):
+        raise HTTPException(status_code=403, detail="Alerts are a Pro feature")
+    return current_user
+
+@router.post("/", response_model=schemas.AlertOut, status_code=201, dependencies=[Depends(alerts_rate_limit)])
+async def create_alert(body: schemas.AlertCreate, current_user: auth.Principal = Depends(require_pro),
+                       db: AsyncSession = Depends(database.get_db)):
+    if body.rule is not None:
+        try:
+            symbol, metric, condition, threshold = alerts.parse_rule(body.rule)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        symbol, metric, condition, threshold = body.symbol.upper(), body.metric, body.condition, body.threshold
+
+    if symbol not in engine.DEFAULT_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"Unknown symbol {symbol}")
+    if metric == "rsi" and not 0 <= threshold <= 100:
+        raise HTTPException(status_code=400, detail="RSI thresholds are between 0 and 100")
+
+    active = await db.scalar(
+        select(func.count()).select_from(models.Alert)
+        .where(models.Alert.user_id == current_user.id, models.Alert.status == "active")
+    )
+    if active >= MAX_ALERTS_PER_USER:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ALERTS_PER_USER} active alerts")
+
+    alert = models.Alert(user_id=current_user.id, symbol=symbol, metric=metric, condition=condition,
+                         threshold=threshold, status="active")
+    db.add(alert)
+    await db.commit()
+    await db.refresh(alert)
+
+    # indexed after the commit, a trigger can only ever point at a saved row
+    alerts.alert_engine.add(alert.id, symbol, metric, condition, threshold, alert.created_at)
+    return alert
+
+@router.get("/", response_model=List[schemas.AlertOut])
+async def list_alerts(status: Optional[str] = None, current_user: auth.Principal = Depends(auth.get_current_user),
+                      db: AsyncSession = Depends(database.get_db)):
+    # listing stays open after pro ends so past triggers are still visible
+    query = select(models.Alert).where(models.Alert.user_id == current_user.id)
+    if status:
+        query = query.where(models.Alert.status == status)
+    result = await db.execute(query.order_by(models.Alert.id.desc()).limit(MAX_ALERTS_PER_USER * 5))
+    return result.scalars().all()
+
+@router.delete("/{alert_id}", status_code=204, dependencies=[Depends(alerts_rate_limit)])
+async def delete_alert(alert_id: int, current_user: auth.Principal = Depends(auth.get_current_user),
+                       db: AsyncSession = Depends(database.get_db)):
+    alert = await db.get(models.Alert, alert_id)
+    if alert is None or alert.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    if alert.status == "active":
+        alert.status = "cancelled"
+        await db.commit()
+        alerts.alert_engine.cancel(alert.id, alert.symbol, alert.metric, alert.condition)
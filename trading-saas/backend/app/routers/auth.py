@@ -1,61 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from .. import models, schemas, auth, database
-from upstash_redis import Redis
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
+from ..rate_limit import RateLimit
 
 router = APIRouter(
     prefix = "/auth",
     tags = ["Authentication"]
 )
 
-# redis for rate limiting
-r = Redis(
-    url=os.getenv("UPSTASH_REDIS_REST_URL"),
-    token=os.getenv("UPSTASH_REDIS_REST_TOKEN")
-)
+# 5 req/min per ip, shared by signup and login
+check_rate_limit = RateLimit(limit=5, window=60, key="ip", scope="auth")
 
-def check_rate_limit(request: Request):
-    # 5 req/min per ip
-    client_ip = request.client.host if request.client else "unknown"
-    key = f"rate_limit:{client_ip}"
-    
-    current = r.get(key)
-    if current and int(current) >= 5:
-        raise HTTPException(status_code=429, detail="Too many requests. Try again later.")
-    
-    r.incr(key)
-    r.expire(key, 60)
+async def _find_user(db: AsyncSession, email: str):
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
 
-@router.post("/signup", response_model=schemas.UserOut)
-def signup(user: schemas.UserCreate, request: Request, db: Session = Depends(database.get_db)):
-    check_rate_limit(request)
-    
+# bcrypt runs in the hashing pool, nothing here blocks the event loop
+@router.post("/signup", response_model=schemas.UserOut, dependencies=[Depends(check_rate_limit)])
+async def signup(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_db)):
     # check if email taken
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+    db_user = await _find_user(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # hash pwd and save
-    hashed_password = auth.get_password_hash(user.password)
+    hashed_password = await auth.hash_password_async(user.password)
     new_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
-@router.post("/login", response_model=schemas.Token)
-def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    check_rate_limit(request)
-    
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
+@router.post("/login", response_model=schemas.Token, dependencies=[Depends(check_rate_limit)])
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_db)):
+    user = await _find_user(db, form_data.username)
 
     # wrong creds
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+    if not user or not await auth.verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -67,5 +50,5 @@ def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=schemas.UserOut)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+def read_users_me(current_user: auth.Principal = Depends(auth.get_current_user)):
     return current_user
\ No newline at end of file
@@ -1,13 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
-from datetime import datetime, timezone, timedelta
-from sqlalchemy.orm import Session
-from .. import database, models, auth
-import stripe
-import os
-from dotenv import load_dotenv
-from upstash_redis import Redis
-
-load_dotenv()
+from fastapi import APIRouter, Depends, HTTPException, Request
+from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import database, auth, webhooks
+from ..config import get_settings
+from ..rate_limit import RateLimit
 
 router = APIRouter(
     prefix="/billing",
@@ -15,21 +11,30 @@ router = APIRouter(
 )
 
 # stripe setup
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
-PRO_PRICE_ID = os.getenv("STRIPE_PRICE_ID")
-STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET") 
+settings = get_settings()
+PRO_PRICE_ID = settings.stripe_price_id
+STRIPE_WEBHOOK_SECRET = settings.stripe_webhook_secret
+
+_stripe = None
+
+def get_stripe():
+    # the sdk takes ~100ms to import, only pay for it once billing is actually used
+    global _stripe
+    if _stripe is None:
+        import stripe
+        stripe.api_key = settings.stripe_secret_key
+        _stripe = stripe
+    return _stripe
 
 MY_DOMAIN = "https://trading-signals-saas.vercel.app"
 
-# redis for idempotency
-r = Redis(
-    url=os.getenv("UPSTASH_REDIS_REST_URL"),
-    token=os.getenv("UPSTASH_REDIS_REST_TOKEN")
-)
+# stripe's webhook calls are not limited, only user-facing routes
+billing_rate_limit = RateLimit(limit=20, window=60, key="user", scope="billing")
 
-@router.post("/create-checkout-session")
-def create_checkout_session(current_user: models.User = Depends(auth.get_current_user)):
+@router.post("/create-checkout-session", dependencies=[Depends(billing_rate_limit)])
+def create_checkout_session(current_user: auth.Principal = Depends(auth.get_current_user)):
     # start stripe checkout
+    stripe = get_stripe()
     try:
         checkout_session = stripe.checkout.Session.create(
             payment_method_types=['card'],
@@ -53,10 +58,11 @@ def create_checkout_session(current_user: models.User = Depends(auth.get_current
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(database.get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(database.get_db)):
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
-    
+    stripe = get_stripe()
+
     try:
         event = stripe.Webhook.construct_event(
             payload, sig_header, STRIPE_WEBHOOK_SECRET
@@ -66,31 +72,16 @@ async def stripe_webhook(request: Request, db: Session = Depends(database.get_db
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    # skip if already processed
-    event_id = event['id']
-    if r.get(f"webhook:{event_id}"):
+    # durable enqueue, the event id primary key makes retries a no-op
+    if not await webhooks.enqueue_event(db, event, payload):
         return {"status": "already_processed"}
-    
-    r.setex(f"webhook:{event_id}", 86400, "processed")
-
-    # payment done - upgrade user
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        customer_email = session['customer_email']
-        
-        user = db.query(models.User).filter(models.User.email == customer_email).first()
-        if user:
-            user.is_pro = True
-            user.stripe_customer_id = session.get('customer')
-            user.stripe_subscription_id = session.get('subscription')
-            user.subscription_end_date = datetime.now(timezone.utc) + timedelta(days=30)
-            
-            db.commit()
 
+    # applied in the background, stripe gets its 200 right away
+    webhooks.processor.notify()
     return {"status": "success"}
 
-@router.get("/status")
-def get_billing_status(current_user: models.User = Depends(auth.get_current_user)):
+@router.get("/status", dependencies=[Depends(billing_rate_limit)])
+def get_billing_status(current_user: auth.Principal = Depends(auth.get_current_user)):
     # check sub status
     if current_user.is_pro and current_user.subscription_end_date:
         sub_end = current_user.subscription_end_date
@@ -1,72 +1,423 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timezone
-from sqlalchemy.orm import Session
-from .. import models, database, auth
-from upstash_redis import Redis
-from dotenv import load_dotenv
-import os
+from typing import List, Optional
+from .. import database, auth, engine, history, payloads, bars, backtest, schemas
+from ..broadcast import broadcaster, format_sse
+from ..cache import TTLCache, TwoTierCache
+from ..cache_backend import get_cache
+from ..rate_limit import RateLimit
+from ..config import get_settings
+import asyncio
 import json
-import random
 
-load_dotenv()
+settings = get_settings()
+
+# polled endpoints: per-worker token bucket, no redis round trip
+signals_rate_limit = RateLimit(limit=120, window=60, key="user", scope="signals", local=True)
 
 router = APIRouter(
     prefix="/signals",
-    tags=["Signals"]
-)
-
-# redis cache
-r = Redis(
-    url=os.getenv("UPSTASH_REDIS_REST_URL"),
-    token=os.getenv("UPSTASH_REDIS_REST_TOKEN")
+    tags=["Signals"],
+    dependencies=[Depends(signals_rate_limit)]
 )
 
 def generate_market_data():
-    stocks = ["NIFTY 50", "RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "SBIN", "BHARTIARTL", "ITC", "LT"]
-    signals = []
-    for stock in stocks:
-        action = random.choice(["BUY", "SELL", "HOLD"])
-        price = random.randint(1000, 3000)
-        signals.append({
-            "id": stock,
-            "action": action,
-            "price": price,
-            "timestamp": "Just Now"
-        })
-    return signals
+    # advance the feed one bar and rerun the indicators for every symbol
+    eng = engine.get_engine()
+    eng.simulate_bar()
+    eng.recompute()
+    return eng.latest_signals(engine.DEFAULT_SYMBOLS)
+
+SIGNALS_KEY = "market_signals"
+SIGNALS_TTL = 300  # 5 min cache in redis
+
+# l1: each worker keeps the snapshot for a few seconds, then serves it stale
+# for the rest of the redis ttl while one task refreshes it
+L1_TTL = settings.signal_l1_ttl_seconds
+signal_cache = TwoTierCache(TTLCache(maxsize=64, ttl=L1_TTL, stale_ttl=SIGNALS_TTL))
+
+PLANS = ("Free", "Pro")
+
+# entitlements are per symbol: free users see these, pro users see everything
+FREE_SYMBOLS = ["NIFTY 50", "RELIANCE", "TCS"]
+_FREE_SET = frozenset(FREE_SYMBOLS)
+
+def can_view(plan: str, symbol: str) -> bool:
+    return plan == "Pro" or symbol in _FREE_SET
+
+SIGNAL_FIELDS = ("id", "action", "price", "timestamp")
+
+class SignalSnapshot:
+    # one generated snapshot with each tier's data array and body encoded once
+
+    def __init__(self, signals, generated_at: Optional[datetime] = None):
+        self.signals = signals
+        self.generated_at = generated_at or datetime.now(timezone.utc)
+        # symbol -> row, for batch queries that pick symbols out of the snapshot
+        self.index = {s["id"]: i for i, s in enumerate(signals)}
+        self._columns = None
+        self.data = {plan: payloads.dumps(tier_view(signals, plan)) for plan in PLANS}
+        # same snapshot in redis = same version on every worker
+        self.version = payloads.make_etag(self.generated_at.isoformat(), self.data["Pro"]).strip('"')
+        self.free_body = payloads.EncodedBody(
+            b'{"status":"success","plan":"Free","message":"Upgrade to Pro to see all signals","data":'
+            + self.data["Free"] + b"}",
+            etag=f'"{self.version}-free"',
+            precompress=True,
+        )
+        # pro bodies differ only by subscription_end_date, built once per distinct date
+        self._pro_bodies = TTLCache(maxsize=4096, ttl=SIGNALS_TTL * 2)
+
+    def body(self, plan: str, subscription_end_date: Optional[str] = None) -> payloads.EncodedBody:
+        if plan == "Free":
+            return self.free_body
+        body = self._pro_bodies.get(subscription_end_date)
+        if body is None:
+            # only the envelope is per user, the data bytes are shared
+            body = payloads.EncodedBody(
+                b'{"status":"success","plan":"Pro","subscription_end_date":'
+                + payloads.dumps(subscription_end_date)
+                + b',"data":' + self.data["Pro"] + b"}",
+                etag=payloads.make_etag(self.version, subscription_end_date),
+            )
+            self._pro_bodies.set(subscription_end_date, body)
+        return body
+
+    @property
+    def columns(self) -> dict:
+        # column-oriented copy, built on the first batch query that needs it
+        if self._columns is None:
+            self._columns = {f: [s[f] for s in self.signals] for f in SIGNAL_FIELDS}
+        return self._columns
+
+    def to_redis(self) -> bytes:
+        return payloads.dumps({"generated_at": self.generated_at.isoformat(), "signals": self.signals})
+
+    @classmethod
+    def from_redis(cls, raw):
+        value = payloads.loads(raw)
+        if isinstance(value, list):
+            # plain list written before snapshots carried a timestamp
+            return cls(value)
+        return cls(value["signals"], datetime.fromisoformat(value["generated_at"]))
+
+async def _load_snapshot():
+    r = get_cache()
+    cached_data = await r.get(SIGNALS_KEY)
 
-@router.get("/")
-def get_signals(current_user: models.User = Depends(auth.get_current_user)):
-    # try cache first
-    cached_data = r.get("market_signals")
-    
     if cached_data:
-        signals = json.loads(cached_data)
-    else:
-        signals = generate_market_data()
-        r.setex("market_signals", 300, json.dumps(signals))  # 5 min cache
-    
+        signal_cache.stats["l2_hits"] += 1
+        return SignalSnapshot.from_redis(cached_data)
+
+    signal_cache.stats["l2_misses"] += 1
+    # indicator math is cpu work, keep it off the event loop
+    signals = await run_in_threadpool(generate_market_data)
+    snapshot = SignalSnapshot(signals)
+    await r.setex(SIGNALS_KEY, SIGNALS_TTL, snapshot.to_redis().decode())
+    # only the worker that generated it records it, so history has no duplicates
+    history.writer.add_snapshot(signals, snapshot.generated_at)
+    return snapshot
+
+async def load_snapshot() -> SignalSnapshot:
+    # l1 first, redis (then the engine) only on a miss or a stale refresh
+    return await signal_cache.get(SIGNALS_KEY, _load_snapshot)
+
+# intraday bars live in each worker's aggregator, so these skip redis and go stale fast
+BAR_L1_TTL = settings.signal_bar_l1_ttl_seconds
+bar_signal_cache = TwoTierCache(TTLCache(maxsize=len(bars.TIMEFRAMES), ttl=BAR_L1_TTL, stale_ttl=BAR_L1_TTL * 5))
+
+async def load_bar_snapshot(timeframe: str) -> SignalSnapshot:
+    async def load():
+        agg = await run_in_threadpool(bars.get_aggregator)
+        signals = await run_in_threadpool(agg.latest_signals, timeframe, engine.DEFAULT_SYMBOLS)
+        return SignalSnapshot(signals)
+    return await bar_signal_cache.get(f"{SIGNALS_KEY}:{timeframe}", load)
+
+def is_active_pro(user) -> bool:
     # check if pro is still valid
-    is_active_pro = False
-    if current_user.is_pro and current_user.subscription_end_date:
-        sub_end = current_user.subscription_end_date
+    if user.is_pro and user.subscription_end_date:
+        sub_end = user.subscription_end_date
         if sub_end.tzinfo is None:
             sub_end = sub_end.replace(tzinfo=timezone.utc)
-        
-        is_active_pro = sub_end > datetime.now(timezone.utc)
-    
-    if is_active_pro:
-        return {
-            "status": "success",
-            "plan": "Pro",
-            "subscription_end_date": current_user.subscription_end_date.isoformat(),
-            "data": signals
-        }
+        return sub_end > datetime.now(timezone.utc)
+    return False
+
+def tier_view(signals, plan: str):
+    # only the symbols the plan covers
+    if plan == "Pro":
+        return signals
+    return [s for s in signals if can_view(plan, s["id"])]
+
+@router.get("/")
+async def get_signals(
+    request: Request,
+    timeframe: Optional[str] = Query(None, description="bar size: 1m, 5m, 15m, 1h or 1d"),
+    current_user: auth.Principal = Depends(auth.get_current_user),
+):
+    if timeframe is None:
+        snapshot = await load_snapshot()
+    elif timeframe in bars.TIMEFRAMES:
+        snapshot = await load_bar_snapshot(timeframe)
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown timeframe, use one of {', '.join(bars.TIMEFRAMES)}")
+
+    # body bytes (and their gzip/br variants) are prebuilt per tier,
+    # hits skip json encoding entirely and unchanged polls get a 304
+    if is_active_pro(current_user):
+        body = snapshot.body("Pro", current_user.subscription_end_date.isoformat())
+    else:
+        body = snapshot.body("Free")
+    return payloads.cached_response(request, body, snapshot.generated_at)
+
+# encoded batch answers keyed by plan + query + snapshot versions, so dashboards
+# polling the same watchlist share one body until a snapshot changes
+query_bodies = TTLCache(maxsize=1024, ttl=SIGNALS_TTL)
+
+def project(snapshot: SignalSnapshot, symbols, fields, columns: bool):
+    # symbols missing from this shard are left out, the id field keeps rows aligned
+    rows = [i for i in map(snapshot.index.get, symbols) if i is not None]
+    if columns:
+        cols = snapshot.columns
+        return {f: [cols[f][i] for i in rows] for f in fields}
+    signals = snapshot.signals
+    return [{f: signals[i][f] for f in fields} for i in rows]
+
+async def load_shard(timeframe: str) -> SignalSnapshot:
+    if timeframe == "default":
+        return await load_snapshot()
+    return await load_bar_snapshot(timeframe)
+
+@router.post("/query")
+async def query_signals(
+    req: schemas.SignalQuery,
+    request: Request,
+    current_user: auth.Principal = Depends(auth.get_current_user),
+):
+    timeframes = list(dict.fromkeys(req.timeframes))
+    unknown_tf = [tf for tf in timeframes if tf != "default" and tf not in bars.TIMEFRAMES]
+    if unknown_tf:
+        raise HTTPException(status_code=400, detail=f"Unknown timeframe {unknown_tf[0]}, use default, {', '.join(bars.TIMEFRAMES)}")
+    fields = ["id"] + [f for f in dict.fromkeys(req.fields or SIGNAL_FIELDS) if f != "id"]
+
+    # one cache lookup per timeframe, every symbol comes out of that snapshot
+    snapshots = await asyncio.gather(*(load_shard(tf) for tf in timeframes))
+
+    plan = "Pro" if is_active_pro(current_user) else "Free"
+    universe = engine.get_engine().index
+    if req.symbols is None:
+        symbols = [s for s in universe if can_view(plan, s)]
+        denied, unknown = [], []
     else:
-        # free users get 5 only
-        return {
+        requested = list(dict.fromkeys(s.strip().upper() for s in req.symbols))
+        unknown = [s for s in requested if s not in universe]
+        denied = [s for s in requested if s in universe and not can_view(plan, s)]
+        symbols = [s for s in requested if s in universe and can_view(plan, s)]
+
+    etag = payloads.make_etag(plan, fields, req.columns, symbols, denied, unknown,
+                              *(f"{tf}:{s.version}" for tf, s in zip(timeframes, snapshots)))
+    generated_at = max(s.generated_at for s in snapshots)
+    body = query_bodies.get(etag)
+    if body is None:
+        layout = "columns" if req.columns else "signals"
+        body = payloads.EncodedBody(payloads.dumps({
             "status": "success",
-            "plan": "Free",
-            "message": "Upgrade to Pro to see all signals",
-            "data": signals[:3]
-        }
\ No newline at end of file
+            "plan": plan,
+            "fields": fields,
+            "timeframes": {
+                tf: {"generated_at": s.generated_at.isoformat(), layout: project(s, symbols, fields, req.columns)}
+                for tf, s in zip(timeframes, snapshots)
+            },
+            "denied": denied,
+            "unknown": unknown,
+        }), etag=etag)
+        query_bodies.set(etag, body)
+    return payloads.cached_response(request, body, generated_at)
+
+@router.get("/history")
+async def get_signal_history(
+    symbol: Optional[List[str]] = Query(None),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: auth.Principal = Depends(auth.get_current_user),
+):
+    # free users only get history for the symbols they can see live
+    if not is_active_pro(current_user):
+        if symbol and not all(can_view("Free", s) for s in symbol):
+            raise HTTPException(status_code=403, detail="Upgrade to Pro to see history for this symbol")
+        symbol = symbol or FREE_SYMBOLS
+
+    try:
+        after = history.decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    query = history.history_query(symbol, start, end, after, limit)
+    return StreamingResponse(history.stream_history(query, limit), media_type="application/json")
+
+# backtests are heavy, a few per minute per user on top of the router limit
+backtest_rate_limit = RateLimit(limit=10, window=60, key="user", scope="backtest")
+
+BACKTEST_TTL = settings.backtest_cache_ttl_seconds
+# the key covers the parameters and the data version, so results never go stale, only old
+backtest_cache = TwoTierCache(TTLCache(maxsize=64, ttl=BACKTEST_TTL))
+
+def _epoch(ts: Optional[datetime]) -> Optional[int]:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return int(ts.timestamp())
+
+@router.post("/backtest", dependencies=[Depends(backtest_rate_limit)])
+async def run_backtest(req: schemas.BacktestRequest, current_user: auth.Principal = Depends(auth.get_current_user)):
+    # same normalisation as /signals/query, "tcs" and "TCS" are one symbol and one cache key
+    requested = list(dict.fromkeys(s.strip().upper() for s in req.symbols)) if req.symbols else None
+    # free users can check the strategy on the symbols they see live
+    if is_active_pro(current_user):
+        symbols = requested or engine.DEFAULT_SYMBOLS
+    else:
+        if requested and not all(can_view("Free", s) for s in requested):
+            raise HTTPException(status_code=403, detail="Upgrade to Pro to backtest this symbol")
+        symbols = requested or FREE_SYMBOLS
+    symbols = list(dict.fromkeys(symbols))
+
+    combos = backtest.grid(**{p: getattr(req, p) for p in backtest.PARAMS})
+    if not combos:
+        raise HTTPException(status_code=400, detail="No valid parameter combinations (fast must be below slow, rsi_low below rsi_high)")
+    if len(combos) > backtest.MAX_COMBOS:
+        raise HTTPException(status_code=400, detail=f"Parameter grid too large, max {backtest.MAX_COMBOS} combinations")
+
+    try:
+        close, ts = await run_in_threadpool(backtest.load_history, symbols, _epoch(req.start), _epoch(req.end))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No history for {e.args[0]}")
+    if close.shape[1] < 2:
+        raise HTTPException(status_code=400, detail="Not enough history in that range")
+
+    # same parameters over the same bars = same result, for every user and worker
+    key = "backtest:" + payloads.make_etag(
+        req.model_dump_json(exclude={"symbols", "start", "end"}), symbols,
+        int(ts[0]), int(ts[-1]), close.shape, close[:, -1].tobytes().hex(),
+    ).strip('"')
+
+    async def load():
+        r = get_cache()
+        cached = await r.get(key)
+        if cached:
+            backtest_cache.stats["l2_hits"] += 1
+            return cached.encode() if isinstance(cached, str) else cached
+        backtest_cache.stats["l2_misses"] += 1
+        results = await backtest.run_grid_async(symbols, close, combos, req.allow_short, req.cost_bps)
+
+        def encode():
+            # megabytes of json for a big grid, keep the encode off the event loop
+            best = max(range(len(results)), key=lambda i: results[i]["portfolio"]["sharpe"])
+            return payloads.dumps({
+                "status": "success",
+                "start": engine.bar_isoformat(ts[0]),
+                "end": engine.bar_isoformat(ts[-1]),
+                "bars": int(close.shape[1]),
+                "best": best,
+                "results": results,
+            })
+
+        body = await run_in_threadpool(encode)
+        await r.setex(key, BACKTEST_TTL, body.decode())
+        return body
+
+    body = await backtest_cache.get(key, load)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/cache-stats")
+def get_cache_stats(current_user: auth.Principal = Depends(auth.get_current_user)):
+    return signal_cache.snapshot_stats()
+
+# push updates
+STREAM_POLL_SECONDS = settings.signal_stream_poll_seconds
+STREAM_KEEPALIVE_SECONDS = 15
+
+_producer: Optional[asyncio.Task] = None
+
+async def _produce_snapshots():
+    # one producer per worker: load once, encode once per tier, fan out to every subscriber
+    # start from what the topics already hold: a client reconnecting after the last
+    # producer stopped has seen that frame, publishing it again would repeat it
+    last_frames = {t.name: t.frame for t in broadcaster.topics.values() if t.frame is not None}
+    last_snapshot = None
+    while broadcaster.subscriber_count() > 0:
+        try:
+            snapshot = await load_snapshot()
+        except Exception:
+            snapshot = None
+        if snapshot is not None:
+            topics = broadcaster.active_topics()
+            # same l1 snapshot as last time, only re-encode for tiers that just got subscribers
+            if snapshot is last_snapshot:
+                topics = [t for t in topics if t.name not in last_frames]
+            last_snapshot = snapshot
+            for topic in topics:
+                frame = format_sse(
+                    '{"plan": "%s", "data": %s}' % (topic.name, snapshot.data[topic.name].decode()),
+                    event="signals",
+                )
+                # only wake subscribers when the view actually changed
+                if last_frames.get(topic.name) != frame:
+                    last_frames[topic.name] = frame
+                    topic.publish(frame)
+        await asyncio.sleep(STREAM_POLL_SECONDS)
+
+def _ensure_producer():
+    global _producer
+    if _producer is None or _producer.done():
+        _producer = asyncio.create_task(_produce_snapshots())
+
+async def get_stream_user(request: Request, token: Optional[str] = Query(None)):
+    # EventSource can't send headers so the token may come in the query string
+    if token is None:
+        header = request.headers.get("authorization", "")
+        if header.lower().startswith("bearer "):
+            token = header[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    # auth once per connection, don't hold a db session for the whole stream
+    async with database.SessionLocal() as db:
+        return await auth.get_current_user(token, db)
+
+async def _event_stream(user):
+    plan = "Pro" if is_active_pro(user) else "Free"
+    hello = {"plan": plan}
+    if plan == "Pro":
+        hello["subscription_end_date"] = user.subscription_end_date.isoformat()
+    yield format_sse(json.dumps(hello), event="plan")
+
+    topic = broadcaster.subscribe(plan)
+    try:
+        _ensure_producer()
+        seen = 0
+        while True:
+            frame, seen = await topic.wait(seen, timeout=STREAM_KEEPALIVE_SECONDS)
+            # pro expired mid-stream, drop to the free view
+            if plan == "Pro" and not is_active_pro(user):
+                broadcaster.unsubscribe(topic)
+                plan = "Free"
+                topic = broadcaster.subscribe(plan)
+                _ensure_producer()
+                seen = 0
+                yield format_sse(json.dumps({"plan": plan}), event="plan")
+                continue
+            yield frame if frame is not None else b": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(topic)
+
+@router.get("/stream")
+async def stream_signals(current_user: auth.Principal = Depends(get_stream_user)):
+    return StreamingResponse(
+        _event_stream(current_user),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field, ConfigDict, conint, confloat, model_validator
+from datetime import datetime
+from typing import List, Literal, Optional
 
 # signup request
 class UserCreate(BaseModel):
@@ -21,3 +22,54 @@ class Token(BaseModel):
 # for jwt decode
 class TokenData(BaseModel):
     email: Optional[EmailStr] = None
+
+# backtest request, every list is one axis of the parameter grid
+class BacktestRequest(BaseModel):
+    symbols: Optional[List[str]] = Field(None, max_length=5000)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    # windows and periods need at least two bars, rsi levels live on its 0-100 scale
+    fast: List[conint(ge=2)] = Field([10], min_length=1)
+    slow: List[conint(ge=2)] = Field([30], min_length=1)
+    rsi_period: List[conint(ge=2)] = Field([14], min_length=1)
+    rsi_low: List[confloat(ge=0, le=100)] = Field([30.0], min_length=1)
+    rsi_high: List[confloat(ge=0, le=100)] = Field([70.0], min_length=1)
+    bb_window: List[conint(ge=2)] = Field([20], min_length=1)
+    bb_k: List[confloat(gt=0)] = Field([2.0], min_length=1)
+    threshold: List[conint(ge=1)] = Field([2], min_length=1)
+    allow_short: bool = False
+    cost_bps: float = Field(0.0, ge=0, le=1000)
+
+# batch signal query: symbols x timeframes, optional projection and column layout
+class SignalQuery(BaseModel):
+    symbols: Optional[List[str]] = Field(None, max_length=5000)  # None = everything the plan covers
+    timeframes: List[str] = Field(["default"], min_length=1, max_length=6)  # default = the daily snapshot
+    fields: Optional[List[Literal["id", "action", "price", "timestamp"]]] = None
+    columns: bool = False
+
+# alert: either a rule like "RELIANCE crosses above 2900" / "RSI(TCS) < 30", or the fields
+class AlertCreate(BaseModel):
+    rule: Optional[str] = Field(None, max_length=100)
+    symbol: Optional[str] = None
+    metric: Literal["price", "rsi"] = "price"
+    condition: Optional[Literal["crosses_above", "crosses_below", "above", "below"]] = None
+    threshold: Optional[float] = None
+
+    @model_validator(mode="after")
+    def rule_or_fields(self):
+        if self.rule is None and (self.symbol is None or self.condition is None or self.threshold is None):
+            raise ValueError("give a rule or symbol, condition and threshold")
+        return self
+
+class AlertOut(BaseModel):
+    id: int
+    symbol: str
+    metric: str
+    condition: str
+    threshold: float
+    status: str
+    created_at: Optional[datetime] = None
+    triggered_at: Optional[datetime] = None
+    triggered_value: Optional[float] = None
+
+    model_config = ConfigDict(from_attributes=True)
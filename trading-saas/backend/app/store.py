@@ -0,0 +1,377 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import quote, unquote
+import numpy as np
+from .config import get_settings
+
+# on-disk ohlcv history, one raw little-endian file per column, opened with np.memmap
+# so every worker maps the same page cache pages instead of holding its own copy.
+#
+# <root>/<timeframe>/CURRENT          name of the live packed generation
+# <root>/<timeframe>/gen-000001/      compacted bars: all symbols back to back, sorted by ts,
+#                                     index.json has the row offsets per symbol
+# <root>/<timeframe>/tail/<symbol>/   append-only columns written since the last compaction
+#
+# one writer at a time (importer, feed or compaction), any number of readers
+
+COLUMNS = {
+    "ts": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+}
+
+# ts goes last so a crash mid-append leaves it shortest, rows = shortest column
+APPEND_ORDER = ("open", "high", "low", "close", "volume", "ts")
+
+MARKET_DATA_DIR = get_settings().market_data_dir
+
+
+def _map(path: str, dtype: np.dtype, rows: Optional[int] = None) -> np.ndarray:
+    # mmap can't map an empty file
+    try:
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        return np.empty(0, dtype=dtype)
+    n = size // dtype.itemsize if rows is None else rows
+    if n == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+
+def _dedupe_sorted(cols: dict) -> dict:
+    # sort by ts, on duplicate timestamps the row written last wins
+    ts = cols["ts"]
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    keep = np.ones(len(ts), dtype=bool)
+    keep[:-1] = ts[1:] != ts[:-1]
+    idx = order[keep]
+    return {name: np.asarray(col)[idx] for name, col in cols.items()}
+
+
+class MarketStore:
+
+    def __init__(self, root: str, timeframe: str = "1d"):
+        self.timeframe = timeframe
+        self.path = os.path.join(root, timeframe)
+        self.tail_path = os.path.join(self.path, "tail")
+        self._gen = None
+        self._packed = {}
+        self._offsets = {}
+        self._lock = threading.Lock()
+
+    # packed generation
+
+    def _current(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        # remap only when a compaction swapped in a new generation
+        gen = self._current()
+        if gen == self._gen:
+            return
+        with self._lock:
+            if gen == self._gen:
+                return
+            packed, offsets = {}, {}
+            if gen is not None:
+                gen_path = os.path.join(self.path, gen)
+                with open(os.path.join(gen_path, "index.json")) as f:
+                    index = json.load(f)
+                bounds = index["offsets"]
+                offsets = {s: (bounds[i], bounds[i + 1]) for i, s in enumerate(index["symbols"])}
+                # plain ndarray views of the maps, slicing a np.memmap is much slower
+                packed = {name: _map(os.path.join(gen_path, name), dtype, bounds[-1]).view(np.ndarray)
+                          for name, dtype in COLUMNS.items()}
+            self._packed, self._offsets, self._gen = packed, offsets, gen
+
+    def _tail_dir(self, symbol: str) -> str:
+        return os.path.join(self.tail_path, quote(symbol, safe=""))
+
+    def _tail(self, symbol: str) -> Optional[dict]:
+        path = self._tail_dir(symbol)
+        if not os.path.isdir(path):
+            return None
+        rows = min(os.path.getsize(os.path.join(path, name)) // dtype.itemsize
+                   if os.path.exists(os.path.join(path, name)) else 0
+                   for name, dtype in COLUMNS.items())
+        if rows == 0:
+            return None
+        # tails are short and every map holds a file descriptor, so these are plain reads
+        return {name: np.fromfile(os.path.join(path, name), dtype=dtype, count=rows)
+                for name, dtype in COLUMNS.items()}
+
+    # reads
+
+    def symbols(self) -> list:
+        self._refresh()
+        names = set(self._offsets)
+        if os.path.isdir(self.tail_path):
+            names.update(unquote(d) for d in os.listdir(self.tail_path))
+        return sorted(names)
+
+    def read(self, symbol: str, start: Optional[int] = None, end: Optional[int] = None,
+             columns=None) -> dict:
+        # bars with start <= ts < end (epoch seconds). compacted symbols without a tail
+        # come back as zero-copy views into the mapped files
+        self._refresh()
+        return self._read(symbol, start, end, columns, os.path.isdir(self._tail_dir(symbol)))
+
+    def read_many(self, symbols, start: Optional[int] = None, end: Optional[int] = None,
+                  columns=None) -> dict:
+        # one generation check and one tail listing for the whole batch
+        self._refresh()
+        tails = set(os.listdir(self.tail_path)) if os.path.isdir(self.tail_path) else set()
+        return {s: self._read(s, start, end, columns, quote(s, safe="") in tails) for s in symbols}
+
+    def _read(self, symbol, start, end, columns, has_tail) -> dict:
+        columns = list(columns or COLUMNS)
+        if "ts" not in columns:
+            columns.append("ts")
+        bounds = self._offsets.get(symbol)
+        base = {name: self._packed[name][bounds[0]:bounds[1]] for name in columns} if bounds else None
+        tail = self._tail(symbol) if has_tail else None
+
+        if tail is None:
+            cols = base if base is not None else {name: np.empty(0, dtype=COLUMNS[name]) for name in columns}
+        else:
+            tail = {name: tail[name] for name in columns}
+            tail_ts = tail["ts"]
+            in_order = bool(np.all(tail_ts[1:] > tail_ts[:-1]))
+            if base is None or len(base["ts"]) == 0:
+                cols = tail if in_order else _dedupe_sorted(tail)
+            elif in_order and tail_ts[0] > base["ts"][-1]:
+                cols = {name: np.concatenate([base[name], tail[name]]) for name in columns}
+            else:
+                # late or corrected bars, merge until the next compaction does it on disk
+                cols = _dedupe_sorted({name: np.concatenate([base[name], tail[name]]) for name in columns})
+
+        if start is None and end is None:
+            return cols
+        ts = cols["ts"]
+        lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="left"))
+        return {name: col[lo:hi] for name, col in cols.items()}
+
+    def window(self, symbols, n_bars: int, field: str = "close"):
+        # newest n_bars per symbol as a (n_symbols, n_bars) matrix for the indicators,
+        # short histories are left-padded with nan. also returns each row's last ts
+        out = np.full((len(symbols), n_bars), np.nan)
+        last_ts = np.full(len(symbols), -1, dtype=np.int64)
+        for i, cols in enumerate(self.read_many(symbols, columns=[field]).values()):
+            values = cols[field][-n_bars:]
+            if len(values):
+                out[i, n_bars - len(values):] = values
+                last_ts[i] = cols["ts"][-1]
+        return out, last_ts
+
+    # writes
+
+    def append(self, symbol: str, ts, open_, high, low, close, volume) -> int:
+        cols = {
+            "ts": np.asarray(ts, dtype=COLUMNS["ts"]),
+            "open": np.asarray(open_, dtype=COLUMNS["open"]),
+            "high": np.asarray(high, dtype=COLUMNS["high"]),
+            "low": np.asarray(low, dtype=COLUMNS["low"]),
+            "close": np.asarray(close, dtype=COLUMNS["close"]),
+            "volume": np.asarray(volume, dtype=COLUMNS["volume"]),
+        }
+        n = len(cols["ts"])
+        if any(len(col) != n for col in cols.values()):
+            raise ValueError("all columns need the same length")
+        if n == 0:
+            return 0
+        path = self._tail_dir(symbol)
+        os.makedirs(path, exist_ok=True)
+        for name in APPEND_ORDER:
+            with open(os.path.join(path, name), "ab") as f:
+                f.write(cols[name].tobytes())
+        return n
+
+    def compact(self) -> int:
+        # fold every tail into a new packed generation, sorted and deduplicated per symbol
+        self._refresh()
+        symbols = self.symbols()
+        old_gen = self._gen
+        number = int(old_gen.split("-")[1]) + 1 if old_gen else 1
+        gen = f"gen-{number:06d}"
+        gen_path = os.path.join(self.path, gen)
+        shutil.rmtree(gen_path, ignore_errors=True)
+        os.makedirs(gen_path)
+
+        files = {name: open(os.path.join(gen_path, name), "wb") for name in COLUMNS}
+        offsets = [0]
+        try:
+            tails = set(os.listdir(self.tail_path)) if os.path.isdir(self.tail_path) else set()
+            for symbol in symbols:
+                cols = self._read(symbol, None, None, None, quote(symbol, safe="") in tails)
+                for name, f in files.items():
+                    f.write(np.ascontiguousarray(cols[name]).tobytes())
+                offsets.append(offsets[-1] + len(cols["ts"]))
+        finally:
+            for f in files.values():
+                f.close()
+        with open(os.path.join(gen_path, "index.json"), "w") as f:
+            json.dump({"symbols": symbols, "offsets": offsets}, f)
+
+        # readers pick up the new generation on their next read
+        tmp = os.path.join(self.path, "CURRENT.tmp")
+        with open(tmp, "w") as f:
+            f.write(gen)
+        os.replace(tmp, os.path.join(self.path, "CURRENT"))
+
+        shutil.rmtree(self.tail_path, ignore_errors=True)
+        if old_gen:
+            # open maps keep the old inodes alive until they are dropped
+            shutil.rmtree(os.path.join(self.path, old_gen), ignore_errors=True)
+        return offsets[-1]
+
+
+# bulk import
+
+def parse_ts(value) -> int:
+    # epoch seconds/ms or an iso date/datetime (naive = utc)
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        ts = int(value)
+    else:
+        value = str(value).strip()
+        try:
+            ts = int(float(value))
+        except ValueError:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            if parsed.tzinfo is None:
+                parsed = parsed.replace(tzinfo=timezone.utc)
+            return int(parsed.timestamp())
+    return ts // 1000 if ts > 10 ** 11 else ts
+
+
+TS_FIELDS = ("ts", "timestamp", "date", "datetime", "time")
+
+
+def _pick(fieldnames, options):
+    lower = {name.lower(): name for name in fieldnames}
+    for option in options:
+        if option in lower:
+            return lower[option]
+    return None
+
+
+def _append_grouped(store: MarketStore, rows_by_symbol: dict) -> int:
+    total = 0
+    for symbol, rows in rows_by_symbol.items():
+        arr = np.asarray(rows, dtype=np.float64)
+        cols = _dedupe_sorted({"ts": arr[:, 0].astype(np.int64), "open": arr[:, 1], "high": arr[:, 2],
+                               "low": arr[:, 3], "close": arr[:, 4], "volume": arr[:, 5]})
+        total += store.append(symbol, cols["ts"], cols["open"], cols["high"], cols["low"],
+                              cols["close"], cols["volume"])
+    return total
+
+
+def import_csv(store: MarketStore, path: str, symbol: Optional[str] = None) -> int:
+    # header row required: [symbol,] date|ts, open, high, low, close, volume.
+    # files without a symbol column need one passed in (default: the file name)
+    if symbol is None:
+        symbol = os.path.splitext(os.path.basename(path))[0]
+    rows_by_symbol = {}
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        sym_col = _pick(fields, ("symbol", "ticker"))
+        ts_col = _pick(fields, TS_FIELDS)
+        names = [_pick(fields, (c,)) for c in ("open", "high", "low", "close", "volume")]
+        if ts_col is None or any(n is None for n in names[:4]):
+            raise ValueError(f"{path}: need a date/ts column and open, high, low, close")
+        for row in reader:
+            key = row[sym_col] if sym_col else symbol
+            rows_by_symbol.setdefault(key, []).append(
+                [parse_ts(row[ts_col])] + [float(row[n] or 0) if n else 0.0 for n in names]
+            )
+    return _append_grouped(store, rows_by_symbol)
+
+
+def import_parquet(store: MarketStore, path: str, symbol: Optional[str] = None) -> int:
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("parquet import needs pyarrow (pip install pyarrow)")
+    if symbol is None:
+        symbol = os.path.splitext(os.path.basename(path))[0]
+    table = pq.read_table(path)
+    fields = table.column_names
+    sym_col = _pick(fields, ("symbol", "ticker"))
+    ts_col = _pick(fields, TS_FIELDS)
+    names = [_pick(fields, (c,)) for c in ("open", "high", "low", "close", "volume")]
+    if ts_col is None or any(n is None for n in names[:4]):
+        raise ValueError(f"{path}: need a date/ts column and open, high, low, close")
+
+    ts = table.column(ts_col).to_numpy(zero_copy_only=False)
+    if np.issubdtype(ts.dtype, np.datetime64):
+        ts = ts.astype("datetime64[s]").astype(np.int64)
+    else:
+        ts = np.fromiter((parse_ts(v) for v in ts), dtype=np.int64, count=len(ts))
+    values = [table.column(n).to_numpy(zero_copy_only=False).astype(np.float64) if n else np.zeros(len(ts))
+              for n in names]
+    keys = np.asarray(table.column(sym_col).to_pylist()) if sym_col else np.full(len(ts), symbol)
+
+    total = 0
+    for key in np.unique(keys):
+        mask = keys == key
+        cols = _dedupe_sorted({"ts": ts[mask], "open": values[0][mask], "high": values[1][mask],
+                               "low": values[2][mask], "close": values[3][mask], "volume": values[4][mask]})
+        total += store.append(str(key), cols["ts"], cols["open"], cols["high"], cols["low"],
+                              cols["close"], cols["volume"])
+    return total
+
+
+def import_file(store: MarketStore, path: str, symbol: Optional[str] = None) -> int:
+    if path.endswith((".parquet", ".pq")):
+        return import_parquet(store, path, symbol)
+    return import_csv(store, path, symbol)
+
+
+_stores = {}
+
+
+def get_store(timeframe: str = "1d") -> Optional[MarketStore]:
+    # None unless MARKET_DATA_DIR points at a store
+    if not MARKET_DATA_DIR or not os.path.isdir(os.path.join(MARKET_DATA_DIR, timeframe)):
+        return None
+    if timeframe not in _stores:
+        _stores[timeframe] = MarketStore(MARKET_DATA_DIR, timeframe)
+    return _stores[timeframe]
+
+
+if __name__ == "__main__":
+    # python -m app.store import dumps/*.csv --root market_data
+    # python -m app.store compact --root market_data
+    parser = argparse.ArgumentParser(description="memory-mapped ohlcv store")
+    parser.add_argument("command", choices=["import", "compact", "info"])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--root", default=MARKET_DATA_DIR or "market_data")
+    parser.add_argument("--timeframe", default="1d")
+    parser.add_argument("--symbol", default=None)
+    args = parser.parse_args()
+
+    cli_store = MarketStore(args.root, args.timeframe)
+    if args.command == "import":
+        for file in args.files:
+            print(f"{file}: {import_file(cli_store, file, args.symbol)} bars")
+        print(f"compacted {cli_store.compact()} bars")
+    elif args.command == "compact":
+        print(f"compacted {cli_store.compact()} bars")
+    else:
+        names = cli_store.symbols()
+        print(f"{len(names)} symbols, {sum(len(c['ts']) for c in cli_store.read_many(names, columns=['ts']).values())} bars")
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional
+from sqlalchemy import select, update, or_
+from . import database, models, auth, metrics
+
+log = logging.getLogger(__name__)
+
+# stripe webhook pipeline: the endpoint only verifies and enqueues,
+# a background consumer applies pending events in batches
+
+BATCH_SIZE = 100
+POLL_SECONDS = 5.0
+MAX_ATTEMPTS = 5
+# a failed event waits RETRY_BASE_SECONDS * 2^(attempts - 1) before it's claimed again,
+# so a locked db doesn't burn every attempt within one drain
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+
+
+async def enqueue_event(db, event, payload: bytes) -> bool:
+    # insert-or-ignore on the event id, False means stripe already delivered it
+    # the raw verified payload is stored, the consumer parses it later
+    # dialect modules load on first use, the postgres one is slow to import
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(models.WebhookEvent).values(
+        id=event["id"],
+        type=event["type"],
+        payload=payload.decode(),
+        status="pending",
+        attempts=0,
+        received_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=["id"])
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount == 1
+
+
+def _utc_from_timestamp(ts) -> Optional[datetime]:
+    return datetime.fromtimestamp(ts, tz=timezone.utc) if ts else None
+
+
+def _as_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    # sqlite hands back naive datetimes
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+
+
+async def _find_user(db, email=None, customer=None, subscription=None):
+    conditions = []
+    if email:
+        conditions.append(models.User.email == email)
+    if customer:
+        conditions.append(models.User.stripe_customer_id == customer)
+    if subscription:
+        conditions.append(models.User.stripe_subscription_id == subscription)
+    if not conditions:
+        return None
+    result = await db.execute(select(models.User).where(or_(*conditions)))
+    return result.scalars().first()
+
+
+async def handle_checkout_completed(db, obj):
+    # payment done - upgrade user
+    email = obj.get("customer_email") or (obj.get("customer_details") or {}).get("email")
+    user = await _find_user(db, email=email)
+    if user:
+        user.is_pro = True
+        user.stripe_customer_id = obj.get("customer")
+        user.stripe_subscription_id = obj.get("subscription")
+        # the session doesn't carry the billing period. if invoice.paid got here first it
+        # already set the real one, only fill in 30 days when there is no current end
+        now = datetime.now(timezone.utc)
+        end = _as_utc(user.subscription_end_date)
+        if end is None or end <= now:
+            user.subscription_end_date = now + timedelta(days=30)
+    return user
+
+
+class UserNotFound(Exception):
+    pass
+
+
+async def handle_invoice_paid(db, obj):
+    # renewal - extend to the end of the paid period.
+    # stripe doesn't order events, so this can arrive before checkout.session.completed
+    # has stored the customer id - match on the invoice email as well
+    user = await _find_user(
+        db, email=obj.get("customer_email"), customer=obj.get("customer"), subscription=obj.get("subscription"))
+    if user is None:
+        # keep the event pending, a later batch retries it
+        raise UserNotFound(f"no user for customer {obj.get('customer')}")
+    lines = (obj.get("lines") or {}).get("data") or []
+    period_end = lines[0].get("period", {}).get("end") if lines else None
+    user.is_pro = True
+    if obj.get("customer") and not user.stripe_customer_id:
+        user.stripe_customer_id = obj.get("customer")
+    if obj.get("subscription"):
+        user.stripe_subscription_id = obj.get("subscription")
+    user.subscription_end_date = (
+        _utc_from_timestamp(period_end or obj.get("period_end"))
+        or datetime.now(timezone.utc) + timedelta(days=30)
+    )
+    return user
+
+
+async def handle_subscription_deleted(db, obj):
+    # cancelled or unpaid - back to free
+    user = await _find_user(db, customer=obj.get("customer"), subscription=obj.get("id"))
+    if user:
+        user.is_pro = False
+        user.subscription_end_date = _utc_from_timestamp(obj.get("ended_at")) or datetime.now(timezone.utc)
+    return user
+
+
+HANDLERS = {
+    "checkout.session.completed": handle_checkout_completed,
+    "invoice.paid": handle_invoice_paid,
+    "customer.subscription.deleted": handle_subscription_deleted,
+}
+
+
+async def process_batch(limit: int = BATCH_SIZE) -> int:
+    # apply up to `limit` pending events in one transaction
+    async with database.SessionLocal() as db:
+        result = await db.execute(
+            select(models.WebhookEvent)
+            .where(
+                models.WebhookEvent.status == "pending",
+                or_(models.WebhookEvent.next_attempt_at.is_(None), models.WebhookEvent.next_attempt_at <= datetime.utcnow()),
+            )
+            .order_by(models.WebhookEvent.received_at)
+            .limit(limit)
+        )
+        events = result.scalars().all()
+        if not events:
+            return 0
+
+        touched = set()
+        for event in events:
+            # claim inside the same transaction as the user update,
+            # a second consumer racing on this row updates nothing and skips it
+            claimed = await db.execute(
+                update(models.WebhookEvent)
+                .where(models.WebhookEvent.id == event.id, models.WebhookEvent.status == "pending")
+                .values(status="processed", processed_at=datetime.utcnow(), attempts=models.WebhookEvent.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount != 1:
+                continue
+
+            handler = HANDLERS.get(event.type)
+            if handler is None:
+                continue  # event types we don't care about are just marked done
+            try:
+                async with db.begin_nested():
+                    obj = json.loads(event.payload)["data"]["object"]
+                    user = await handler(db, obj)
+                if user is not None:
+                    touched.add(user.email)
+            except Exception as e:
+                # roll back just this event, retry it on a later batch once its backoff is up
+                attempts = event.attempts + 1
+                await db.execute(
+                    update(models.WebhookEvent)
+                    .where(models.WebhookEvent.id == event.id)
+                    .values(
+                        status="failed" if attempts >= MAX_ATTEMPTS else "pending",
+                        error=str(e),
+                        processed_at=None,
+                        next_attempt_at=datetime.utcnow() + timedelta(seconds=retry_delay(attempts)),
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+
+        await db.commit()
+
+    # drop the cached entitlements so the change shows up right away
+    for email in touched:
+        auth.invalidate_principal(email)
+    return len(events)
+
+
+class WebhookProcessor:
+
+    def __init__(self, poll_seconds: float = POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self):
+        # new event enqueued, don't wait for the next poll
+        if self._wake is not None and self._task is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                # drain everything that is pending, a batch at a time
+                while await process_batch() == BATCH_SIZE:
+                    pass
+            except Exception:
+                log.exception("webhook processing failed")
+                metrics.BACKGROUND_ERRORS.inc(task="webhooks")
+
+
+processor = WebhookProcessor()
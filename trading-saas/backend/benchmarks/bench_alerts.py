@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.alerts import AlertEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="price moves against a large alert book")
+    parser.add_argument("--alerts", type=int, default=1_000_000)
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--moves", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+    prices = rng.uniform(100, 3000, args.symbols)
+
+    # thresholds within +-10% of the current price, like real alerts
+    sym_idx = rng.integers(0, args.symbols, args.alerts)
+    thresholds = prices[sym_idx] * rng.uniform(0.9, 1.1, args.alerts)
+    conditions = np.where(thresholds > prices[sym_idx], "crosses_above", "crosses_below")
+
+    engine = AlertEngine()
+    start = time.perf_counter()
+    engine.add_many(zip(range(args.alerts), (symbols[i] for i in sym_idx), ["price"] * args.alerts,
+                        conditions.tolist(), thresholds.tolist()))
+    for sym, price in zip(symbols, prices):
+        engine.update(sym, "price", price)
+    print(f"alerts={args.alerts} symbols={args.symbols} load={(time.perf_counter() - start) * 1000:.0f}ms")
+
+    # random walk ticks, 5bp moves
+    move_sym = rng.integers(0, args.symbols, args.moves)
+    steps = np.exp(rng.normal(0, 0.0005, args.moves))
+    updates = []
+    for i, step in zip(move_sym.tolist(), steps.tolist()):
+        prices[i] *= step
+        updates.append((symbols[i], float(prices[i])))
+
+    latencies = np.empty(args.moves)
+    fired = 0
+    start = time.perf_counter()
+    for n, (sym, price) in enumerate(updates):
+        t = time.perf_counter()
+        fired += len(engine.update(sym, "price", price))
+        latencies[n] = time.perf_counter() - t
+    elapsed = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e6
+    print(f"moves={args.moves} elapsed={elapsed * 1000:.0f}ms ({args.moves / elapsed / 1000:.0f}k moves/s)")
+    print(f"per move p50={p50:.1f}us p99={p99:.1f}us triggered={fired} queued={len(engine.queue)}")
+
+    # what checking every alert on every move would cost
+    start = time.perf_counter()
+    for _ in range(100):
+        ((thresholds > 1000.0) & (thresholds <= 1001.0)).nonzero()
+    print(f"full scan of {args.alerts} alerts per move: {(time.perf_counter() - start) * 10:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import backtest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="parameter grid backtest, inline vs process pool")
+    parser.add_argument("--symbols", type=int, default=2000)
+    parser.add_argument("--bars", type=int, default=1260)  # 5 years of daily bars
+    parser.add_argument("--fast", type=int, nargs="+", default=[5, 10, 15, 20])
+    parser.add_argument("--slow", type=int, nargs="+", default=[30, 50])
+    parser.add_argument("--workers", type=int, default=backtest.BACKTEST_WORKERS)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, (args.symbols, args.bars)), axis=1))
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+    combos = backtest.grid(fast=args.fast, slow=args.slow)
+    cells = args.symbols * args.bars * len(combos)
+    print(f"symbols={args.symbols} bars={args.bars} combos={len(combos)} ({cells / 1e6:.0f}M symbol-bars)")
+
+    start = time.perf_counter()
+    inline = backtest.run_grid(symbols, close, combos)
+    elapsed = time.perf_counter() - start
+    print(f"inline: {elapsed * 1000:.0f}ms ({cells / elapsed / 1e6:.1f}M symbol-bars/s)")
+
+    backtest.BACKTEST_WORKERS = args.workers
+    backtest.INLINE_CELLS = 0
+
+    async def pooled():
+        # first run pays for spawning the workers
+        await backtest.run_grid_async(symbols, close, combos[:1])
+        start = time.perf_counter()
+        results = await backtest.run_grid_async(symbols, close, combos)
+        return results, time.perf_counter() - start
+
+    try:
+        results, elapsed = asyncio.run(pooled())
+    finally:
+        backtest.shutdown_pool()
+    assert results == inline
+    print(f"pool x{args.workers}: {elapsed * 1000:.0f}ms ({cells / elapsed / 1e6:.1f}M symbol-bars/s)")
+    best = max(results, key=lambda r: r["portfolio"]["sharpe"])
+    print(f"best={best['params']} sharpe={best['portfolio']['sharpe']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# offline: memory cache + throwaway sqlite file
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db")
+
+import httpx
+from app.main import app
+from app.database import init_models
+from app.routers import auth as auth_router, signals as signals_router
+
+# measure the handlers, not the limiters
+app.dependency_overrides[auth_router.check_rate_limit] = lambda: None
+app.dependency_overrides[signals_router.signals_rate_limit] = lambda: None
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def poll_signals(client, headers, duration):
+    latencies = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        start = time.perf_counter()
+        res = await client.get("/signals/", headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert res.status_code == 200
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def login_storm(client, stop, counts):
+    while not stop.is_set():
+        res = await client.post("/auth/login", data={"username": "storm@example.com", "password": "stormpass123"})
+        counts[res.status_code] = counts.get(res.status_code, 0) + 1
+
+
+def report(name, latencies):
+    print(f"{name:<14} n={len(latencies):<5} p50={statistics.median(latencies):7.2f}ms "
+          f"p95={percentile(latencies, 95):7.2f}ms p99={percentile(latencies, 99):7.2f}ms")
+
+
+async def main(args):
+    await init_models()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post("/auth/signup", json={"email": "storm@example.com", "password": "stormpass123"})
+        res = await client.post("/auth/login", data={"username": "storm@example.com", "password": "stormpass123"})
+        headers = {"Authorization": f"Bearer {res.json()['access_token']}"}
+        await client.get("/signals/", headers=headers)  # warm caches
+
+        report("idle", await poll_signals(client, headers, args.duration))
+
+        stop = asyncio.Event()
+        counts = {}
+        storm = [asyncio.create_task(login_storm(client, stop, counts)) for _ in range(args.logins)]
+        latencies = await poll_signals(client, headers, args.duration)
+        stop.set()
+        await asyncio.gather(*storm)
+        report("login storm", latencies)
+        print(f"login responses: {counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="/signals latency while logins hammer bcrypt")
+    parser.add_argument("--logins", type=int, default=50, help="concurrent login clients")
+    parser.add_argument("--duration", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
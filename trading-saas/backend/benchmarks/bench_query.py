@@ -0,0 +1,63 @@
+import argparse
+import gzip
+import os
+import sys
+import time
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+import numpy as np
+from app import engine, payloads
+from app.routers.signals import SignalSnapshot, project
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--symbols", type=int, default=5000, help="universe size")
+    parser.add_argument("--watch", type=int, default=500, help="symbols a dashboard asks for")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # a snapshot the size of a real universe, same shape the engine produces
+    eng = engine.SignalEngine.random_walk([f"SYM{i:05d}" for i in range(args.symbols)], n_bars=60, seed=1)
+    signals = eng.latest_signals()
+    snapshot = SignalSnapshot(signals)
+    watch = list(np.random.default_rng(2).choice(eng.symbols, args.watch, replace=False))
+
+    full = snapshot.body("Pro", "2030-01-01T00:00:00").raw
+
+    def encode(fields, columns):
+        return payloads.dumps({"fields": fields, "timeframes": {"default": {
+            "columns" if columns else "signals": project(snapshot, watch, fields, columns)}}})
+
+    print(f"universe {args.symbols} symbols, dashboard watching {args.watch}")
+    print(f"  {'full /signals body':<34} {len(full) / 1024:8.1f} KiB  gzip {len(gzip.compress(full)) / 1024:7.1f} KiB")
+    for label, fields, columns in (
+        ("query, all fields, rows", ["id", "action", "price", "timestamp"], False),
+        ("query, all fields, columns", ["id", "action", "price", "timestamp"], True),
+        ("query, action+price, columns", ["id", "action", "price"], True),
+    ):
+        body = encode(fields, columns)
+        seconds = best_of(lambda: encode(fields, columns), args.repeat)
+        print(f"  {label:<34} {len(body) / 1024:8.1f} KiB  gzip {len(gzip.compress(body)) / 1024:7.1f} KiB"
+              f"  build {seconds * 1e3:6.3f} ms")
+
+    # what the old client did: fetch everything, parse, filter
+    wanted = set(watch)
+    seconds = best_of(lambda: [s for s in payloads.loads(full)["data"] if s["id"] in wanted], args.repeat)
+    print(f"  {'client-side filter of full body':<34} {'':>28}  parse+filter {seconds * 1e3:6.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import argparse
+import os
+import sys
+import time
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.engine import SignalEngine
+
+
+def main():
+    parser = argparse.ArgumentParser(description="full indicator recompute benchmark")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=252)  # 1 year of daily bars
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+    eng = SignalEngine.random_walk(symbols, n_bars=args.bars, seed=42)
+
+    # warm up numpy before timing
+    eng.recompute()
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        eng.recompute()
+        timings.append(time.perf_counter() - start)
+
+    best = min(timings)
+    print(f"symbols={args.symbols} bars={args.bars}")
+    print(f"best={best * 1000:.1f}ms mean={sum(timings) / len(timings) * 1000:.1f}ms")
+    print(f"throughput={args.symbols * args.bars / best / 1e6:.1f}M bars/s")
+
+
+if __name__ == "__main__":
+    main()
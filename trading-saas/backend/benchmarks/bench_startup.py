@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# path fix for imports
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND)
+
+# cold start as a fresh worker sees it: import app.main, run the lifespan startup,
+# then the first request to a few endpoints. every run is a new interpreter
+
+
+def child():
+    start = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    import httpx
+    from sqlalchemy import select
+    from app import auth, database, models
+
+    async def run():
+        timings = {"import_ms": (imported - start) * 1000}
+        lifespan = app.router.lifespan_context(app)
+        t = time.perf_counter()
+        await lifespan.__aenter__()
+        timings["lifespan_ms"] = (time.perf_counter() - t) * 1000
+
+        async with database.SessionLocal() as db:
+            if (await db.execute(select(models.User).where(models.User.email == "startup@example.com"))).scalars().first() is None:
+                db.add(models.User(email="startup@example.com", hashed_password="x"))
+                await db.commit()
+        headers = {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'startup@example.com'})}"}
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+            for name, path, h in (("root", "/", None), ("auth_me", "/auth/me", headers), ("signals", "/signals/", headers)):
+                t = time.perf_counter()
+                res = await client.get(path, headers=h)
+                timings[f"first_{name}_ms"] = (time.perf_counter() - t) * 1000
+                assert res.status_code == 200, (path, res.status_code)
+            # second /signals for comparison: everything warm
+            t = time.perf_counter()
+            await client.get("/signals/", headers=headers)
+            timings["warm_signals_ms"] = (time.perf_counter() - t) * 1000
+        timings["ready_to_first_signals_ms"] = (time.perf_counter() - start) * 1000
+
+        t = time.perf_counter()
+        await lifespan.__aexit__(None, None, None)
+        timings["shutdown_ms"] = (time.perf_counter() - t) * 1000
+        return timings
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--feed", action="store_true", help="start the tick replay feed too")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (python -X importtime)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    env = dict(os.environ)
+    env["CACHE_BACKEND"] = "memory"
+    env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")
+    env.setdefault("SECRET_KEY", "startup-bench")
+    if not args.feed:
+        env["TICK_FEED"] = "off"
+
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, __file__, "--child"], env=env, cwd=BACKEND,
+                             capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{args.runs} cold starts (median / max)")
+    for key in runs[0]:
+        values = [r[key] for r in runs]
+        print(f"  {key:<28} {percentile(values, 50):9.1f} ms {max(values):9.1f} ms")
+
+    if args.top:
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env, cwd=BACKEND,
+                             capture_output=True, text=True, check=True)
+        rows = []
+        for line in out.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                rows.append((int(cumulative), len(name) - len(name.lstrip()), name.strip()))
+        # importtime lists children before their parent, app.main's subtree is the
+        # indented block right above it; keep its direct children
+        end = next(i for i, r in enumerate(rows) if r[2] == "app.main")
+        begin = end
+        while begin > 0 and rows[begin - 1][1] > rows[end][1]:
+            begin -= 1
+        depth = rows[end][1] + 2
+        top = sorted(((us, name) for us, indent, name in rows[begin:end] if indent == depth), reverse=True)[:args.top]
+        print(f"\nslowest direct imports of app.main (cumulative)")
+        for us, name in top:
+            print(f"  {name:<40} {us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.store import MarketStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cold load of memory-mapped ohlcv history")
+    parser.add_argument("--symbols", type=int, default=5000)
+    parser.add_argument("--bars", type=int, default=1260)  # 5 years of daily bars
+    parser.add_argument("--root", default=None, help="existing store dir (default: build a temp one)")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="market_data_")
+    symbols = [f"SYM{i:05d}" for i in range(args.symbols)]
+
+    if args.root is None:
+        rng = np.random.default_rng(42)
+        ts = 1_600_000_000 + np.arange(args.bars, dtype=np.int64) * 86400
+        writer = MarketStore(root)
+        start = time.perf_counter()
+        for symbol in symbols:
+            close = 1000 * np.exp(np.cumsum(rng.normal(0, 0.015, args.bars)))
+            writer.append(symbol, ts, close, close * 1.01, close * 0.99, close, np.full(args.bars, 1e5))
+        appended = time.perf_counter() - start
+        start = time.perf_counter()
+        rows = writer.compact()
+        compacted = time.perf_counter() - start
+        print(f"append={appended * 1000:.0f}ms compact={compacted * 1000:.0f}ms rows={rows}")
+
+    # fresh store object = what a newly started worker does
+    start = time.perf_counter()
+    store = MarketStore(root)
+    names = store.symbols()
+    opened = time.perf_counter() - start
+
+    start = time.perf_counter()
+    closes = [c["close"] for c in store.read_many(names, columns=["close"]).values()]
+    mapped = time.perf_counter() - start
+
+    start = time.perf_counter()
+    total = sum(float(c.sum()) for c in closes)  # touches every page
+    touched = time.perf_counter() - start
+
+    n_bars = sum(len(c) for c in closes)
+    print(f"symbols={len(names)} bars={n_bars} ({n_bars * 8 / 1e6:.0f}MB of closes)")
+    print(f"open={opened * 1000:.1f}ms slice_all={mapped * 1000:.1f}ms scan={touched * 1000:.1f}ms checksum={total:.3e}")
+
+
+if __name__ == "__main__":
+    main()
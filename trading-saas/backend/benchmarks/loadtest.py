@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# fully offline: in-memory redis, throwaway sqlite file, local stripe signing secret,
+# no tick feed. set before the app is imported, modules read these at import time
+os.environ["CACHE_BACKEND"] = "memory"
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "loadtest.db")
+os.environ["STRIPE_WEBHOOK_SECRET"] = "whsec_loadtest"
+os.environ["TICK_FEED"] = "off"
+
+import httpx
+from app.main import app
+from app.database import init_models
+from app.cache_backend import get_cache
+from app import webhooks
+from app.routers import auth as auth_router, billing as billing_router, signals as signals_router
+
+# measure the handlers, not the limiters
+for limiter in (auth_router.check_rate_limit, signals_router.signals_rate_limit, billing_router.billing_rate_limit):
+    app.dependency_overrides[limiter] = lambda: None
+billing_router.STRIPE_WEBHOOK_SECRET = os.environ["STRIPE_WEBHOOK_SECRET"]
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "loadtest.json")
+PASSWORD = "loadtestpass123"
+
+# bcrypt-bound scenarios get fewer requests by default
+AUTH_SCENARIOS = ("signup", "login")
+
+
+def signed_webhook(event: dict):
+    # what stripe sends: t=<ts>,v1=hmac_sha256(secret, "<ts>.<payload>")
+    payload = json.dumps(event)
+    ts = int(time.time())
+    secret = billing_router.STRIPE_WEBHOOK_SECRET
+    sig = hmac.new(secret.encode(), f"{ts}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return payload, {"stripe-signature": f"t={ts},v1={sig}", "content-type": "application/json"}
+
+
+class Context:
+
+    def __init__(self, client, headers, email):
+        self.client = client
+        self.headers = headers
+        self.email = email
+
+
+async def signup(ctx: Context, i: int):
+    email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+    return await ctx.client.post("/auth/signup", json={"email": email, "password": PASSWORD})
+
+
+async def login(ctx: Context, i: int):
+    return await ctx.client.post("/auth/login", data={"username": ctx.email, "password": PASSWORD})
+
+
+async def auth_me(ctx: Context, i: int):
+    return await ctx.client.get("/auth/me", headers=ctx.headers)
+
+
+async def signals_hit(ctx: Context, i: int):
+    return await ctx.client.get("/signals/", headers=ctx.headers)
+
+
+async def signals_miss_setup(ctx: Context, i: int):
+    # drop both cache tiers so the request regenerates the snapshot
+    signals_router.signal_cache.invalidate(signals_router.SIGNALS_KEY)
+    await get_cache().delete(signals_router.SIGNALS_KEY)
+
+
+async def signals_miss(ctx: Context, i: int):
+    return await ctx.client.get("/signals/", headers=ctx.headers)
+
+
+async def webhook(ctx: Context, i: int):
+    event = {
+        "id": "evt_" + uuid.uuid4().hex,
+        "object": "event",
+        "type": "invoice.paid",
+        "created": int(time.time()),
+        # renewals for the signed-up user, so every event is applied rather than retried
+        "data": {"object": {"customer": "cus_loadtest", "customer_email": ctx.email, "lines": {"data": []}}},
+    }
+    payload, headers = signed_webhook(event)
+    return await ctx.client.post("/billing/webhook", content=payload, headers=headers)
+
+
+# name -> (request, untimed setup before each request)
+SCENARIOS = {
+    "signup": (signup, None),
+    "login": (login, None),
+    "auth_me": (auth_me, None),
+    "signals_hit": (signals_hit, None),
+    "signals_miss": (signals_miss, signals_miss_setup),
+    "webhook_burst": (webhook, None),
+}
+
+
+def summarize(latencies, errors, elapsed):
+    ms = np.asarray(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+    }
+
+
+async def run_scenario(ctx: Context, name: str, requests: int, concurrency: int):
+    request, setup = SCENARIOS[name]
+    latencies, errors = [], {}
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            if setup is not None:
+                await setup(ctx, i)
+            start = time.perf_counter()
+            res = await request(ctx, i)
+            latencies.append(time.perf_counter() - start)
+            if res.status_code >= 400:
+                errors[res.status_code] = errors.get(res.status_code, 0) + 1
+
+    # warm up so one-off costs (first snapshot, pool spawn) stay out of the numbers
+    await request(ctx, -1)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, {str(k): v for k, v in errors.items()}, time.perf_counter() - start)
+
+
+async def drain_webhooks():
+    # how fast the consumer applies what the burst enqueued
+    start = time.perf_counter()
+    applied = 0
+    while True:
+        n = await webhooks.process_batch()
+        applied += n
+        if n < webhooks.BATCH_SIZE:
+            break
+    elapsed = time.perf_counter() - start
+    return {"events": applied, "elapsed_ms": round(elapsed * 1000, 1),
+            "throughput_eps": round(applied / elapsed, 1) if elapsed else 0.0}
+
+
+async def run(args):
+    await init_models()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        email = "loadtest@example.com"
+        await client.post("/auth/signup", json={"email": email, "password": PASSWORD})
+        res = await client.post("/auth/login", data={"username": email, "password": PASSWORD})
+        ctx = Context(client, {"Authorization": f"Bearer {res.json()['access_token']}"}, email)
+
+        results = {}
+        for name in args.scenarios:
+            requests = args.auth_requests if name in AUTH_SCENARIOS else args.requests
+            results[name] = await run_scenario(ctx, name, requests, args.concurrency)
+            print(format_row(name, results[name]))
+        if "webhook_burst" in results:
+            results["webhook_burst"]["drain"] = await drain_webhooks()
+            print(f"{'':<14} drained {results['webhook_burst']['drain']['events']} events "
+                  f"at {results['webhook_burst']['drain']['throughput_eps']}/s")
+    return results
+
+
+def format_row(name, r):
+    errors = f" errors={r['errors']}" if r["errors"] else ""
+    return (f"{name:<14} n={r['requests']:<6} {r['throughput_rps']:>9.1f} req/s  "
+            f"p50={r['p50_ms']:8.2f}ms p95={r['p95_ms']:8.2f}ms p99={r['p99_ms']:8.2f}ms{errors}")
+
+
+def compare(baseline: dict, results: dict, threshold: float):
+    # regression = latency up or throughput down by more than threshold (0.2 = 20%),
+    # or any failed request: failing fast with 5xx would otherwise look like a speedup
+    failures = []
+    for name, r in results.items():
+        base = baseline.get("scenarios", {}).get(name)
+        errors = sum(r.get("errors", {}).values())
+        if errors:
+            base_errors = sum(base.get("errors", {}).values()) if base else 0
+            failures.append(f"{name}: errors {base_errors} -> {errors} {r['errors']}")
+        if base is None:
+            continue
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if base[key] > 0 and r[key] > base[key] * (1 + threshold):
+                failures.append(f"{name}: {key} {base[key]} -> {r[key]}")
+        if base["throughput_rps"] > 0 and r["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            failures.append(f"{name}: throughput_rps {base['throughput_rps']} -> {r['throughput_rps']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="in-process load test over the ASGI app")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--auth-requests", type=int, default=40, help="requests for the bcrypt-bound scenarios")
+    parser.add_argument("--save", nargs="?", const=DEFAULT_BASELINE, help="write results as the baseline")
+    parser.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="fail on regression against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed regression, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "auth_requests": args.auth_requests,
+        },
+        "scenarios": results,
+    }
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("concurrency") != args.concurrency:
+            print(f"warning: baseline ran at concurrency {baseline['meta'].get('concurrency')}")
+        failures = compare(baseline, results, args.threshold)
+        if failures:
+            print(f"regressions over {args.threshold:.0%}:")
+            for line in failures:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions over {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
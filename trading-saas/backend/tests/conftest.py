@@ -0,0 +1,56 @@
+import sys
+import os
+
+# run offline: in-memory cache backend instead of upstash
+os.environ.setdefault("CACHE_BACKEND", "memory")
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import select
+from app import auth, models
+from app.database import SessionLocal, init_models
+
+
+class Users:
+    # test accounts written straight to the db. the db file survives between runs,
+    # so every call sets the fields it's given instead of assuming a fresh row
+
+    def get(self, email, **fields):
+        async def run():
+            async with SessionLocal() as db:
+                user = (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
+                if user is None:
+                    user = models.User(email=email, hashed_password="x")
+                    db.add(user)
+                for name, value in fields.items():
+                    setattr(user, name, value)
+                await db.commit()
+                return user
+
+        return asyncio.run(run())
+
+    def set_plan(self, email, pro: bool):
+        end = datetime.utcnow() + timedelta(days=30) if pro else None
+        return self.get(email, is_pro=pro, subscription_end_date=end)
+
+    def token(self, email, pro=None) -> str:
+        # pro=None leaves the plan as it is; the cached principal is dropped either way
+        if pro is None:
+            self.get(email)
+        else:
+            self.set_plan(email, pro)
+        auth.invalidate_principal(email)
+        return auth.create_access_token(data={"sub": email})
+
+    def headers(self, email, pro=None) -> dict:
+        return {"Authorization": f"Bearer {self.token(email, pro)}"}
+
+
+@pytest.fixture(scope="session")
+def users():
+    asyncio.run(init_models())
+    return Users()
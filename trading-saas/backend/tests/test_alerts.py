@@ -0,0 +1,192 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import uuid
+from datetime import timedelta
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import SessionLocal
+from app import alerts, metrics, models
+
+client = TestClient(app)
+
+
+def test_parse_rule():
+    assert alerts.parse_rule("RELIANCE crosses above 2900") == ("RELIANCE", "price", "crosses_above", 2900.0)
+    assert alerts.parse_rule("RSI(TCS) < 30") == ("TCS", "rsi", "below", 30.0)
+    assert alerts.parse_rule("nifty 50 >= 20000.5") == ("NIFTY 50", "price", "above", 20000.5)
+    with pytest.raises(ValueError):
+        alerts.parse_rule("buy the dip")
+
+
+def test_index_matches_brute_force():
+    rng = np.random.default_rng(5)
+    index = alerts.ThresholdIndex()
+    index.BUFFER = 64
+    thresholds = rng.uniform(90, 110, 3000)
+    index.add(list(range(3000)), thresholds.tolist())
+    # a few still in the unsorted buffer, a few removed
+    index.add([3000, 3001], [100.5, 99.5])
+    thresholds = np.append(thresholds, [100.5, 99.5])
+    alive = np.ones(len(thresholds), dtype=bool)
+    for i in rng.choice(3000, 200, replace=False):
+        index.discard(int(i))
+        alive[i] = False
+
+    price = 100.0
+    for new in rng.uniform(90, 110, 200):
+        up = new > price
+        expected = alive & ((thresholds > price) & (thresholds <= new) if up else (thresholds >= new) & (thresholds < price))
+        hits = index.crossed(price, new, up)
+        assert sorted(hits) == list(np.flatnonzero(expected))
+        alive[hits] = False
+        price = new
+
+
+def test_engine_fires_once_and_honours_cancel():
+    engine = alerts.AlertEngine()
+    engine.update("TCS", "price", 100.0)
+    engine.add(1, "TCS", "price", "crosses_above", 105.0)
+    engine.add(2, "TCS", "price", "crosses_below", 95.0)
+    engine.add(3, "TCS", "price", "crosses_above", 110.0)
+    engine.cancel(3, "TCS", "price", "crosses_above")
+
+    assert engine.update("TCS", "price", 104.0) == []
+    assert engine.update("TCS", "price", 111.0) == [1]
+    assert engine.update("TCS", "price", 90.0) == [2]
+    assert engine.update("TCS", "price", 111.0) == []
+    assert [q[0] for q in engine.queue] == [1, 2]
+
+    # level alerts that already hold fire on creation
+    assert engine.add(4, "TCS", "price", "above", 100.0)
+    assert not engine.add(5, "TCS", "rsi", "below", 30.0)
+    assert engine.update_many(["TCS"], "rsi", [50.0]) == []
+    assert engine.update_many(["TCS"], "rsi", [25.0]) == [5]
+
+
+def fresh(name):
+    # new account per run, so alerts left by earlier runs never count against the limit
+    return f"{name}-{uuid.uuid4().hex[:8]}@example.com"
+
+
+def test_alert_lifecycle(users):
+    assert client.post("/alerts/", json={"rule": "RELIANCE crosses above 2900"},
+                       headers=users.headers(fresh("free-alerts"), pro=False)).status_code == 403
+
+    headers = users.headers(fresh("pro-alerts"), pro=True)
+    engine = alerts.alert_engine
+    engine.update("RELIANCE", "price", 2800.0)
+
+    res = client.post("/alerts/", json={"rule": "RELIANCE crosses above 2900"}, headers=headers)
+    assert res.status_code == 201
+    alert_id = res.json()["id"]
+    other = client.post("/alerts/", json={"symbol": "reliance", "condition": "crosses_above", "threshold": 2950},
+                        headers=headers).json()["id"]
+    assert client.delete(f"/alerts/{other}", headers=headers).status_code == 204
+    assert client.post("/alerts/", json={"rule": "NOPE crosses above 1"}, headers=headers).status_code == 400
+
+    assert alert_id in engine.update("RELIANCE", "price", 3000.0)
+    asyncio.run(alerts.deliver(engine))
+
+    listed = {a["id"]: a for a in client.get("/alerts/", headers=headers).json()}
+    assert listed[alert_id]["status"] == "triggered"
+    assert listed[alert_id]["triggered_value"] == 3000.0
+    assert listed[other]["status"] == "cancelled"
+
+
+def test_sync_picks_up_alerts_from_other_workers(users):
+    headers = users.headers(fresh("sync-alerts"), pro=True)
+    alert_id = client.post("/alerts/", json={"rule": "RSI(INFY) < 20"}, headers=headers).json()["id"]
+
+    # a fresh engine is another worker that never saw the create
+    other = alerts.AlertEngine()
+    assert asyncio.run(alerts.load_active(other)) >= 1
+    assert other.synced_at is not None
+    assert asyncio.run(alerts.load_active(other)) == 0
+    other.update("INFY", "rsi", 40.0)
+    assert alert_id in other.update("INFY", "rsi", 10.0)
+
+
+def test_delivery_failures_are_logged_and_counted(monkeypatch, caplog):
+    async def broken(engine):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(alerts, "load_active", broken)
+    before = metrics.BACKGROUND_ERRORS.value(task="alert_delivery")
+
+    async def run():
+        delivery = alerts.AlertDelivery(alerts.AlertEngine(), interval=0.01)
+        delivery.start()
+        await asyncio.sleep(0.05)
+        await delivery.stop()
+
+    asyncio.run(run())
+    assert metrics.BACKGROUND_ERRORS.value(task="alert_delivery") > before
+    assert "db down" in caplog.text
+
+
+def test_sync_picks_up_alerts_that_commit_late(users):
+    email = fresh("late-alerts")
+    headers = users.headers(email, pro=True)
+    client.post("/alerts/", json={"rule": "RSI(TCS) < 15"}, headers=headers)
+    other = alerts.AlertEngine()
+    asyncio.run(alerts.load_active(other))
+
+    # stamped before the newest alert the worker has seen, committed after its sync
+    user_id = users.get(email).id
+
+    async def insert_late():
+        async with SessionLocal() as db:
+            alert = models.Alert(user_id=user_id, symbol="TCS", metric="rsi", condition="below", threshold=12,
+                                 status="active", created_at=other.synced_at - timedelta(seconds=5))
+            db.add(alert)
+            await db.commit()
+            return alert.id
+
+    late_id = asyncio.run(insert_late())
+    assert asyncio.run(alerts.load_active(other)) == 1
+    assert asyncio.run(alerts.load_active(other)) == 0
+    other.update("TCS", "rsi", 40.0)
+    assert late_id in other.update("TCS", "rsi", 10.0)
+
+
+def test_failed_delivery_is_retried_next_tick(monkeypatch, users):
+    headers = users.headers(fresh("retry-alerts"), pro=True)
+    alert_id = client.post("/alerts/", json={"rule": "RSI(SBIN) < 5"}, headers=headers).json()["id"]
+    engine = alerts.AlertEngine()
+    engine.add(alert_id, "SBIN", "rsi", "below", 5.0)
+    engine.update("SBIN", "rsi", 50.0)
+    assert engine.update("SBIN", "rsi", 1.0) == [alert_id]
+
+    async def no_sync(engine):
+        return 0
+
+    real_session = alerts.database.SessionLocal
+    failures = []
+
+    def flaky_session():
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("database is locked")
+        return real_session()
+
+    monkeypatch.setattr(alerts, "load_active", no_sync)
+    monkeypatch.setattr(alerts.database, "SessionLocal", flaky_session)
+
+    async def run():
+        delivery = alerts.AlertDelivery(engine, interval=0.01)
+        delivery.start()
+        while engine.queue or not failures:
+            await asyncio.sleep(0.01)
+        await delivery.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert failures
+    listed = {a["id"]: a for a in client.get("/alerts/", headers=headers).json()}
+    assert listed[alert_id]["status"] == "triggered"
@@ -1,16 +1,17 @@
 import pytest
 import sys
 import os
+import asyncio
 
 # path fix for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from fastapi.testclient import TestClient
 from app.main import app
-from app.database import Base, engine
+from app.database import init_models
 
 # setup db
-Base.metadata.create_all(bind=engine)
+asyncio.run(init_models())
 
 client = TestClient(app)
 
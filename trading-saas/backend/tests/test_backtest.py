@@ -0,0 +1,145 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app import backtest, indicators
+from app.cache_backend import get_cache
+from app.routers.signals import backtest_cache
+
+client = TestClient(app)
+
+BUY, SELL, HOLD = indicators.BUY, indicators.SELL, indicators.HOLD
+
+
+def closes(n_sym=4, n_bars=200, seed=3):
+    return 1000 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.02, (n_sym, n_bars)), axis=1))
+
+
+def test_positions_carry_until_next_signal():
+    actions = np.array([[HOLD, BUY, HOLD, HOLD, SELL, HOLD, BUY]])
+    assert list(backtest.positions(actions)[0]) == [0, 1, 1, 1, 0, 0, 1]
+    assert list(backtest.positions(actions, allow_short=True)[0]) == [0, 1, 1, 1, -1, -1, 1]
+
+
+def naive(close, actions, cost_bps):
+    # bar by bar reference: returns per bar and the final equity of each trade
+    pos, prev, rets, trades, cur = 0, 0, [], [], None
+    for t in range(len(close)):
+        held = pos
+        r = close[t] / close[t - 1] - 1 if t else 0.0
+        ret = held * r - abs(held - prev) * cost_bps / 1e4
+        rets.append(ret)
+        if held != 0 and held != prev:
+            if cur is not None:
+                trades.append(cur)
+            cur = 1.0
+        if cur is not None:
+            cur *= 1 + ret
+        if held == 0 and prev != 0:
+            trades.append(cur)
+            cur = None
+        prev = held
+        pos = 1 if actions[t] == BUY else (0 if actions[t] == SELL else pos)
+    if cur is not None:
+        trades.append(cur)
+    return np.array(rets), trades
+
+
+def test_evaluate_matches_bar_by_bar_loop():
+    close = closes()
+    actions = indicators.compute_signals(close)
+    m = backtest.evaluate(close, actions, cost_bps=10)
+    for i in range(len(close)):
+        rets, trades = naive(close[i], actions[i], 10)
+        equity = np.cumprod(1 + rets)
+        assert np.isclose(m["total_return"][i], equity[-1] - 1)
+        assert np.isclose(m["max_drawdown"][i], (equity / np.maximum.accumulate(equity) - 1).min())
+        assert np.isclose(m["sharpe"][i], rets.mean() / rets.std(ddof=1) * np.sqrt(252))
+        assert m["trades"][i] == len(trades)
+        assert m["wins"][i] == sum(t > 1 for t in trades)
+
+
+def test_grid_skips_inverted_crossovers():
+    combos = backtest.grid(fast=[5, 40], slow=[20, 30], rsi_period=[14])
+    assert combos == [{"fast": 5, "slow": 20, "rsi_period": 14}, {"fast": 5, "slow": 30, "rsi_period": 14}]
+
+
+def test_pool_fan_out_matches_inline(monkeypatch):
+    close = closes(n_sym=7, n_bars=120)
+    symbols = [f"S{i}" for i in range(7)]
+    combos = backtest.grid(fast=[5, 10, 15], slow=[30])
+    inline = backtest.run_grid(symbols, close, combos)
+
+    monkeypatch.setattr(backtest, "INLINE_CELLS", 0)
+    monkeypatch.setattr(backtest, "SYMBOL_CHUNK", 3)
+    monkeypatch.setattr(backtest, "COMBO_CHUNK", 2)
+    # results are stitched together off the event loop thread
+    assembled_on = []
+    assemble = backtest._assemble
+    monkeypatch.setattr(backtest, "_assemble", lambda *a: assembled_on.append(threading.get_ident()) or assemble(*a))
+    try:
+        fanned = asyncio.run(backtest.run_grid_async(symbols, close, combos))
+    finally:
+        backtest.shutdown_pool()
+    assert fanned == inline
+    assert assembled_on and assembled_on[0] != threading.get_ident()
+
+
+def test_backtest_endpoint_is_cached_by_parameters(users):
+    headers = users.headers("backtest@example.com")
+    get_cache().clear()
+    body = {"fast": [5, 10], "slow": [30], "cost_bps": 5}
+
+    first = client.post("/signals/backtest", json=body, headers=headers)
+    assert first.status_code == 200
+    data = first.json()
+    assert len(data["results"]) == 2
+    assert len(data["results"][0]["symbols"]) == 3  # free tier symbols
+    assert 0 <= data["best"] < 2
+
+    misses = backtest_cache.stats["misses"]
+    again = client.post("/signals/backtest", json=body, headers=headers)
+    assert again.content == first.content
+    assert backtest_cache.stats["misses"] == misses
+
+
+def test_backtest_endpoint_limits(users):
+    headers = users.headers("backtest@example.com")
+    res = client.post("/signals/backtest", json={"symbols": ["LT"]}, headers=headers)
+    assert res.status_code == 403
+    res = client.post("/signals/backtest", json={"fast": [50], "slow": [30]}, headers=headers)
+    assert res.status_code == 400
+
+
+def test_backtest_rejects_degenerate_parameters(users):
+    headers = users.headers("backtest-pro@example.com", pro=True)
+    for body in ({"fast": [0]}, {"fast": [-3]}, {"rsi_period": [0]}, {"bb_window": [1]}, {"threshold": [0]},
+                 {"bb_k": [0]}, {"rsi_low": [-1]}, {"rsi_high": [101]}):
+        assert client.post("/signals/backtest", json=body, headers=headers).status_code == 422, body
+
+    res = client.post("/signals/backtest", json={"rsi_low": [70], "rsi_high": [30]}, headers=headers)
+    assert res.status_code == 400
+    # invalid pairs drop out of a grid that still has valid ones
+    res = client.post("/signals/backtest", json={"symbols": ["TCS"], "rsi_low": [30, 80], "rsi_high": [70]},
+                      headers=headers)
+    assert res.status_code == 200
+    assert [r["params"]["rsi_low"] for r in res.json()["results"]] == [30]
+
+
+def test_backtest_symbols_are_normalised(users):
+    headers = users.headers("backtest@example.com")
+    upper = client.post("/signals/backtest", json={"symbols": ["TCS"]}, headers=headers)
+    assert upper.status_code == 200
+    # a free symbol in lower case is still a free symbol, and the same cached result
+    misses = backtest_cache.stats["misses"]
+    lower = client.post("/signals/backtest", json={"symbols": [" tcs", "TCS"]}, headers=headers)
+    assert lower.status_code == 200
+    assert lower.content == upper.content
+    assert backtest_cache.stats["misses"] == misses
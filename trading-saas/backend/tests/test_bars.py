@@ -0,0 +1,124 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import numpy as np
+from fastapi.testclient import TestClient
+from app.main import app
+from app import bars, metrics
+
+client = TestClient(app)
+
+START = 1_700_000_000 - 1_700_000_000 % 86400
+
+
+def naive_bars(sym, ts, price, size, k, seconds):
+    # reference ohlcv built one tick at a time
+    out = {}
+    for s, t, p, v in zip(sym, ts, price, size):
+        if s != k:
+            continue
+        b = t - t % seconds
+        if b not in out:
+            out[b] = [p, p, p, p, 0.0]
+        bar = out[b]
+        bar[1] = max(bar[1], p)
+        bar[2] = min(bar[2], p)
+        bar[3] = p
+        bar[4] += v
+    return out
+
+
+def test_matches_naive_aggregation_across_batches():
+    symbols = ["A", "B", "C"]
+    src = bars.ReplaySource(symbols, START, tick_interval=13, seed=7)
+    agg = bars.BarAggregator(symbols, capacity=2048)
+    chunks = []
+    for batch in src.batches(START + 86400 + 5000, batch_seconds=977):
+        agg.ingest(*batch)
+        chunks.append(batch)
+    sym, ts, price, size = (np.concatenate(parts) for parts in zip(*chunks))
+
+    for tf, seconds in bars.TIMEFRAMES.items():
+        series = agg.series[tf]
+        for k in range(len(symbols)):
+            expected = naive_bars(sym, ts, price, size, k, seconds)
+            n = len(expected)
+            assert series.count[k] == n
+            starts = series.window(n, "start")[k]
+            assert list(starts) == sorted(expected)
+            for field, col in (("open", 0), ("high", 1), ("low", 2), ("close", 3), ("volume", 4)):
+                want = [expected[b][col] for b in sorted(expected)]
+                assert np.allclose(series.window(n, field)[k], want), (tf, field)
+
+
+def test_ring_buffer_keeps_newest_bars():
+    agg = bars.BarAggregator(["A"], timeframes=["1m"], capacity=4)
+    ts = START + np.arange(10) * 60
+    agg.ingest(np.zeros(10, dtype=np.int32), ts, np.arange(10, dtype=float), np.ones(10))
+    series = agg.series["1m"]
+    assert list(series.window(4)[0]) == [6, 7, 8, 9]
+    assert list(series.window(4, "start")[0]) == list(ts[-4:])
+
+
+def test_late_ticks_are_dropped():
+    agg = bars.BarAggregator(["A"], timeframes=["1m"])
+    agg.ingest([0], [START + 120], [10.0], [1.0])
+    agg.ingest([0], [START + 5], [99.0], [1.0])
+    series = agg.series["1m"]
+    assert series.late == 1
+    assert series.count[0] == 1
+    assert series.window(1)[0][0] == 10.0
+
+
+def test_short_history_is_backfilled():
+    agg = bars.BarAggregator(["A", "B"], timeframes=["1m"])
+    agg.ingest([0, 0, 1], [START, START + 60, START + 60], [1.0, 2.0, 5.0], [1, 1, 1])
+    window = agg.series["1m"].window(4)
+    assert list(window[0]) == [1.0, 1.0, 1.0, 2.0]
+    assert list(window[1]) == [5.0, 5.0, 5.0, 5.0]
+
+
+def test_csv_replay(tmp_path):
+    path = tmp_path / "ticks.csv"
+    path.write_text("symbol,ts,price,size\nA,%d,10,1\nX,%d,1,1\nA,%d,12,2\n" % (START, START, START + 30))
+    agg = bars.BarAggregator(["A"], timeframes=["1m"])
+    agg.ingest(*bars.load_ticks_csv(str(path), agg.index))
+    series = agg.series["1m"]
+    assert series.count[0] == 1
+    assert series.high[0, 0] == 12 and series.volume[0, 0] == 3
+
+
+def test_signals_by_timeframe(users):
+    headers = users.headers("bars@example.com")
+    res = client.get("/signals/", params={"timeframe": "5m"}, headers=headers)
+    assert res.status_code == 200
+    data = res.json()["data"]
+    assert len(data) == 3
+    for s in data:
+        # real bar start times, on the 5 minute grid
+        assert s["timestamp"].endswith("+00:00")
+        assert int(s["timestamp"][14:16]) % 5 == 0
+
+    assert client.get("/signals/", params={"timeframe": "2m"}, headers=headers).status_code == 400
+
+
+def test_feed_failures_are_logged_and_counted(caplog):
+    def broken(agg):
+        raise RuntimeError("listener blew up")
+
+    before = metrics.BACKGROUND_ERRORS.value(task="tick_feed")
+
+    async def run():
+        feed = bars.TickFeed(interval=0.01)
+        feed.subscribe(broken)
+        feed.start()
+        while metrics.BACKGROUND_ERRORS.value(task="tick_feed") == before:
+            await asyncio.sleep(0.01)
+        await feed.stop()
+
+    asyncio.run(asyncio.wait_for(run(), 10))
+    assert "listener blew up" in caplog.text
@@ -0,0 +1,124 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import json
+from app.main import app
+from app.broadcast import Broadcaster, format_sse
+from app.routers import signals as signals_router
+
+
+def test_format_sse():
+    assert format_sse('{"a": 1}', event="signals") == b'event: signals\ndata: {"a": 1}\n\n'
+
+
+def test_fan_out_shares_one_frame():
+    async def run():
+        b = Broadcaster()
+        topics = [b.subscribe("Pro") for _ in range(1000)]
+        waiters = [asyncio.create_task(t.wait(0, timeout=1)) for t in topics]
+        await asyncio.sleep(0)
+
+        frame = format_sse("hello")
+        b.publish("Pro", frame)
+        results = await asyncio.gather(*waiters)
+        # every subscriber got the very same bytes object
+        assert all(f is frame and v == 1 for f, v in results)
+        assert b.subscriber_count() == 1000
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_skips_to_latest():
+    async def run():
+        b = Broadcaster()
+        topic = b.subscribe("Free")
+        for i in range(5):
+            b.publish("Free", format_sse(str(i)))
+        # nothing buffered per subscriber, it just sees the newest frame
+        frame, version = await topic.wait(0)
+        assert frame == format_sse("4")
+        assert version == 5
+
+        # nothing new = keepalive timeout
+        frame, seen = await topic.wait(version, timeout=0.01)
+        assert frame is None and seen == 5
+
+    asyncio.run(run())
+
+
+class Stream:
+    # drives the app directly: test clients wait for the whole body and a stream never ends
+
+    def __init__(self, path, query=""):
+        self.messages = asyncio.Queue()
+        self.disconnected = asyncio.Event()
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": query.encode(), "headers": [], "client": ("127.0.0.1", 5000), "server": ("test", 80),
+        }
+        self.task = asyncio.create_task(app(scope, self.receive, self.messages.put))
+
+    async def receive(self):
+        await self.disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def next_event(self, timeout=5):
+        while True:
+            message = await asyncio.wait_for(self.messages.get(), timeout)
+            if message["type"] == "http.response.start":
+                self.status = message["status"]
+                self.headers = dict(message["headers"])
+            elif message.get("body"):
+                return message["body"]
+
+    async def close(self):
+        self.disconnected.set()
+        await asyncio.wait_for(self.task, 5)
+
+
+def parse_sse(frame):
+    lines = frame.decode().strip().split("\n")
+    assert lines[0].startswith("event: ")
+    return lines[0][7:], json.loads("".join(line[6:] for line in lines[1:]))
+
+
+def test_stream_endpoint(monkeypatch, users):
+    monkeypatch.setattr(signals_router, "STREAM_POLL_SECONDS", 0.01)
+    token = users.token("stream@example.com", pro=False)
+
+    async def run():
+        stream = Stream("/signals/stream")
+        assert json.loads(await stream.next_event()) == {"detail": "Not authenticated"}
+        assert stream.status == 401
+        await stream.close()
+
+        # EventSource can't set headers, the token rides in the query string
+        stream = Stream("/signals/stream", f"token={token}")
+        assert parse_sse(await stream.next_event()) == ("plan", {"plan": "Free"})
+        event, body = parse_sse(await stream.next_event())
+        assert stream.headers[b"content-type"].startswith(b"text/event-stream")
+        assert event == "signals" and body["plan"] == "Free"
+        assert sorted(s["id"] for s in body["data"]) == sorted(signals_router.FREE_SYMBOLS)
+        await stream.close()
+
+        # let the producer notice nobody is listening and stop
+        while signals_router._producer is not None and not signals_router._producer.done():
+            await asyncio.sleep(0.01)
+
+        # reconnect: the last frame once, not again when the new producer starts
+        stream = Stream("/signals/stream", f"token={token}")
+        await stream.next_event()
+        assert parse_sse(await stream.next_event()) == ("signals", body)
+        try:
+            repeat = await stream.next_event(timeout=0.2)
+        except asyncio.TimeoutError:
+            repeat = None
+        assert repeat is None
+        await stream.close()
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+from app.cache import TTLCache, TwoTierCache
+
+
+def test_ttl_and_lru_eviction():
+    c = TTLCache(maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")  # a is now most recent
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+
+    c.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("short") is None
+
+
+def test_concurrent_misses_load_once():
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        cache = TwoTierCache(TTLCache(ttl=60))
+        results = await asyncio.gather(*[cache.get("k", loader) for _ in range(50)])
+        assert results == ["value"] * 50
+        assert len(calls) == 1
+        assert cache.stats["misses"] == 50
+
+        assert await cache.get("k", loader) == "value"
+        assert cache.snapshot_stats()["hits"] == 1
+
+    asyncio.run(run())
+
+
+def test_stale_while_revalidate():
+    values = iter(["old", "new"])
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return next(values)
+
+    async def run():
+        cache = TwoTierCache(TTLCache(ttl=0.01, stale_ttl=60))
+        assert await cache.get("k", loader) == "old"
+        await asyncio.sleep(0.02)
+
+        # expired: everyone still gets the stale value, one refresh runs behind them
+        stale = await asyncio.gather(*[cache.get("k", loader) for _ in range(20)])
+        assert stale == ["old"] * 20
+        await asyncio.sleep(0.02)
+        assert len(calls) == 2
+        assert await cache.get("k", loader) == "new"
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from app.cache_backend import MemoryBackend
+
+
+def test_memory_backend_commands():
+    async def run():
+        r = MemoryBackend()
+        assert await r.get("missing") is None
+        assert await r.set("a", 1) is True
+        assert await r.get("a") == "1"
+        assert await r.set("a", 2, nx=True) is False
+        assert await r.incr("n") == 1
+        assert await r.incr("n") == 2
+        assert await r.ttl("n") == -1
+        assert await r.expire("n", 60) is True
+        assert await r.expire("n", 10, nx=True) is False
+        assert await r.ttl("n") == 60
+        assert await r.ttl("missing") == -2
+        assert await r.mset({"x": "1", "y": "2"}) is True
+        assert await r.mget("x", "y", "z") == ["1", "2", None]
+        assert await r.delete("x", "z") == 1
+
+    asyncio.run(run())
+
+
+def test_memory_backend_expiry():
+    async def run():
+        r = MemoryBackend()
+        await r.setex("k", 60, "v")
+        await r.pexpire("k", 10)
+        await asyncio.sleep(0.02)
+        assert await r.get("k") is None
+        assert await r.pttl("k") == -2
+
+    asyncio.run(run())
+
+
+def test_pipeline_single_batch():
+    async def run():
+        r = MemoryBackend()
+        pipe = r.pipeline(transaction=True)
+        pipe.incr("c").expire("c", 30, nx=True).incr("c").ttl("c")
+        assert await pipe.exec() == [1, True, 2, 30]
+        assert await r.set_many({"a": 1, "b": 2}, ex=5) == [True, True]
+        assert await r.mget("a", "b") == ["1", "2"]
+
+    asyncio.run(run())
@@ -0,0 +1,34 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import subprocess
+from app.config import Settings
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def test_env_overrides_env_file(tmp_path, monkeypatch):
+    env_file = tmp_path / ".env"
+    env_file.write_text("SECRET_KEY=from-file\nDB_POOL_SIZE=7\nTICK_FEED=off\n")
+    monkeypatch.setenv("DB_POOL_SIZE", "9")
+
+    settings = Settings(_env_file=env_file)
+    assert settings.secret_key == "from-file"
+    assert settings.db_pool_size == 9
+    assert settings.tick_feed == "off"
+    # unset values keep their defaults
+    assert settings.signal_l1_ttl_seconds == 5
+
+
+def test_importing_the_app_skips_heavy_optional_modules():
+    # stripe, passlib and the postgres dialect load on first use, not at import
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('stripe', 'passlib', 'sqlalchemy.dialects.postgresql') if m in sys.modules))"
+    )
+    env = dict(os.environ, CACHE_BACKEND="memory", TICK_FEED="off")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND, env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
@@ -0,0 +1,126 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import SessionLocal, init_models
+from app import auth, history, metrics, models
+
+asyncio.run(init_models())
+
+client = TestClient(app)
+
+
+def setup_module():
+    async def run():
+        async with SessionLocal() as db:
+            await db.execute(delete(models.SignalHistory).where(models.SignalHistory.symbol.in_(["TESTSYM", "OTHERSYM"])))
+            user = (await db.execute(select(models.User).where(models.User.email == "history@example.com"))).scalars().first()
+            if user is None:
+                user = models.User(email="history@example.com", hashed_password="x")
+                db.add(user)
+            user.is_pro = True
+            user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
+            await db.commit()
+
+        # 25 snapshots of two symbols through the batched writer
+        writer = history.HistoryWriter(chunk_size=7)
+        base = datetime(2024, 1, 1)
+        for i in range(25):
+            writer._buffer.extend([
+                {"symbol": "TESTSYM", "timeframe": "1d", "action": "BUY", "price": 100.0 + i, "ts": base + timedelta(minutes=i)},
+                {"symbol": "OTHERSYM", "timeframe": "1d", "action": "SELL", "price": 1.0, "ts": base + timedelta(minutes=i)},
+            ])
+        assert await writer.flush() == 50
+
+    asyncio.run(run())
+    auth.invalidate_principal("history@example.com")
+
+
+def headers():
+    return {"Authorization": f"Bearer {auth.create_access_token(data={'sub': 'history@example.com'})}"}
+
+
+def test_keyset_pages_cover_everything_once():
+    prices = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"symbol": "TESTSYM", "limit": 10}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/signals/history", params=params, headers=headers()).json()
+        prices += [row["price"] for row in body["data"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert prices == [100.0 + i for i in range(25)]
+
+
+def test_time_range_filter():
+    body = client.get("/signals/history", params={
+        "symbol": "TESTSYM",
+        "start": "2024-01-01T00:05:00",
+        "end": "2024-01-01T00:10:00",
+    }, headers=headers()).json()
+    assert [row["price"] for row in body["data"]] == [105.0, 106.0, 107.0, 108.0, 109.0]
+    assert body["next_cursor"] is None
+
+
+def test_bad_cursor():
+    res = client.get("/signals/history", params={"cursor": "???"}, headers=headers())
+    assert res.status_code == 400
+
+
+def test_failed_flush_keeps_rows_for_the_next_one(monkeypatch, caplog):
+    real_session = history.database.SessionLocal
+
+    def broken_session():
+        raise RuntimeError("database is locked")
+
+    before = metrics.BACKGROUND_ERRORS.value(task="history_flush")
+    row = {"symbol": "FLUSHSYM", "timeframe": "1d", "action": "BUY", "price": 1.0, "ts": datetime(2024, 2, 1)}
+
+    async def run():
+        writer = history.HistoryWriter(flush_interval=0)
+        monkeypatch.setattr(history.database, "SessionLocal", broken_session)
+        writer._buffer.append(dict(row))
+        await writer._flush_later()
+        assert writer._buffer == [row]
+
+        monkeypatch.setattr(history.database, "SessionLocal", real_session)
+        assert await writer.flush() == 1
+
+        async with SessionLocal() as db:
+            stored = (await db.execute(select(models.SignalHistory).where(models.SignalHistory.symbol == "FLUSHSYM"))).scalars().all()
+            await db.execute(delete(models.SignalHistory).where(models.SignalHistory.symbol == "FLUSHSYM"))
+            await db.commit()
+        return len(stored)
+
+    assert asyncio.run(run()) == 1
+    assert metrics.BACKGROUND_ERRORS.value(task="history_flush") == before + 1
+    assert "database is locked" in caplog.text
+
+
+def test_retry_buffer_is_capped(monkeypatch):
+    monkeypatch.setattr(history, "MAX_BUFFERED_ROWS", 3)
+
+    def broken_session():
+        raise RuntimeError("down")
+
+    monkeypatch.setattr(history.database, "SessionLocal", broken_session)
+    writer = history.HistoryWriter()
+    writer._buffer = [{"n": i} for i in range(5)]
+    with pytest.raises(RuntimeError):
+        asyncio.run(writer.flush())
+    # the newest rows survive
+    assert writer._buffer == [{"n": 2}, {"n": 3}, {"n": 4}]
@@ -0,0 +1,45 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from app import indicators
+from app.engine import SignalEngine, DEFAULT_SYMBOLS
+
+
+def test_sma_matches_naive():
+    x = np.random.default_rng(1).uniform(100, 200, size=(3, 40))
+    out = indicators.sma(x, 5)
+    assert np.isnan(out[:, :4]).all()
+    expected = np.array([[x[i, j - 4:j + 1].mean() for j in range(4, 40)] for i in range(3)])
+    assert np.allclose(out[:, 4:], expected)
+
+
+def test_rsi_bounds():
+    close = 1000 * np.exp(np.cumsum(np.random.default_rng(2).normal(0, 0.02, (50, 200)), axis=1))
+    r = indicators.rsi(close)[:, 14:]
+    assert ((r >= 0) & (r <= 100)).all()
+
+    # steady uptrend has no losses
+    up = np.tile(np.arange(1.0, 101.0), (2, 1))
+    assert np.allclose(indicators.rsi(up)[:, 14:], 100.0)
+
+
+def test_signals_for_whole_universe():
+    symbols = [f"SYM{i}" for i in range(500)]
+    eng = SignalEngine.random_walk(symbols, n_bars=252, seed=3)
+    actions = eng.recompute()
+    assert actions.shape == (500, 252)
+    assert set(np.unique(actions)) <= {indicators.BUY, indicators.SELL, indicators.HOLD}
+
+
+def test_latest_signals_format():
+    eng = SignalEngine.random_walk(DEFAULT_SYMBOLS, seed=4)
+    signals = eng.latest_signals()
+    assert [s["id"] for s in signals] == DEFAULT_SYMBOLS
+    for s in signals:
+        assert s["action"] in ("BUY", "SELL", "HOLD")
+        assert s["price"] > 0
+        assert "timestamp" in s
@@ -0,0 +1,40 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import subprocess
+
+BENCHMARKS = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+
+def compare(baseline, results):
+    # loadtest points the app at a throwaway db and overrides limiters on import, keep that out of this process
+    code = (
+        "import json, sys, loadtest; "
+        "args = json.load(sys.stdin); "
+        "print(json.dumps(loadtest.compare(args['baseline'], args['results'], 0.25)))"
+    )
+    env = dict(os.environ, CACHE_BACKEND="memory", TICK_FEED="off")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BENCHMARKS, env=env, check=True, capture_output=True,
+                         text=True, input=json.dumps({"baseline": baseline, "results": results}))
+    return json.loads(out.stdout)
+
+
+def scenario(p50=1.0, rps=100.0, errors=None):
+    return {"requests": 100, "errors": errors or {}, "throughput_rps": rps,
+            "p50_ms": p50, "p95_ms": p50 * 2, "p99_ms": p50 * 3}
+
+
+def test_compare_flags_errors_and_regressions():
+    baseline = {"scenarios": {"auth_me": scenario()}}
+    assert compare(baseline, {"auth_me": scenario(p50=1.1)}) == []
+    assert compare(baseline, {"auth_me": scenario(rps=50.0)}) == ["auth_me: throughput_rps 100.0 -> 50.0"]
+
+    # faster and busier but failing: still a regression
+    failures = compare(baseline, {"auth_me": scenario(p50=0.2, rps=400.0, errors={"500": 7})})
+    assert failures == ["auth_me: errors 0 -> 7 {'500': 7}"]
+    # a scenario without a baseline can still fail on errors
+    assert compare(baseline, {"login": scenario(errors={"503": 1})}) == ["login: errors 0 -> 1 {'503': 1}"]
@@ -0,0 +1,153 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import time
+from fastapi import FastAPI, Depends
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from app import metrics
+from app.cache_backend import MemoryBackend
+from app.main import app
+from app.rate_limit import RateLimit
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = metrics.Histogram("test_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        h.observe(value, op="x")
+    lines = list(h.render())
+    assert 'test_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{op="x",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{op="x",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{op="x"} 4' in lines
+    assert 'test_seconds_sum{op="x"} 4.05' in lines
+
+
+def test_instrumented_backend_times_commands_and_counts_hits():
+    backend = metrics.InstrumentedBackend(MemoryBackend())
+    hits, misses = metrics.CACHE_LOOKUPS.value(result="hit"), metrics.CACHE_LOOKUPS.value(result="miss")
+    pipelines = metrics.CACHE_LATENCY.count(command="multi")
+
+    async def run():
+        await backend.set("k", "v")
+        assert await backend.get("k") == "v"
+        assert await backend.get("missing") is None
+        pipe = backend.pipeline(transaction=True)
+        pipe.incr("n")
+        pipe.get("n")
+        assert await pipe.exec() == [1, "1"]
+
+    asyncio.run(run())
+    assert metrics.CACHE_LOOKUPS.value(result="hit") == hits + 1
+    assert metrics.CACHE_LOOKUPS.value(result="miss") == misses + 1
+    assert metrics.CACHE_LATENCY.count(command="multi") == pipelines + 1
+    # non-command attributes pass through
+    backend.clear()
+
+
+def test_rate_limit_rejections_are_counted():
+    limited_app = FastAPI()
+    limiter = RateLimit(limit=1, window=60, scope="metrics-test", local=True)
+
+    @limited_app.get("/x", dependencies=[Depends(limiter)])
+    def x():
+        return {}
+
+    client = TestClient(limited_app)
+    client.get("/x")
+    assert client.get("/x").status_code == 429
+    assert client.get("/x").status_code == 429
+    assert metrics.RATE_LIMITED.value(scope="metrics-test", where="local") == 1
+    assert metrics.RATE_LIMITED.value(scope="metrics-test", where="blocklist") == 1
+
+
+def test_metrics_endpoint_reports_routes_by_template():
+    client = TestClient(app)
+    client.get("/")
+    client.get("/signals/", headers={"Authorization": "Bearer nope"})
+    client.get("/no-such-page")
+
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert '# TYPE http_request_duration_seconds histogram' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in body
+    assert 'route="/signals/",status="401"' in body
+    assert 'route="unmatched",status="404"' in body
+    assert 'http_requests_in_flight 0' in body
+    assert 'l1_cache_hit_ratio' in body or 'l1_cache_events' in body
+    # scrapes don't measure themselves
+    assert 'route="/metrics"' not in body
+
+
+def test_metrics_token(monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    client = TestClient(app)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_profiled_request_keeps_folded_stacks(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_TOKEN", "prof")
+    profiled_app = FastAPI()
+    profiled_app.add_middleware(metrics.MetricsMiddleware)
+
+    @profiled_app.get("/slow")
+    def slow():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+        return {}
+
+    client = TestClient(profiled_app)
+    assert "x-profile-id" not in client.get("/slow").headers
+    assert "x-profile-id" not in client.get("/slow", headers={"X-Profile": "wrong"}).headers
+
+    res = client.get("/slow", headers={"X-Profile": "prof"})
+    profile = metrics.find_profile(res.headers["x-profile-id"])
+    assert profile["route"] == "/slow"
+    assert profile["samples"] > 0
+    assert "slow (test_metrics.py" in profile["folded"]
+
+
+def test_sampled_profiles_stay_private(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_TOKEN", "prof")
+    monkeypatch.setattr(metrics, "PROFILE_SAMPLE_RATE", 1.0)
+    # no metrics token, no random sampling
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", None)
+    assert metrics._wants_profile({"headers": []}) is None
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+    client = TestClient(app)
+    res = client.get("/")
+    assert "x-profile-id" not in res.headers
+    assert client.get("/metrics/profiles").status_code == 401
+    listed = client.get("/metrics/profiles", headers={"Authorization": "Bearer s3cret"}).json()
+    assert listed[0]["reason"] == "sampled" and "folded" not in listed[0]
+
+
+def test_streams_are_not_profiled(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_TOKEN", "prof")
+    stream_app = FastAPI()
+    stream_app.add_middleware(metrics.MetricsMiddleware)
+
+    @stream_app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"data: 1\n\n"]), media_type="text/event-stream")
+
+    before = len(metrics.profiles)
+    res = TestClient(stream_app).get("/stream", headers={"X-Profile": "prof"})
+    assert "x-profile-id" not in res.headers
+    assert len(metrics.profiles) == before
+
+
+def test_sampler_stops_itself_at_the_cap():
+    sampler = metrics.Sampler(interval=0.001, max_seconds=0.02).start()
+    sampler._thread.join(timeout=1)
+    assert not sampler._thread.is_alive()
+    assert sampler.truncated
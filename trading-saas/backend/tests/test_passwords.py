@@ -0,0 +1,40 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import subprocess
+import pytest
+from fastapi import HTTPException
+from app import passwords
+
+
+def test_pool_hash_and_verify():
+    async def run():
+        hashed = await passwords.hash_password_async("s3cret")
+        assert await passwords.verify_password_async("s3cret", hashed) is True
+        assert await passwords.verify_password_async("wrong", hashed) is False
+        # long passwords get prehashed the same way as before
+        long_pw = "x" * 100
+        assert passwords.check_password(long_pw, await passwords.hash_password_async(long_pw))
+
+    asyncio.run(run())
+    passwords.shutdown_pool()
+
+
+def test_saturated_pool_returns_503(monkeypatch):
+    monkeypatch.setattr(passwords, "HASH_MAX_PENDING", 0)
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(passwords.hash_password_async("s3cret"))
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "1"
+
+
+def test_worker_import_stays_light():
+    # what a spawned worker loads to unpickle hash_password / check_password
+    code = "import sys, app.passwords; print(','.join(m for m in ('fastapi', 'starlette', 'passlib') if m in sys.modules))"
+    backend = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    out = subprocess.run([sys.executable, "-c", code], cwd=backend, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
@@ -0,0 +1,54 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import gzip
+from fastapi.testclient import TestClient
+from app.main import app
+from app import payloads
+from app.routers.signals import SIGNALS_KEY, signal_cache
+
+client = TestClient(app)
+
+
+def test_etag_and_not_modified(users):
+    headers = users.headers("etag@example.com")
+    # a stale l1 entry would be served while a background refresh swaps it out
+    signal_cache.invalidate(SIGNALS_KEY)
+    first = client.get("/signals/", headers=headers)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert "Last-Modified" in first.headers
+
+    again = client.get("/signals/", headers={**headers, "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+    stale = client.get("/signals/", headers={**headers, "If-None-Match": '"something-else"'})
+    assert stale.status_code == 200
+
+
+def test_precompressed_gzip_body(users):
+    headers = users.headers("etag@example.com")
+    res = client.get("/signals/", headers={**headers, "Accept-Encoding": "gzip"})
+    assert res.status_code == 200
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert res.json()["plan"] == "Free"
+
+
+def test_encoded_body_variants_built_once():
+    body = payloads.EncodedBody(payloads.dumps({"data": ["x" * 50] * 20}), etag='"v1"')
+    raw, encoding = body.variant("deflate")
+    assert encoding is None and raw is body.raw
+
+    gz, encoding = body.variant("gzip, deflate")
+    assert encoding == "gzip"
+    assert gzip.decompress(gz) == body.raw
+    assert body.variant("gzip")[0] is gz
+
+    # tiny bodies aren't worth compressing
+    small = payloads.EncodedBody(b"{}", etag='"v2"')
+    assert small.variant("gzip") == (b"{}", None)
@@ -0,0 +1,51 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import event
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import engine
+from app import auth
+
+client = TestClient(app)
+
+
+def count_queries():
+    queries = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(1))
+    return queries
+
+
+def test_repeat_requests_skip_db(users):
+    # db file survives between runs, start every test as a free user
+    headers = users.headers("cached@example.com", pro=False)
+
+    queries = count_queries()
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    first = len(queries)
+    assert first >= 1
+
+    # steady state: principal comes from the cache
+    for _ in range(5):
+        assert client.get("/auth/me", headers=headers).json()["email"] == "cached@example.com"
+    assert len(queries) == first
+
+
+def test_invalidate_reloads_entitlements(users):
+    headers = users.headers("upgrade@example.com", pro=False)
+    assert client.get("/auth/me", headers=headers).json()["is_pro"] is False
+
+    users.get("upgrade@example.com", is_pro=True)
+
+    # still the cached snapshot until someone invalidates it
+    assert client.get("/auth/me", headers=headers).json()["is_pro"] is False
+    auth.invalidate_principal("upgrade@example.com")
+    assert client.get("/auth/me", headers=headers).json()["is_pro"] is True
+
+
+def test_bad_token_rejected():
+    res = client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert res.status_code == 401
@@ -0,0 +1,65 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import FastAPI, Depends, Response
+from fastapi.testclient import TestClient
+from app.cache_backend import MemoryBackend, set_cache
+from app.rate_limit import RateLimit, RateLimitMiddleware
+
+
+def make_client(limiter):
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware)
+
+    @app.get("/limited", dependencies=[Depends(limiter)])
+    def limited():
+        # raw Response skips fastapi's header merging, middleware still adds them
+        return Response(content=b"ok")
+
+    return TestClient(app)
+
+
+def test_redis_limit_blocks_after_limit():
+    set_cache(MemoryBackend())
+    client = make_client(RateLimit(limit=3, window=60, scope="test"))
+
+    for remaining in (2, 1, 0):
+        res = client.get("/limited")
+        assert res.status_code == 200
+        assert res.headers["RateLimit-Limit"] == "3"
+        assert res.headers["RateLimit-Remaining"] == str(remaining)
+
+    res = client.get("/limited")
+    assert res.status_code == 429
+    assert int(res.headers["Retry-After"]) >= 1
+    set_cache(None)
+
+
+def test_blocked_client_skips_redis():
+    backend = MemoryBackend()
+    set_cache(backend)
+    client = make_client(RateLimit(limit=1, window=60, scope="test"))
+    assert client.get("/limited").status_code == 200
+    assert client.get("/limited").status_code == 429
+
+    # rejected locally now, the counter in redis stops moving
+    before = dict(backend._data)
+    assert client.get("/limited").status_code == 429
+    assert backend._data == before
+    set_cache(None)
+
+
+def test_local_token_bucket():
+    client = make_client(RateLimit(limit=2, window=60, key="user", local=True))
+    headers = {"Authorization": "Bearer abc"}
+    assert client.get("/limited", headers=headers).status_code == 200
+    assert client.get("/limited", headers=headers).status_code == 200
+    assert client.get("/limited", headers=headers).status_code == 429
+    # different token, different bucket
+    assert client.get("/limited", headers={"Authorization": "Bearer xyz"}).status_code == 200
+    # a stream token in the query string lands in the same bucket as the header
+    assert client.get("/limited?token=abc").status_code == 429
+    assert client.get("/limited?token=qrs").status_code == 200
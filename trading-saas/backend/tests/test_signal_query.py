@@ -0,0 +1,64 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+from fastapi.testclient import TestClient
+from app.main import app
+from app.routers import signals as signals_router
+
+client = TestClient(app)
+
+
+def test_free_plan_is_enforced_per_symbol(users):
+    headers = users.headers("query-free@example.com", pro=False)
+    res = client.post("/signals/query", json={"symbols": ["tcs", "INFY", "NOPE", "NIFTY 50"]}, headers=headers)
+    assert res.status_code == 200
+    data = res.json()
+    assert data["plan"] == "Free"
+    assert [s["id"] for s in data["timeframes"]["default"]["signals"]] == ["TCS", "NIFTY 50"]
+    assert data["denied"] == ["INFY"]
+    assert data["unknown"] == ["NOPE"]
+
+    # no symbols = everything the plan covers
+    data = client.post("/signals/query", json={}, headers=headers).json()
+    assert sorted(s["id"] for s in data["timeframes"]["default"]["signals"]) == sorted(signals_router.FREE_SYMBOLS)
+
+
+def test_projection_columns_and_timeframes(users):
+    headers = users.headers("query-pro@example.com", pro=True)
+    body = {"symbols": ["INFY", "LT", "TCS"], "timeframes": ["default", "5m", "5m"], "fields": ["price"]}
+    data = client.post("/signals/query", json=body, headers=headers).json()
+    assert data["plan"] == "Pro"
+    assert data["fields"] == ["id", "price"]
+    assert list(data["timeframes"]) == ["default", "5m"]
+    rows = data["timeframes"]["5m"]["signals"]
+    assert [set(r) for r in rows] == [{"id", "price"}] * 3
+
+    cols = client.post("/signals/query", json={**body, "columns": True}, headers=headers).json()
+    default = cols["timeframes"]["default"]["columns"]
+    assert default["id"] == ["INFY", "LT", "TCS"]
+    # same snapshot, same numbers as the row layout
+    assert default["price"] == [r["price"] for r in data["timeframes"]["default"]["signals"]]
+
+
+def test_query_matches_snapshot_and_revalidates(users):
+    headers = users.headers("query-etag@example.com", pro=True)
+    signals_router.signal_cache.invalidate(signals_router.SIGNALS_KEY)
+    first = client.post("/signals/query", json={"symbols": ["RELIANCE", "SBIN"]}, headers=headers)
+    snapshot = asyncio.run(signals_router.load_snapshot())
+    by_id = {s["id"]: s for s in snapshot.signals}
+    assert first.json()["timeframes"]["default"]["signals"] == [by_id["RELIANCE"], by_id["SBIN"]]
+
+    again = client.post("/signals/query", json={"symbols": ["RELIANCE", "SBIN"]},
+                        headers={**headers, "If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_query_rejects_bad_input(users):
+    headers = users.headers("query-free@example.com", pro=False)
+    assert client.post("/signals/query", json={"timeframes": ["2h"]}, headers=headers).status_code == 400
+    assert client.post("/signals/query", json={"fields": ["volume"]}, headers=headers).status_code == 422
+    assert client.post("/signals/query", json={}).status_code == 401
@@ -0,0 +1,112 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from app import store
+from app.engine import SignalEngine
+
+DAY = 86400
+START = 1_700_006_400 - 1_700_006_400 % DAY
+
+
+def bars(n, first=0, price=100.0):
+    ts = START + (first + np.arange(n)) * DAY
+    close = price + np.arange(n, dtype=float)
+    return ts, close - 1, close + 1, close - 2, close, np.full(n, 10.0)
+
+
+def test_append_and_range_slice(tmp_path):
+    s = store.MarketStore(str(tmp_path))
+    s.append("RELIANCE", *bars(5))
+    s.append("RELIANCE", *bars(5, first=5, price=105.0))
+
+    cols = s.read("RELIANCE")
+    assert list(cols["close"]) == [100.0 + i for i in range(10)]
+    window = s.read("RELIANCE", start=START + 2 * DAY, end=START + 4 * DAY, columns=["close"])
+    assert list(window["close"]) == [102.0, 103.0]
+    assert list(window["ts"]) == [START + 2 * DAY, START + 3 * DAY]
+    assert s.symbols() == ["RELIANCE"]
+    assert len(s.read("MISSING")["ts"]) == 0
+
+
+def test_compaction_gives_zero_copy_views(tmp_path):
+    s = store.MarketStore(str(tmp_path))
+    s.append("NIFTY 50", *bars(4))
+    s.append("TCS", *bars(3, price=50.0))
+    assert s.compact() == 7
+    assert not os.path.exists(s.tail_path)
+
+    cols = s.read("NIFTY 50")
+    assert list(cols["close"]) == [100.0, 101.0, 102.0, 103.0]
+    # slices of the mapped generation, nothing copied
+    assert np.shares_memory(cols["close"], s._packed["close"])
+
+    # appends after a compaction sit in the tail until the next one
+    s.append("TCS", *bars(2, first=3, price=53.0))
+    assert list(s.read("TCS")["close"]) == [50.0, 51.0, 52.0, 53.0, 54.0]
+    s.compact()
+    assert list(s.read("TCS")["close"]) == [50.0, 51.0, 52.0, 53.0, 54.0]
+
+
+def test_late_and_duplicate_bars_are_merged(tmp_path):
+    s = store.MarketStore(str(tmp_path))
+    s.append("INFY", *bars(5))
+    s.compact()
+    # a corrected bar for day 2 and an out of order late bar
+    ts, o, h, l, c, v = bars(1, first=2, price=500.0)
+    s.append("INFY", ts, o, h, l, c, v)
+    s.append("INFY", *bars(1, first=6, price=106.0))
+    s.append("INFY", *bars(1, first=5, price=105.0))
+
+    expected = [100.0, 101.0, 500.0, 103.0, 104.0, 105.0, 106.0]
+    assert list(s.read("INFY")["close"]) == expected
+    s.compact()
+    assert list(s.read("INFY")["close"]) == expected
+
+
+def test_other_readers_see_new_generation(tmp_path):
+    writer = store.MarketStore(str(tmp_path))
+    reader = store.MarketStore(str(tmp_path))
+    writer.append("SBIN", *bars(3))
+    writer.compact()
+    assert len(reader.read("SBIN")["ts"]) == 3
+    writer.append("SBIN", *bars(2, first=3))
+    writer.compact()
+    assert len(reader.read("SBIN")["ts"]) == 5
+
+
+def test_csv_import(tmp_path):
+    path = tmp_path / "dump.csv"
+    path.write_text(
+        "Date,Symbol,Open,High,Low,Close,Volume\n"
+        "2024-01-03,ITC,2,3,1,2.5,100\n"
+        "2024-01-02,ITC,1,2,0.5,1.5,100\n"
+        "2024-01-02,LT,10,11,9,10.5,50\n"
+    )
+    s = store.MarketStore(str(tmp_path / "data"))
+    assert store.import_csv(s, str(path)) == 3
+    itc = s.read("ITC")
+    assert list(itc["close"]) == [1.5, 2.5]
+    assert itc["ts"][0] == store.parse_ts("2024-01-02")
+    assert s.symbols() == ["ITC", "LT"]
+
+
+def test_parse_ts():
+    assert store.parse_ts("2024-01-02") == 1704153600
+    assert store.parse_ts("2024-01-02T00:00:00Z") == 1704153600
+    assert store.parse_ts(1704153600000) == 1704153600
+    assert store.parse_ts("1704153600") == 1704153600
+
+
+def test_engine_from_store(tmp_path):
+    s = store.MarketStore(str(tmp_path))
+    s.append("A", *bars(30))
+    s.append("B", *bars(20, first=10, price=200.0))
+    eng = SignalEngine.from_store(s, ["A", "B"], n_bars=25)
+    assert eng.close.shape == (2, 20)
+    assert eng.close[0, -1] == 129.0 and eng.close[1, -1] == 219.0
+    assert eng.timestamps[-1] == START + 29 * DAY
+    assert SignalEngine.from_store(s, ["A", "MISSING"]) is None
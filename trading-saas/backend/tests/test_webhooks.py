@@ -0,0 +1,191 @@
+import sys
+import os
+
+# path fix for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi.testclient import TestClient
+from app.main import app
+from app.database import SessionLocal, init_models
+from app.routers import billing
+from app import metrics, models, webhooks
+
+asyncio.run(init_models())
+
+client = TestClient(app)
+
+
+def stripe_event(event_type, obj):
+    # same shape stripe posts
+    return {
+        "id": "evt_" + uuid.uuid4().hex,
+        "object": "event",
+        "type": event_type,
+        "created": int(time.time()),
+        "data": {"object": obj},
+    }
+
+
+def post_event(event, secret=None):
+    # fake stripe-signature: t=<ts>,v1=hmac_sha256(secret, "<ts>.<payload>")
+    payload = json.dumps(event)
+    ts = int(time.time())
+    secret = secret or billing.STRIPE_WEBHOOK_SECRET
+    sig = hmac.new(secret.encode(), f"{ts}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return client.post("/billing/webhook", content=payload, headers={
+        "stripe-signature": f"t={ts},v1={sig}",
+        "content-type": "application/json",
+    })
+
+
+def drain():
+    async def run():
+        while await webhooks.process_batch():
+            pass
+
+    asyncio.run(run())
+
+
+def test_bad_signature_rejected():
+    res = post_event(stripe_event("invoice.paid", {}), secret="whsec_wrong")
+    assert res.status_code == 400
+
+
+def test_checkout_then_renewal_then_cancel(users):
+    email = f"stripe-{uuid.uuid4().hex[:8]}@example.com"
+    users.get(email)
+    customer = "cus_" + uuid.uuid4().hex[:10]
+    subscription = "sub_" + uuid.uuid4().hex[:10]
+
+    # checkout: enqueued and acknowledged, nothing applied yet
+    checkout = stripe_event("checkout.session.completed", {
+        "customer_email": email, "customer": customer, "subscription": subscription,
+    })
+    assert post_event(checkout).json() == {"status": "success"}
+    assert users.get(email).is_pro is False
+
+    # stripe retries: the event id is already recorded
+    assert post_event(checkout).json() == {"status": "already_processed"}
+
+    drain()
+    user = users.get(email)
+    assert user.is_pro is True
+    assert user.stripe_subscription_id == subscription
+
+    period_end = int((datetime.now(timezone.utc) + timedelta(days=60)).timestamp())
+    post_event(stripe_event("invoice.paid", {
+        "customer": customer, "subscription": subscription,
+        "lines": {"data": [{"period": {"end": period_end}}]},
+    }))
+    drain()
+    end = users.get(email).subscription_end_date
+    assert abs(end.replace(tzinfo=timezone.utc).timestamp() - period_end) < 1
+
+    post_event(stripe_event("customer.subscription.deleted", {"id": subscription, "customer": customer}))
+    drain()
+    assert users.get(email).is_pro is False
+
+
+def test_event_applied_once_in_batch(users):
+    async def count_processed(event_id):
+        async with SessionLocal() as db:
+            row = await db.get(models.WebhookEvent, event_id)
+            return row.status, row.attempts
+
+    email = f"stripe-{uuid.uuid4().hex[:8]}@example.com"
+    users.get(email)
+    event = stripe_event("checkout.session.completed", {"customer_email": email})
+    post_event(event)
+
+    async def two_consumers():
+        # both race on the same pending rows, only one claims each
+        return await asyncio.gather(webhooks.process_batch(), webhooks.process_batch())
+
+    asyncio.run(two_consumers())
+    assert asyncio.run(count_processed(event["id"])) == ("processed", 1)
+
+
+def test_invoice_before_checkout_is_not_lost(users):
+    async def status_of(event_id):
+        async with SessionLocal() as db:
+            row = await db.get(models.WebhookEvent, event_id)
+            return row.status, row.attempts
+
+    email = f"stripe-{uuid.uuid4().hex[:8]}@example.com"
+    users.get(email)
+    customer = "cus_" + uuid.uuid4().hex[:10]
+
+    # no customer id stored yet, the invoice email still finds the user
+    post_event(stripe_event("invoice.paid", {"customer": customer, "customer_email": email}))
+    drain()
+    user = users.get(email)
+    assert user.is_pro is True
+    assert user.stripe_customer_id == customer
+
+    # nobody to match at all: kept pending for a retry instead of marked done
+    orphan = stripe_event("invoice.paid", {"customer": "cus_" + uuid.uuid4().hex[:10]})
+    post_event(orphan)
+    asyncio.run(webhooks.process_batch())
+    assert asyncio.run(status_of(orphan["id"])) == ("pending", 1)
+    # backing off: draining again right away doesn't burn another attempt
+    drain()
+    assert asyncio.run(status_of(orphan["id"])) == ("pending", 1)
+
+
+def test_retries_back_off_then_give_up(monkeypatch):
+    async def status_of(event_id):
+        async with SessionLocal() as db:
+            row = await db.get(models.WebhookEvent, event_id)
+            return row.status, row.attempts
+
+    assert [webhooks.retry_delay(n) for n in (1, 2, 3)] == [2.0, 4.0, 8.0]
+    assert webhooks.retry_delay(50) == webhooks.RETRY_MAX_SECONDS
+
+    orphan = stripe_event("invoice.paid", {"customer": "cus_" + uuid.uuid4().hex[:10]})
+    post_event(orphan)
+    monkeypatch.setattr(webhooks, "RETRY_BASE_SECONDS", 0)
+    drain()
+    assert asyncio.run(status_of(orphan["id"])) == ("failed", webhooks.MAX_ATTEMPTS)
+
+
+def test_checkout_keeps_the_period_from_an_earlier_invoice(users):
+    email = f"stripe-{uuid.uuid4().hex[:8]}@example.com"
+    users.get(email)
+    customer = "cus_" + uuid.uuid4().hex[:10]
+    period_end = int((datetime.now(timezone.utc) + timedelta(days=45)).timestamp())
+
+    # stripe delivered the invoice first
+    post_event(stripe_event("invoice.paid", {
+        "customer": customer, "customer_email": email,
+        "lines": {"data": [{"period": {"end": period_end}}]},
+    }))
+    drain()
+    post_event(stripe_event("checkout.session.completed", {"customer_email": email, "customer": customer}))
+    drain()
+    end = users.get(email).subscription_end_date
+    assert abs(end.replace(tzinfo=timezone.utc).timestamp() - period_end) < 1
+
+
+def test_consumer_failures_are_logged_and_counted(monkeypatch, caplog):
+    async def broken(limit=webhooks.BATCH_SIZE):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(webhooks, "process_batch", broken)
+    before = metrics.BACKGROUND_ERRORS.value(task="webhooks")
+
+    async def run():
+        processor = webhooks.WebhookProcessor(poll_seconds=0.01)
+        processor.start()
+        await asyncio.sleep(0.05)
+        await processor.stop()
+
+    asyncio.run(run())
+    assert metrics.BACKGROUND_ERRORS.value(task="webhooks") > before
+    assert "db down" in caplog.text